@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+"""
+Benchmark matching features to a categorical style, with one equality rule
+per category, with the rules matched with a dictionary and with the rules
+tested one at a time.
+
+License
+=======
+Copyright 2011-2014 David Zwarg <U{david.a@zwarg.com}>
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+U{http://www.apache.org/licenses/LICENSE-2.0}
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from io import BytesIO
+from optparse import OptionParser
+
+import numpy
+
+from common import make_sld, measure, report
+
+import sld
+import sld.matcher
+from sld.matcher import StyleMatcher
+
+if __name__ == "__main__":
+    parser = OptionParser()
+    parser.add_option('-r', '--rules', dest='rules', type='int',
+                      help='Categories in the style.', default=5000)
+    parser.add_option('-f', '--features', dest='features', type='int',
+                      help='Features per batch.', default=1000000)
+
+    (options, args) = parser.parse_args()
+
+    sld_doc = sld.StyledLayerDescriptor(BytesIO(make_sld(options.rules)), validate=False)
+    fts = sld_doc.NamedLayer.UserStyle.FeatureTypeStyle
+    scale = 25000
+
+    rnd = numpy.random.RandomState(0)
+    columns = {'category': rnd.randint(0, options.rules + 100, options.features)}
+    small = {'category': columns['category'][:10000]}
+    features = [{'category': int(value)} for value in columns['category'][:100000]]
+
+    matcher = StyleMatcher(fts)
+    minimum = sld.matcher._dispatch_minimum
+    sld.matcher._dispatch_minimum = options.rules + 1
+    sequential = StyleMatcher(fts)
+    sld.matcher._dispatch_minimum = minimum
+
+    assert matcher.match(small, scale).tolist() == sequential.match(small, scale).tolist()
+    assert [matcher.match_feature(feature, scale) for feature in features[:1000]] == \
+        [sequential.match_feature(feature, scale) for feature in features[:1000]]
+
+    report('sequential rules, per feature',
+           measure(lambda: [sequential.match_feature(feature, scale) for feature in features[:1000]],
+                   number=1, repeat=1), 1000)
+    report('dictionary, per feature',
+           measure(lambda: [matcher.match_feature(feature, scale) for feature in features],
+                   number=1, repeat=3), len(features))
+    report('sequential rules, batch of %d' % len(small['category']),
+           measure(lambda: sequential.match(small, scale), number=1, repeat=1), len(small['category']))
+    report('dictionary, batch of %d' % options.features,
+           measure(lambda: matcher.match(columns, scale), number=1, repeat=3), options.features)
+    report('StyleMatcher(), %d rules' % options.rules,
+           measure(lambda: StyleMatcher(fts), number=1, repeat=3))
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+"""
+Benchmark the per-construction cost of StyledLayerDescriptor objects.
+
+Measures the cost of building an empty document, of loading (and
+validating) the test fixture, and of validating an existing document.
+
+License
+=======
+Copyright 2011-2014 David Zwarg <U{david.a@zwarg.com}>
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+U{http://www.apache.org/licenses/LICENSE-2.0}
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from optparse import OptionParser
+
+from common import STYLE_SLD, measure, report
+
+import sld
+
+if __name__ == "__main__":
+    parser = OptionParser()
+    parser.add_option('-n', '--number', dest='number', type='int',
+                      help='Constructions per timing run.', default=200)
+
+    (options, args) = parser.parse_args()
+
+    # first construction pays for the one-time schema compilation
+    sld.StyledLayerDescriptor(STYLE_SLD)
+
+    report('StyledLayerDescriptor()',
+           measure(lambda: sld.StyledLayerDescriptor(), number=options.number))
+    report('StyledLayerDescriptor(style.sld)',
+           measure(lambda: sld.StyledLayerDescriptor(STYLE_SLD), number=options.number))
+    report('StyledLayerDescriptor(style.sld, validate=False)',
+           measure(lambda: sld.StyledLayerDescriptor(STYLE_SLD, validate=False), number=options.number))
+
+    doc = sld.StyledLayerDescriptor(STYLE_SLD)
+    report('StyledLayerDescriptor.validate()',
+           measure(doc.validate, number=options.number))
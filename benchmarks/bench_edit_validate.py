@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+"""
+Benchmark an editing session that validates after every small edit.
+
+Each edit changes the title of one rule and adds a stroke parameter to its
+symbolizer, then validates the document. Also times validating again when
+nothing has changed.
+
+License
+=======
+Copyright 2011-2014 David Zwarg <U{david.a@zwarg.com}>
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+U{http://www.apache.org/licenses/LICENSE-2.0}
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from io import BytesIO
+from optparse import OptionParser
+
+from common import make_sld, measure, report
+
+import sld
+
+if __name__ == "__main__":
+    parser = OptionParser()
+    parser.add_option('-r', '--rules', dest='rules', type='int',
+                      help='Rules in the synthetic document.', default=5000)
+    parser.add_option('-n', '--number', dest='number', type='int',
+                      help='Edits per timing run.', default=20)
+
+    (options, args) = parser.parse_args()
+
+    sld_doc = sld.StyledLayerDescriptor(BytesIO(make_sld(options.rules)), validate=False)
+    rules = sld_doc.NamedLayer.UserStyle.FeatureTypeStyle.Rules
+    sld_doc.validate()
+
+    edits = [0]
+
+    def edit():
+        rule = rules[edits[0] % len(rules)]
+        edits[0] += 1
+        rule.Title = 'edit %d' % edits[0]
+        rule.PolygonSymbolizer.Stroke.create_cssparameter('stroke-width', '2')
+        sld_doc.validate()
+
+    report('normalize() %d unchanged rules' % options.rules,
+           measure(sld_doc.normalize, number=options.number))
+    report('edit, then validate() %d rules' % options.rules,
+           measure(edit, number=options.number))
+    report('validate() %d unchanged rules' % options.rules,
+           measure(sld_doc.validate, number=options.number))
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+"""
+Benchmark the structural ('fast') validation mode against full validation.
+
+Times a single pass of the structural validator and of the XSD validator
+over a whole document, then an editing session that validates after every
+small edit, where the fast mode only checks the changed elements again.
+
+License
+=======
+Copyright 2011-2014 David Zwarg <U{david.a@zwarg.com}>
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+U{http://www.apache.org/licenses/LICENSE-2.0}
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from io import BytesIO
+from optparse import OptionParser
+
+from common import STYLE_SLD, make_sld, measure, report
+
+import sld
+from sld.structure import get_structure
+
+if __name__ == "__main__":
+    parser = OptionParser()
+    parser.add_option('-r', '--rules', dest='rules', type='int',
+                      help='Rules in the synthetic document.', default=5000)
+    parser.add_option('-n', '--number', dest='number', type='int',
+                      help='Validations per timing run.', default=20)
+
+    (options, args) = parser.parse_args()
+
+    report('generate structural validator',
+           measure(lambda: sld.structure.StructureValidator('1.0.0'), number=options.number))
+
+    schema = sld.get_schema()
+    structure = get_structure()
+
+    for label, sld_doc in (('style.sld', sld.StyledLayerDescriptor(STYLE_SLD)),
+                           ('%d rules' % options.rules,
+                            sld.StyledLayerDescriptor(BytesIO(make_sld(options.rules)), validate=False))):
+        node = sld_doc._node
+        assert schema.validate(node) == structure.validate(node)
+
+        report('full validation, %s' % label,
+               measure(lambda: schema.validate(node), number=options.number))
+        report('fast validation, %s' % label,
+               measure(lambda: structure.validate(node), number=options.number))
+
+    rules = sld_doc.NamedLayer.UserStyle.FeatureTypeStyle.Rules
+    for mode in ('full', 'fast'):
+        assert sld_doc.validate(mode=mode)
+        edits = [0]
+
+        def edit():
+            rule = rules[edits[0] % len(rules)]
+            edits[0] += 1
+            rule.Title = 'edit %d' % edits[0]
+            rule.PolygonSymbolizer.Stroke.create_cssparameter('stroke-width', '2')
+            sld_doc.validate(mode=mode)
+
+        report('edit, then validate(mode=%r) %d rules' % (mode, options.rules),
+               measure(edit, number=options.number))
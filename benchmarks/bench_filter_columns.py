@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+"""
+Benchmark evaluating a filter against a columnar batch of features, with
+vectorized NumPy operations and with a compiled filter function called
+once per feature.
+
+License
+=======
+Copyright 2011-2014 David Zwarg <U{david.a@zwarg.com}>
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+U{http://www.apache.org/licenses/LICENSE-2.0}
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from optparse import OptionParser
+
+import numpy
+from lxml import etree
+
+from common import measure, report
+
+from sld.filters import compile_columns, compile_filter
+
+from bench_filter_compile import FILTER
+
+if __name__ == "__main__":
+    parser = OptionParser()
+    parser.add_option('-f', '--features', dest='features', type='int',
+                      help='Features per batch.', default=1000000)
+
+    (options, args) = parser.parse_args()
+
+    rnd = numpy.random.RandomState(0)
+    columns = {'population': rnd.randint(0, 10000, options.features),
+               'name': rnd.choice(['North End', 'South End', 'Northwood', 'Eastgate'], options.features),
+               'kind': rnd.choice(['road', 'rail', 'river'], options.features)}
+
+    elem = etree.fromstring(FILTER)
+    mask = compile_columns(elem)
+    match = compile_filter(elem)
+    features = [{'population': int(population), 'name': str(name), 'kind': str(kind)}
+                for population, name, kind in zip(columns['population'], columns['name'], columns['kind'])]
+    assert mask(columns).tolist() == [match(feature) for feature in features]
+
+    report('compiled filter, per feature',
+           measure(lambda: [match(feature) for feature in features], number=1, repeat=3),
+           options.features)
+    report('vectorized filter, per batch',
+           measure(lambda: mask(columns), number=1, repeat=3),
+           options.features)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+"""
+Benchmark evaluating a filter against features, with a compiled filter
+function and with an interpreter that walks the filter elements for every
+feature.
+
+License
+=======
+Copyright 2011-2014 David Zwarg <U{david.a@zwarg.com}>
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+U{http://www.apache.org/licenses/LICENSE-2.0}
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from optparse import OptionParser
+import random
+import re
+
+from lxml import etree
+
+from common import measure, report
+
+from sld.filters import compile_filter, compare, like_pattern
+
+FILTER = b'''<ogc:Filter xmlns:ogc="http://www.opengis.net/ogc"><ogc:Or>
+<ogc:And>
+  <ogc:PropertyIsGreaterThanOrEqualTo>
+    <ogc:PropertyName>population</ogc:PropertyName><ogc:Literal>5000</ogc:Literal>
+  </ogc:PropertyIsGreaterThanOrEqualTo>
+  <ogc:PropertyIsLike wildCard="*" singleChar="?" escape="\\">
+    <ogc:PropertyName>name</ogc:PropertyName><ogc:Literal>North*</ogc:Literal>
+  </ogc:PropertyIsLike>
+</ogc:And>
+<ogc:Not>
+  <ogc:PropertyIsEqualTo>
+    <ogc:PropertyName>kind</ogc:PropertyName><ogc:Literal>road</ogc:Literal>
+  </ogc:PropertyIsEqualTo>
+</ogc:Not>
+</ogc:Or></ogc:Filter>'''
+
+OPERATORS = {'PropertyIsEqualTo': '==', 'PropertyIsNotEqualTo': '!=', 'PropertyIsLessThan': '<',
+             'PropertyIsLessThanOrEqualTo': '<=', 'PropertyIsGreaterThan': '>',
+             'PropertyIsGreaterThanOrEqualTo': '>='}
+
+
+def interpret(elem, feature):
+    """
+    Evaluate a filter element against a feature, by walking its children.
+    """
+    tag = etree.QName(elem).localname
+    if tag == 'Filter':
+        return interpret(elem[0], feature)
+    if tag == 'And':
+        return all(interpret(child, feature) for child in elem)
+    if tag == 'Or':
+        return any(interpret(child, feature) for child in elem)
+    if tag == 'Not':
+        return not interpret(elem[0], feature)
+
+    name = elem.find('{http://www.opengis.net/ogc}PropertyName').text
+    literal = elem.find('{http://www.opengis.net/ogc}Literal').text
+    value = feature.get(name)
+    if tag == 'PropertyIsLike':
+        return value is not None and re.match(like_pattern(elem), value) is not None
+
+    return compare(value, literal, OPERATORS[tag])
+
+
+if __name__ == "__main__":
+    parser = OptionParser()
+    parser.add_option('-f', '--features', dest='features', type='int',
+                      help='Features per timing run.', default=100000)
+
+    (options, args) = parser.parse_args()
+
+    rnd = random.Random(0)
+    features = [{'population': rnd.randrange(10000),
+                 'name': rnd.choice(['North End', 'South End', 'Northwood', 'Eastgate']),
+                 'kind': rnd.choice(['road', 'rail', 'river'])} for i in range(options.features)]
+
+    elem = etree.fromstring(FILTER)
+    match = compile_filter(elem)
+    assert [match(feature) for feature in features] == [interpret(elem, feature) for feature in features]
+
+    report('interpreted filter',
+           measure(lambda: [interpret(elem, feature) for feature in features], number=1, repeat=3),
+           options.features)
+    report('compiled filter',
+           measure(lambda: [match(feature) for feature in features], number=1, repeat=3),
+           options.features)
+    report('compile_filter(), cached',
+           measure(lambda: compile_filter(elem), number=1000))
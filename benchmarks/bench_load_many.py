@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+"""
+Benchmark loading a directory of SLD files, serially and with load_many
+over an increasing number of threads. lxml releases the GIL while it parses
+and validates, so the wall-clock time should fall with the number of cores.
+
+License
+=======
+Copyright 2011-2014 David Zwarg <U{david.a@zwarg.com}>
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+U{http://www.apache.org/licenses/LICENSE-2.0}
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from optparse import OptionParser
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+from common import make_sld, report
+
+import sld
+from sld.batch import load_many
+
+if __name__ == "__main__":
+    parser = OptionParser()
+    parser.add_option('-f', '--files', dest='files', type='int',
+                      help='Files in the synthetic directory.', default=200)
+    parser.add_option('-r', '--rules', dest='rules', type='int',
+                      help='Rules in each file.', default=500)
+    parser.add_option('--no-validate', dest='validate', action='store_false', default=True,
+                      help='Load the files without validating them.')
+
+    (options, args) = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        data = make_sld(options.rules)
+        paths = []
+        for i in range(options.files):
+            paths.append(os.path.join(tmpdir, 'style%d.sld' % i))
+            with open(paths[-1], 'wb') as f:
+                f.write(data)
+
+        sld.get_schema()
+
+        # keep the documents, as load_many does
+        start = time.time()
+        docs = [sld.StyledLayerDescriptor(path, validate=options.validate) for path in paths]
+        report('serial StyledLayerDescriptor() %d files' % options.files, time.time() - start, options.files)
+
+        workers = 1
+        while workers <= multiprocessing.cpu_count():
+            del docs
+            start = time.time()
+            docs = load_many(paths, max_workers=workers, validate=options.validate)
+            report('load_many(max_workers=%d) %d files' % (workers, options.files),
+                   time.time() - start, options.files)
+            workers *= 2
+    finally:
+        shutil.rmtree(tmpdir)
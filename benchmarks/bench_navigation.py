@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+"""
+Benchmark repeated navigation into deep symbolizer trees.
+
+Walks from every rule of a synthetic document down to the first fill
+parameter of its symbolizer, several times over, as an editing session
+that keeps revisiting the same nodes would.
+
+License
+=======
+Copyright 2011-2014 David Zwarg <U{david.a@zwarg.com}>
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+U{http://www.apache.org/licenses/LICENSE-2.0}
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from io import BytesIO
+from optparse import OptionParser
+
+from common import make_sld, measure, report
+
+import sld
+
+
+def navigate(rules, passes):
+    """
+    Navigate from each rule to its first fill parameter, several times.
+    """
+    for i in range(passes):
+        for rule in rules:
+            rule.PolygonSymbolizer.Fill.CssParameters[0].Value
+            rule.Filter.PropertyIsEqualTo.Literal
+
+
+if __name__ == "__main__":
+    parser = OptionParser()
+    parser.add_option('-r', '--rules', dest='rules', type='int',
+                      help='Rules in the synthetic document.', default=1000)
+    parser.add_option('-p', '--passes', dest='passes', type='int',
+                      help='Navigation passes over every rule.', default=10)
+
+    (options, args) = parser.parse_args()
+
+    sld_doc = sld.StyledLayerDescriptor(BytesIO(make_sld(options.rules)), validate=False)
+    rules = list(sld_doc.NamedLayer.UserStyle.FeatureTypeStyle.Rules)
+
+    report('navigate rule to CssParameter and Literal',
+           measure(lambda: navigate(rules, options.passes), number=1, repeat=5),
+           options.rules * options.passes)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+"""
+Benchmark normalizing large SLD documents.
+
+Compares the single-pass, rank-sorting normalize() with the previous
+approach, which queried and moved each kind of rule child in turn, on a
+synthetic document whose rules are already in order, and on one where
+each rule has its symbolizer ahead of its filter.
+
+License
+=======
+Copyright 2011-2014 David Zwarg <U{david.a@zwarg.com}>
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+U{http://www.apache.org/licenses/LICENSE-2.0}
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from io import BytesIO
+from optparse import OptionParser
+import timeit
+
+from common import make_sld, report
+
+import sld
+
+LEGACY_ORDER = [
+    'sld:Title', 'ogc:Filter', 'sld:MinScaleDenominator',
+    'sld:MaxScaleDenominator', 'sld:PolygonSymbolizer',
+    'sld:LineSymbolizer', 'sld:TextSymbolizer', 'sld:PointSymbolizer']
+"""The rule child order of the previous normalize()."""
+
+
+def legacy_normalize(sld_doc):
+    """
+    Normalize every rule the way the previous Rule.normalize() did, with
+    one query and a remove/append per kind of child.
+    """
+    for rule in sld_doc.NamedLayer.UserStyle.FeatureTypeStyle.Rules:
+        node = rule._node
+        for item in LEGACY_ORDER:
+            for xitem in node.xpath(item, namespaces=sld.SLDNode._nsmap):
+                node.remove(xitem)
+                node.append(xitem)
+
+
+def shuffle(sld_doc):
+    """
+    Move the symbolizer of every rule ahead of its filter.
+    """
+    for rule in sld_doc.NamedLayer.UserStyle.FeatureTypeStyle.Rules:
+        rule._node.insert(0, rule._node[-1])
+
+
+def best(func, sld_text, prepare=None, repeat=3):
+    """
+    Time a normalizer on fresh copies of a document, and return the best time.
+    """
+    times = []
+    for i in range(repeat):
+        sld_doc = sld.StyledLayerDescriptor(BytesIO(sld_text), validate=False)
+        if prepare is not None:
+            prepare(sld_doc)
+        start = timeit.default_timer()
+        func(sld_doc)
+        times.append(timeit.default_timer() - start)
+
+    return min(times)
+
+
+if __name__ == "__main__":
+    parser = OptionParser()
+    parser.add_option('-r', '--rules', dest='rules', type='int',
+                      help='Rules in the synthetic document.', default=50000)
+
+    (options, args) = parser.parse_args()
+
+    sld_text = make_sld(options.rules)
+    for label, prepare in (('ordered', None), ('shuffled', shuffle)):
+        report('previous normalize, %s rules' % label,
+               best(legacy_normalize, sld_text, prepare), options.rules)
+        report('normalize(), %s rules' % label,
+               best(lambda sld_doc: sld_doc.normalize(), sld_text, prepare), options.rules)
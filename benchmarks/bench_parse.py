@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+"""
+Benchmark loading an indented document with lxml's default parser, as
+documents used to be loaded, and with the reusable parser of each thread,
+from a file, from bytes, from a memoryview and from an mmap. The last run
+drops the indentation while parsing.
+
+License
+=======
+Copyright 2011-2014 David Zwarg <U{david.a@zwarg.com}>
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+U{http://www.apache.org/licenses/LICENSE-2.0}
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from optparse import OptionParser
+import mmap
+import os
+import tempfile
+
+from lxml import etree
+
+from common import make_sld, measure, report
+
+import sld
+
+if __name__ == "__main__":
+    parser = OptionParser()
+    parser.add_option('-r', '--rules', dest='rules', type='int',
+                      help='Rules in the synthetic document.', default=5000)
+    parser.add_option('-n', '--number', dest='number', type='int',
+                      help='Loads per timing run.', default=5)
+
+    (options, args) = parser.parse_args()
+
+    content = etree.tostring(etree.fromstring(make_sld(options.rules)), pretty_print=True)
+    handle, path = tempfile.mkstemp(suffix='.sld')
+    with os.fdopen(handle, 'wb') as f:
+        f.write(content)
+
+    try:
+        def load(source):
+            sld.StyledLayerDescriptor(source, validate=False)
+
+        report('parse() default parser, %d rules' % options.rules,
+               measure(lambda: etree.parse(path), number=options.number))
+        report('load file, %d rules' % options.rules,
+               measure(lambda: load(path), number=options.number))
+        report('load bytes, %d rules' % options.rules,
+               measure(lambda: load(content), number=options.number))
+        report('load memoryview, %d rules' % options.rules,
+               measure(lambda: load(memoryview(content)), number=options.number))
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            report('load mmap, %d rules' % options.rules,
+                   measure(lambda: load(mapped), number=options.number))
+            mapped.close()
+
+        sld.set_parser_options(remove_blank_text=True)
+        report('load file remove_blank_text, %d rules' % options.rules,
+               measure(lambda: load(path), number=options.number))
+        sld.set_parser_options()
+    finally:
+        os.remove(path)
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+"""
+Benchmark property reads on a large SLD document.
+
+Builds a synthetic document with many rules, and times reading the text
+and wrapped child properties of every rule. The rule wrappers are built
+once up front, so only the property reads are timed.
+
+License
+=======
+Copyright 2011-2014 David Zwarg <U{david.a@zwarg.com}>
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+U{http://www.apache.org/licenses/LICENSE-2.0}
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from io import BytesIO
+from optparse import OptionParser
+
+from common import make_sld, measure, report
+
+import sld
+
+
+def read_text(rules):
+    """
+    Read the text properties of every rule in a list.
+    """
+    for rule in rules:
+        rule.Title, rule.MinScaleDenominator, rule.MaxScaleDenominator
+
+
+def read_children(rules):
+    """
+    Read the wrapped child properties of every rule in a list.
+    """
+    for rule in rules:
+        rule.Filter.PropertyIsEqualTo.Literal, rule.PolygonSymbolizer.Fill
+
+
+if __name__ == "__main__":
+    parser = OptionParser()
+    parser.add_option('-r', '--rules', dest='rules', type='int',
+                      help='Rules in the synthetic document.', default=10000)
+
+    (options, args) = parser.parse_args()
+
+    sld_doc = sld.StyledLayerDescriptor(BytesIO(make_sld(options.rules)), validate=False)
+    rules = list(sld_doc.NamedLayer.UserStyle.FeatureTypeStyle.Rules)
+
+    report('read Title, Min/MaxScaleDenominator per rule',
+           measure(lambda: read_text(rules), number=1, repeat=3), options.rules)
+    report('read Filter and PolygonSymbolizer per rule',
+           measure(lambda: read_children(rules), number=1, repeat=3), options.rules)
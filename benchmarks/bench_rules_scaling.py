@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+"""
+Benchmark how iterating and indexing the Rules list scales with the
+number of rules in a style.
+
+License
+=======
+Copyright 2011-2014 David Zwarg <U{david.a@zwarg.com}>
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+U{http://www.apache.org/licenses/LICENSE-2.0}
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from io import BytesIO
+from optparse import OptionParser
+
+from common import make_sld, measure, report
+
+import sld
+
+
+def iterate(fts):
+    """
+    Iterate over all rules in a style.
+    """
+    for rule in fts.Rules:
+        pass
+
+
+def index(fts):
+    """
+    Index every rule in a style.
+    """
+    rules = fts.Rules
+    for i in range(len(rules)):
+        rules[i]
+
+
+if __name__ == "__main__":
+    parser = OptionParser()
+    parser.add_option('-m', '--max', dest='max', type='int',
+                      help='The largest number of rules.', default=100000)
+
+    (options, args) = parser.parse_args()
+
+    nrules = 10
+    while nrules <= options.max:
+        sld_doc = sld.StyledLayerDescriptor(BytesIO(make_sld(nrules)), validate=False)
+        fts = sld_doc.NamedLayer.UserStyle.FeatureTypeStyle
+        repeat = max(1, 10000 // nrules)
+
+        report('iterate %d rules' % nrules, measure(lambda: iterate(fts), number=repeat), nrules)
+        report('index %d rules' % nrules, measure(lambda: index(fts), number=repeat), nrules)
+        nrules *= 10
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+"""
+Benchmark finding the rules of a large style that are in scale, with the
+scale index of the style and by reading the scale denominators of every
+rule, and adding a rule while the index is kept up to date.
+
+License
+=======
+Copyright 2011-2014 David Zwarg <U{david.a@zwarg.com}>
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+U{http://www.apache.org/licenses/LICENSE-2.0}
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from io import BytesIO
+from optparse import OptionParser
+
+from common import make_sld, measure, report
+
+import sld
+
+
+def scan(fts, scale):
+    """
+    Find the rules in scale by reading the scale denominators of every rule.
+    """
+    rules = []
+    for rule in fts.Rules:
+        minimum = rule.MinScaleDenominator
+        maximum = rule.MaxScaleDenominator
+        if (minimum is None or float(minimum) <= scale) and (maximum is None or scale < float(maximum)):
+            rules.append(rule)
+    return rules
+
+
+if __name__ == "__main__":
+    parser = OptionParser()
+    parser.add_option('-r', '--rules', dest='rules', type='int',
+                      help='Rules in the synthetic document.', default=5000)
+    parser.add_option('-n', '--number', dest='number', type='int',
+                      help='Queries per timing run.', default=20)
+
+    (options, args) = parser.parse_args()
+
+    sld_doc = sld.StyledLayerDescriptor(BytesIO(make_sld(options.rules)), validate=False)
+    fts = sld_doc.NamedLayer.UserStyle.FeatureTypeStyle
+    scale = 2500
+    assert [rule._node for rule in fts.rules_at(scale)] == [rule._node for rule in scan(fts, scale)]
+
+    report('scan %d rules' % options.rules,
+           measure(lambda: scan(fts, scale), number=options.number))
+    report('rules_at() %d rules, %d in scale' % (options.rules, len(fts.rules_at(scale))),
+           measure(lambda: fts.rules_at(scale), number=options.number))
+    report('build the index, %d rules' % options.rules,
+           measure(lambda: sld.ScaleIndex((rule,) + sld._scale_range(rule) for rule in fts._node),
+                   number=1))
+
+    def create():
+        fts.create_rule('new', MinScaleDenominator='1000', MaxScaleDenominator='5000')
+        fts.rules_at(scale)
+
+    report('create_rule() then rules_at()',
+           measure(create, number=options.number))
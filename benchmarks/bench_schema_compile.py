@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+"""
+Benchmark the cold-start cost of compiling the bundled SLD schema.
+
+License
+=======
+Copyright 2011-2014 David Zwarg <U{david.a@zwarg.com}>
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+U{http://www.apache.org/licenses/LICENSE-2.0}
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from optparse import OptionParser
+
+from common import measure, report
+
+import sld
+
+if __name__ == "__main__":
+    parser = OptionParser()
+    parser.add_option('-n', '--number', dest='number', type='int',
+                      help='Compilations per timing run.', default=20)
+
+    (options, args) = parser.parse_args()
+
+    report('compile bundled SLD 1.0.0 schema',
+           measure(lambda: sld._load_schema('1.0.0'), number=options.number))
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+"""
+Benchmark re-serializing a large document after editing one rule.
+
+as_sld() keeps the serialized text of every rule, so after an edit only the
+edited rule is serialized again; the text of the others is spliced in.
+
+License
+=======
+Copyright 2011-2014 David Zwarg <U{david.a@zwarg.com}>
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+U{http://www.apache.org/licenses/LICENSE-2.0}
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from io import BytesIO
+from optparse import OptionParser
+
+from lxml import etree
+
+from common import make_sld, measure, report
+
+import sld
+
+if __name__ == "__main__":
+    parser = OptionParser()
+    parser.add_option('-r', '--rules', dest='rules', type='int',
+                      help='Rules in the synthetic document.', default=5000)
+    parser.add_option('-n', '--number', dest='number', type='int',
+                      help='Serializations per timing run.', default=20)
+
+    (options, args) = parser.parse_args()
+
+    sld_doc = sld.StyledLayerDescriptor(BytesIO(make_sld(options.rules)), validate=False)
+    rules = sld_doc.NamedLayer.UserStyle.FeatureTypeStyle.Rules
+    assert sld_doc.as_sld() == etree.tostring(sld_doc._node)
+
+    edits = [0]
+
+    def edit():
+        edits[0] += 1
+        rules[edits[0] % options.rules].Title = 'Edit %d' % edits[0]
+
+    def tostring():
+        edit()
+        etree.tostring(sld_doc._node)
+
+    def as_sld():
+        edit()
+        sld_doc.as_sld()
+
+    def write():
+        edit()
+        sld_doc.write(BytesIO())
+
+    report('tostring() after one edit, %d rules' % options.rules,
+           measure(tostring, number=options.number))
+    report('as_sld() after one edit, %d rules' % options.rules,
+           measure(as_sld, number=options.number))
+    report('write() after one edit, %d rules' % options.rules,
+           measure(write, number=options.number))
+    assert sld_doc.as_sld() == etree.tostring(sld_doc._node)
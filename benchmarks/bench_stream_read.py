@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+"""
+Benchmark the peak memory of reading every rule of a very large SLD file,
+with the streaming reader and by parsing the whole document.
+
+Each measurement runs in a fresh interpreter, and reports its peak
+resident set size. The whole document is only parsed for the smaller file,
+since its tree takes many times the size of the file in memory.
+
+License
+=======
+Copyright 2011-2014 David Zwarg <U{david.a@zwarg.com}>
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+U{http://www.apache.org/licenses/LICENSE-2.0}
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from optparse import OptionParser, SUPPRESS_HELP
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import write_sld
+
+import sld
+from sld.stream import iter_rules
+
+
+def read_rules(method, path):
+    """
+    Read the title of every rule of an SLD file.
+
+    @type  method: string
+    @param method: 'stream' to use L{iter_rules}, 'parse' to load the whole
+        document.
+    @type    path: string
+    @param   path: The name of the SLD file.
+    @rtype: integer
+    @return: The number of rules read.
+    """
+    count = 0
+    if method == 'stream':
+        for item in iter_rules(path):
+            item.rule.Title
+            count += 1
+    else:
+        sld_doc = sld.StyledLayerDescriptor(path, validate=False)
+        for rule in sld_doc.NamedLayer.UserStyle.FeatureTypeStyle.Rules:
+            rule.Title
+            count += 1
+
+    return count
+
+
+if __name__ == "__main__":
+    parser = OptionParser()
+    parser.add_option('-s', '--size', dest='size', type='int',
+                      help='Size of the large SLD file, in MB.', default=1024)
+    parser.add_option('-t', '--tree-size', dest='tree_size', type='int',
+                      help='Size of the file that is also parsed whole, in MB.', default=64)
+    parser.add_option('--child', dest='child', choices=['stream', 'parse'],
+                      help=SUPPRESS_HELP)
+
+    (options, args) = parser.parse_args()
+
+    if options.child:
+        start = time.time()
+        count = read_rules(options.child, args[0])
+        # ru_maxrss is in kilobytes on Linux
+        sys.stdout.write('%d %f %d' % (count, time.time() - start,
+                                       resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))
+        sys.exit(0)
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        for size, methods in ((options.tree_size, ('parse', 'stream')), (options.size, ('stream',))):
+            path = os.path.join(tmpdir, 'large%d.sld' % size)
+            write_sld(path, size * 1024 * 1024)
+            for method in methods:
+                output = subprocess.check_output([sys.executable, __file__, '--child', method, path])
+                count, seconds, maxrss = output.decode('ascii').split()
+                print('%-48s %9.1f MB peak  %9.0f rules/s' % ('%s %d MB, %s rules' % (method, size, count),
+                                                              int(maxrss) / 1024.0, int(count) / float(seconds)))
+            os.remove(path)
+    finally:
+        shutil.rmtree(tmpdir)
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+"""
+Benchmark the peak memory of generating an SLD file with many rules, with
+the streaming writer and by building the whole document.
+
+Each measurement runs in a fresh interpreter, and reports its peak
+resident set size. The whole document is only built for the smaller rule
+count.
+
+License
+=======
+Copyright 2011-2014 David Zwarg <U{david.a@zwarg.com}>
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+U{http://www.apache.org/licenses/LICENSE-2.0}
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from optparse import OptionParser, SUPPRESS_HELP
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+# puts the repository on the path
+import common
+
+import sld
+from sld.stream import SLDWriter
+
+
+def write_rules(method, path, nrules):
+    """
+    Write an SLD file with one polygon rule per class.
+
+    @type  method: string
+    @param method: 'stream' to use L{SLDWriter}, 'tree' to build the whole
+        document and serialize it with L{sld.StyledLayerDescriptor.as_sld}.
+    @type    path: string
+    @param   path: The name of the SLD file.
+    @type  nrules: integer
+    @param nrules: The number of rules.
+    """
+    if method == 'stream':
+        with SLDWriter(path, 'parcels') as writer:
+            for i in range(nrules):
+                writer.create_rule('class %d' % i, sld.PolygonSymbolizer, filter=('class', '==', str(i)))
+    else:
+        sld_doc = sld.StyledLayerDescriptor()
+        fts = sld_doc.create_namedlayer('parcels').create_userstyle().create_featuretypestyle()
+        for i in range(nrules):
+            fts.create_rule('class %d' % i, sld.PolygonSymbolizer).create_filter('class', '==', str(i))
+        with open(path, 'wb') as f:
+            f.write(sld_doc.as_sld())
+
+
+if __name__ == "__main__":
+    parser = OptionParser()
+    parser.add_option('-r', '--rules', dest='rules', type='int',
+                      help='Rules in the large SLD file.', default=1000000)
+    parser.add_option('-t', '--tree-rules', dest='tree_rules', type='int',
+                      help='Rules in the file that is also built whole.', default=100000)
+    parser.add_option('--child', dest='child', choices=['stream', 'tree'],
+                      help=SUPPRESS_HELP)
+
+    (options, args) = parser.parse_args()
+
+    if options.child:
+        start = time.time()
+        write_rules(options.child, args[0], int(args[1]))
+        # ru_maxrss is in kilobytes on Linux
+        sys.stdout.write('%f %d' % (time.time() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))
+        sys.exit(0)
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmpdir, 'large.sld')
+        for nrules, methods in ((options.tree_rules, ('tree', 'stream')), (options.rules, ('stream',))):
+            for method in methods:
+                output = subprocess.check_output([sys.executable, __file__, '--child', method, path, str(nrules)])
+                seconds, maxrss = output.decode('ascii').split()
+                print('%-48s %9.1f MB peak  %9.0f rules/s' % ('%s %d rules, %d MB' % (
+                    method, nrules, os.path.getsize(path) / 1024 / 1024), int(maxrss) / 1024.0,
+                    nrules / float(seconds)))
+    finally:
+        shutil.rmtree(tmpdir)
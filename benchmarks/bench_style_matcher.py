@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+"""
+Benchmark assigning the rules of a style to a batch of features, with a
+StyleMatcher and with the compiled filter of each rule called once per
+feature.
+
+The style classifies a numeric property into ranges, one rule per range,
+with rules at alternating scales and an else rule.
+
+License
+=======
+Copyright 2011-2014 David Zwarg <U{david.a@zwarg.com}>
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+U{http://www.apache.org/licenses/LICENSE-2.0}
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from io import BytesIO
+from optparse import OptionParser
+
+import numpy
+
+from common import SLD_HEAD, SLD_TAIL, measure, report
+
+import sld
+from sld.matcher import StyleMatcher
+
+
+def make_rule(i, width):
+    """
+    Build the text of a rule for one range of the property.
+    """
+    return ('<sld:Rule><sld:Title>range %d</sld:Title><ogc:Filter><ogc:And>'
+            '<ogc:PropertyIsGreaterThanOrEqualTo><ogc:PropertyName>value</ogc:PropertyName>'
+            '<ogc:Literal>%d</ogc:Literal></ogc:PropertyIsGreaterThanOrEqualTo>'
+            '<ogc:PropertyIsLessThan><ogc:PropertyName>value</ogc:PropertyName>'
+            '<ogc:Literal>%d</ogc:Literal></ogc:PropertyIsLessThan></ogc:And></ogc:Filter>'
+            '<sld:MaxScaleDenominator>%d</sld:MaxScaleDenominator>'
+            '<sld:PolygonSymbolizer/></sld:Rule>' % (i, i * width, (i + 1) * width, 50000 if i % 2 else 1000000))
+
+
+if __name__ == "__main__":
+    parser = OptionParser()
+    parser.add_option('-r', '--rules', dest='rules', type='int',
+                      help='Rules in the style.', default=50)
+    parser.add_option('-f', '--features', dest='features', type='int',
+                      help='Features per batch.', default=1000000)
+
+    (options, args) = parser.parse_args()
+
+    content = SLD_HEAD + ''.join([make_rule(i, 100) for i in range(options.rules)]) + \
+        '<sld:Rule><sld:Title>other</sld:Title><sld:ElseFilter/><sld:PolygonSymbolizer/></sld:Rule>' + SLD_TAIL
+    sld_doc = sld.StyledLayerDescriptor(BytesIO(content.encode('utf-8')), validate=False)
+    fts = sld_doc.NamedLayer.UserStyle.FeatureTypeStyle
+    matcher = StyleMatcher(fts)
+
+    columns = {'value': numpy.random.RandomState(0).randint(0, options.rules * 110, options.features)}
+    scale = 100000
+
+    rules = fts.Rules
+    active = [(i, rules[i].Filter.compile()) for i in matcher.active(scale) if not rules[i].Filter is None]
+    otherwise = len(rules) - 1
+
+    def classify(feature):
+        for index, match in active:
+            if match(feature):
+                return index
+        return otherwise
+
+    sample = [{'value': int(value)} for value in columns['value'][:100000]]
+    expected = matcher.match({'value': columns['value'][:100000]}, scale).tolist()
+    assert [classify(feature) for feature in sample] == expected
+
+    report('compiled filters, per feature, %d rules' % options.rules,
+           measure(lambda: [classify(feature) for feature in sample], number=1, repeat=3), len(sample))
+    report('StyleMatcher first match, %d rules' % options.rules,
+           measure(lambda: matcher.match(columns, scale), number=1, repeat=3), options.features)
+    report('StyleMatcher all matches, %d rules' % options.rules,
+           measure(lambda: matcher.match(columns, scale, first=False), number=1, repeat=3), options.features)
+    report('StyleMatcher(), %d rules' % options.rules,
+           measure(lambda: StyleMatcher(fts), number=10))
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+"""
+Benchmark validating a catalog of SLD files, serially and with
+validate_many over an increasing number of worker processes.
+
+License
+=======
+Copyright 2011-2014 David Zwarg <U{david.a@zwarg.com}>
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+U{http://www.apache.org/licenses/LICENSE-2.0}
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from optparse import OptionParser
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+from common import make_sld, report
+
+import sld
+from sld.batch import validate_many
+
+if __name__ == "__main__":
+    parser = OptionParser()
+    parser.add_option('-f', '--files', dest='files', type='int',
+                      help='Files in the synthetic catalog.', default=2000)
+    parser.add_option('-r', '--rules', dest='rules', type='int',
+                      help='Rules in each file.', default=20)
+
+    (options, args) = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        data = make_sld(options.rules)
+        paths = []
+        for i in range(options.files):
+            paths.append(os.path.join(tmpdir, 'style%d.sld' % i))
+            with open(paths[-1], 'wb') as f:
+                f.write(data)
+
+        start = time.time()
+        for path in paths:
+            sld.StyledLayerDescriptor(path, validate=False).validate()
+        report('serial validate() %d files' % options.files, time.time() - start, options.files)
+
+        workers = 1
+        while workers <= multiprocessing.cpu_count():
+            start = time.time()
+            assert all(validate_many(paths, max_workers=workers))
+            report('validate_many(max_workers=%d) %d files' % (workers, options.files),
+                   time.time() - start, options.files)
+            workers *= 2
+    finally:
+        shutil.rmtree(tmpdir)
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+"""
+Benchmark rejecting a large invalid document, with and without a cap on
+the number of errors reported.
+
+Every rule of the synthetic document gets an element the schema does not
+allow. An uncapped report runs the schema validator over the whole document,
+a capped one stops at the first structural errors.
+
+License
+=======
+Copyright 2011-2014 David Zwarg <U{david.a@zwarg.com}>
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+U{http://www.apache.org/licenses/LICENSE-2.0}
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from io import BytesIO
+from optparse import OptionParser
+
+from common import make_sld, measure, report
+
+from lxml import etree
+
+import sld
+
+if __name__ == "__main__":
+    parser = OptionParser()
+    parser.add_option('-r', '--rules', dest='rules', type='int',
+                      help='Rules in the synthetic document.', default=10000)
+    parser.add_option('-n', '--number', dest='number', type='int',
+                      help='Reports per timing run.', default=1)
+
+    (options, args) = parser.parse_args()
+
+    sld_doc = sld.StyledLayerDescriptor(BytesIO(make_sld(options.rules)), validate=False)
+    for rule in sld_doc.NamedLayer.UserStyle.FeatureTypeStyle.Rules:
+        etree.SubElement(rule._node, '{http://www.opengis.net/sld}Unknown')
+    sld.get_schema()
+
+    def reject(**kwargs):
+        sld_doc.invalidate()
+        assert not sld_doc.report(**kwargs)
+
+    report('report() %d invalid rules' % options.rules,
+           measure(lambda: reject(), number=options.number, repeat=1))
+    report('report(max_errors=100) %d invalid rules' % options.rules,
+           measure(lambda: reject(max_errors=100), number=options.number))
+    report('report(fail_fast=True) %d invalid rules' % options.rules,
+           measure(lambda: reject(fail_fast=True), number=options.number))
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+"""
+Benchmark the first-request latency of a forked worker process, with and
+without calling sld.warmup() in the parent before forking.
+
+Each run starts a fresh interpreter, so the parent begins cold. The parent
+optionally warms up, then forks a worker, which times its first request:
+loading and validating the test fixture, and reading a few properties.
+
+License
+=======
+Copyright 2011-2014 David Zwarg <U{david.a@zwarg.com}>
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+U{http://www.apache.org/licenses/LICENSE-2.0}
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from optparse import OptionParser, SUPPRESS_HELP
+import os
+import subprocess
+import sys
+import timeit
+
+from common import STYLE_SLD, report
+
+import sld
+
+
+def first_request():
+    """
+    Serve a typical first request in a worker.
+    """
+    sld_doc = sld.StyledLayerDescriptor(STYLE_SLD)
+    sld_doc.validate()
+    rule = sld_doc.NamedLayer.UserStyle.FeatureTypeStyle.Rules[0]
+    rule.Title, rule.Filter, rule.PolygonSymbolizer
+
+
+def worker_latency(warm):
+    """
+    Fork a worker, and time its first request.
+
+    @type  warm: boolean
+    @param warm: Call L{sld.warmup} in the parent before forking.
+    @rtype: float
+    @return: The latency of the first request in the worker, in seconds.
+    """
+    if warm:
+        sld.warmup()
+
+    rfd, wfd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(rfd)
+        start = timeit.default_timer()
+        first_request()
+        os.write(wfd, repr(timeit.default_timer() - start).encode('ascii'))
+        os._exit(0)
+
+    os.close(wfd)
+    result = os.read(rfd, 64)
+    os.close(rfd)
+    os.waitpid(pid, 0)
+
+    return float(result)
+
+
+if __name__ == "__main__":
+    parser = OptionParser()
+    parser.add_option('-r', '--repeat', dest='repeat', type='int',
+                      help='Fresh interpreters per measurement.', default=10)
+    parser.add_option('--child', dest='child', choices=['cold', 'warm'],
+                      help=SUPPRESS_HELP)
+
+    (options, args) = parser.parse_args()
+
+    if options.child:
+        sys.stdout.write(repr(worker_latency(options.child == 'warm')))
+        sys.exit(0)
+
+    for mode in ('cold', 'warm'):
+        times = []
+        for i in range(options.repeat):
+            output = subprocess.check_output([sys.executable, __file__, '--child', mode])
+            times.append(float(output))
+        report('first request in forked worker (%s parent)' % mode, min(times))
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+"""
+Benchmark the memory held by SLD wrapper objects.
+
+Builds a synthetic document with many rules, then materializes and keeps
+a Rule, Filter, PolygonSymbolizer and Fill wrapper for every rule, and
+reports the memory traced while doing so.
+
+License
+=======
+Copyright 2011-2014 David Zwarg <U{david.a@zwarg.com}>
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+U{http://www.apache.org/licenses/LICENSE-2.0}
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from io import BytesIO
+from optparse import OptionParser
+import tracemalloc
+
+from common import make_sld
+
+import sld
+
+
+def materialize(fts):
+    """
+    Build and keep the wrappers for every rule in a FeatureTypeStyle.
+
+    @type  fts: L{sld.FeatureTypeStyle}
+    @param fts: The feature type style.
+    @rtype: list
+    @return: The wrappers.
+    """
+    wrappers = []
+    for rule in fts.Rules:
+        symbolizer = rule.PolygonSymbolizer
+        wrappers.append((rule, rule.Filter, symbolizer, symbolizer.Fill))
+
+    return wrappers
+
+
+if __name__ == "__main__":
+    parser = OptionParser()
+    parser.add_option('-r', '--rules', dest='rules', type='int',
+                      help='Rules in the synthetic document.', default=100000)
+
+    (options, args) = parser.parse_args()
+
+    sld_doc = sld.StyledLayerDescriptor(BytesIO(make_sld(options.rules)), validate=False)
+    fts = sld_doc.NamedLayer.UserStyle.FeatureTypeStyle
+
+    tracemalloc.start()
+    wrappers = materialize(fts)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print('%-48s %12.1f MB  %12.1f bytes/rule' % ('wrappers for %d rules' % options.rules,
+                                                   current / 1e6, float(current) / options.rules))
@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+"""
+Benchmark the construction cost of the SLD wrapper objects.
+
+License
+=======
+Copyright 2011-2014 David Zwarg <U{david.a@zwarg.com}>
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+U{http://www.apache.org/licenses/LICENSE-2.0}
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from optparse import OptionParser
+
+from common import STYLE_SLD, measure, report
+
+import sld
+
+if __name__ == "__main__":
+    parser = OptionParser()
+    parser.add_option('-n', '--number', dest='number', type='int',
+                      help='Constructions per timing run.', default=10000)
+
+    (options, args) = parser.parse_args()
+
+    sld_doc = sld.StyledLayerDescriptor(STYLE_SLD, validate=False)
+    fts = sld_doc.NamedLayer.UserStyle.FeatureTypeStyle
+    rule = fts.Rules[0]
+    symbolizer = rule.PolygonSymbolizer
+
+    report('NamedLayer', measure(lambda: sld.NamedLayer(sld_doc), number=options.number))
+    report('Rule', measure(lambda: sld.Rule(fts, 0), number=options.number))
+    report('PolygonSymbolizer', measure(lambda: sld.PolygonSymbolizer(rule), number=options.number))
+    report('Fill', measure(lambda: sld.Fill(symbolizer), number=options.number))
@@ -0,0 +1,136 @@
+"""
+Shared helpers for the python-sld benchmark scripts.
+
+License
+=======
+Copyright 2011-2014 David Zwarg <U{david.a@zwarg.com}>
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+U{http://www.apache.org/licenses/LICENSE-2.0}
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import os
+import sys
+import timeit
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+"""The root of the source tree, so the benchmarks run against the working copy."""
+
+sys.path.insert(0, ROOT)
+
+STYLE_SLD = os.path.join(ROOT, 'sld', 'test', 'style.sld')
+"""The parsed SLD fixture from the test suite."""
+
+
+def measure(func, number=100, repeat=5):
+    """
+    Time a callable, and return the best time per call, in seconds.
+
+    @type    func: callable
+    @param   func: The function to time.
+    @type  number: integer
+    @param number: The number of calls per timing run.
+    @type  repeat: integer
+    @param repeat: The number of timing runs.
+    @rtype: float
+    @return: The best time per call, in seconds.
+    """
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def report(label, seconds, count=1):
+    """
+    Print a single benchmark result line.
+
+    @type    label: string
+    @param   label: A description of the measurement.
+    @type  seconds: float
+    @param seconds: The measured time, in seconds.
+    @type    count: integer
+    @param   count: The number of items processed in that time.
+    """
+    if count > 1:
+        print('%-48s %12.3f ms  %12.0f items/s' % (label, seconds * 1e3, count / seconds))
+    else:
+        print('%-48s %12.3f us' % (label, seconds * 1e6))
+
+
+SLD_HEAD = ('<sld:StyledLayerDescriptor version="1.0.0" xmlns:sld="http://www.opengis.net/sld" '
+            'xmlns:ogc="http://www.opengis.net/ogc" xmlns:xlink="http://www.w3.org/1999/xlink" '
+            'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">'
+            '<sld:NamedLayer><sld:Name>synthetic</sld:Name><sld:UserStyle><sld:Title>synthetic</sld:Title>'
+            '<sld:FeatureTypeStyle>')
+"""The text of a synthetic SLD document, up to its first rule."""
+
+SLD_TAIL = '</sld:FeatureTypeStyle></sld:UserStyle></sld:NamedLayer></sld:StyledLayerDescriptor>'
+"""The text of a synthetic SLD document, after its last rule."""
+
+
+def make_rule(i, symbolizer='Polygon'):
+    """
+    Build the text of one synthetic rule.
+
+    @type           i: integer
+    @param          i: The index of the rule.
+    @type  symbolizer: string
+    @param symbolizer: The symbolizer type of the rule.
+    @rtype: string
+    @return: The text of the rule.
+    """
+    return ('<sld:Rule><sld:Title>class %d</sld:Title>'
+            '<ogc:Filter><ogc:PropertyIsEqualTo>'
+            '<ogc:PropertyName>category</ogc:PropertyName><ogc:Literal>%d</ogc:Literal>'
+            '</ogc:PropertyIsEqualTo></ogc:Filter>'
+            '<sld:MinScaleDenominator>%d</sld:MinScaleDenominator>'
+            '<sld:MaxScaleDenominator>%d</sld:MaxScaleDenominator>'
+            '<sld:%sSymbolizer><sld:Fill><sld:CssParameter name="fill">#%06x</sld:CssParameter></sld:Fill>'
+            '<sld:Stroke><sld:CssParameter name="stroke">#000000</sld:CssParameter></sld:Stroke>'
+            '</sld:%sSymbolizer></sld:Rule>' % (i, i, (i % 20) * 1000, (i % 20) * 1000 + 50000, symbolizer,
+                                                 i % 0xffffff, symbolizer))
+
+
+def make_sld(nrules, symbolizer='Polygon'):
+    """
+    Build the text of a synthetic SLD document with one NamedLayer, one
+    UserStyle and one FeatureTypeStyle, containing C{nrules} rules.
+
+    @type      nrules: integer
+    @param     nrules: The number of rules in the document.
+    @type  symbolizer: string
+    @param symbolizer: The symbolizer type of every rule.
+    @rtype: bytes
+    @return: The SLD document.
+    """
+    rules = [make_rule(i, symbolizer) for i in range(nrules)]
+    return (SLD_HEAD + ''.join(rules) + SLD_TAIL).encode('utf-8')
+
+
+def write_sld(path, size):
+    """
+    Write a synthetic SLD document of about C{size} bytes to a file, without
+    building it in memory. The document is the same as L{make_sld} builds.
+
+    @type  path: string
+    @param path: The name of the file.
+    @type  size: integer
+    @param size: The size of the document, in bytes.
+    @rtype: integer
+    @return: The number of rules in the document.
+    """
+    nrules = 0
+    with open(path, 'wb') as f:
+        f.write(SLD_HEAD.encode('utf-8'))
+        while f.tell() < size:
+            f.write(''.join([make_rule(i) for i in range(nrules, nrules + 1000)]).encode('utf-8'))
+            nrules += 1000
+        f.write(SLD_TAIL.encode('utf-8'))
+
+    return nrules
@@ -58,10 +58,12 @@ setup(
     keywords="ogc sld geo geoserver mapserver osgeo",
     url="http://github.com/azavea/python-sld/",
     requires=["lxml"],
+    extras_require={'numpy': ['numpy']},
     packages=["sld", "sld.test"],
-    package_data={"sld.test": ["style.sld"]},
+    package_data={"sld": ["schemas/*/*/*.xsd"], "sld.test": ["style.sld"]},
     long_description=read('README.markdown'),
     cmdclass={'test': RunTests},
+    entry_points={'console_scripts': ['sld-validate = sld.batch:main']},
     classifiers=[
         "Development Status :: 4 - Beta",
         "Intended Audience :: Developers",
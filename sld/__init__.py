@@ -32,15 +32,516 @@ limitations under the License.
 @version: 1.0.10
 @newfield prop: Property, Properties
 """
-from lxml.etree import parse, Element, XMLSchema, tostring
+from lxml.etree import parse, fromstring, Element, QName, XMLSchema, XMLParser, XPath, Resolver, iselement, tostring
+try:
+    from collections.abc import MutableSequence
+except ImportError:
+    from collections import MutableSequence
 try:
     from urllib2 import urlopen
 except ImportError:
     from urllib.request import urlopen
-from tempfile import NamedTemporaryFile
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+import mmap
 import os
+import re
+import tempfile
+import threading
 import copy
+from bisect import bisect_left
+from itertools import chain, islice
 import logging
+import weakref
+
+
+_schema_host = 'http://schemas.opengis.net/'
+"""The canonical location of the OGC schemas."""
+
+_schema_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schemas')
+"""The location of the bundled OGC schemas (SLD, Filter, GML and XLink)."""
+
+_schema_cache = {}
+"""Compiled SLD schemas, keyed by SLD version. Shared by every document in the process."""
+
+_schema_lock = threading.Lock()
+"""
+Serializes schema compilation, so each shared schema is compiled only once.
+libxml2 cannot compile schemas with imports in several threads at once.
+"""
+
+_thread_schemas = threading.local()
+"""Compiled SLD schemas of each thread, keyed by SLD version, see L{_thread_schema}."""
+
+_cache_format = '1'
+"""The layout version of the on-disk schema cache."""
+
+_cache_dir = None
+"""The on-disk schema cache location set with L{set_cache_dir}, if any."""
+
+_parser_defaults = {'remove_blank_text': False, 'huge_tree': False, 'resolve_entities': False,
+                    'no_network': True}
+"""The default options of the parser of SLD documents."""
+
+_parser_options = dict(_parser_defaults)
+"""The options of the parser of SLD documents, see L{set_parser_options}."""
+
+_parser_generation = [0]
+"""Bumped when the parser options change, so every thread makes a new parser."""
+
+_parsers = threading.local()
+"""The parser of SLD documents of each thread, and the options generation it was made in."""
+
+_buffer_types = (bytearray, memoryview, mmap.mmap) + ((bytes,) if not bytes is str else ())
+"""The types of in-memory SLD documents. Byte strings are file names in python 2."""
+
+_content_start = re.compile(b'\\s*<|\xef\xbb\xbf|\xff\xfe|\xfe\xff')
+"""The start of SLD documents held in byte strings: markup, or a byte order mark."""
+
+
+def _is_content(sld_file):
+    """
+    Determine if an SLD file is an in-memory SLD document. Byte strings are
+    only documents if they start with markup or a byte order mark, so that
+    the names of files may still be given as byte strings.
+    """
+    if not isinstance(sld_file, _buffer_types):
+        return False
+
+    if isinstance(sld_file, bytes):
+        return not _content_start.match(sld_file) is None
+
+    return True
+
+
+def bundled_schema_path(url):
+    """
+    Get the path to the bundled copy of an OGC schema.
+
+    @type  url: string
+    @param url: The location of the schema on schemas.opengis.net.
+    @rtype: string
+    @return: The path to the bundled schema file, or None if the schema is
+        not bundled with this package.
+    """
+    if url.startswith('https://'):
+        url = 'http://' + url[8:]
+    if not url.startswith(_schema_host):
+        return None
+
+    path = os.path.normpath(os.path.join(_schema_dir, *url[len(_schema_host):].split('/')))
+    if not path.startswith(_schema_dir + os.sep) or not os.path.isfile(path):
+        return None
+
+    return path
+
+
+def get_cache_dir():
+    """
+    Get the location of the on-disk cache for schemas that are not bundled
+    with this package. This is the location set with L{set_cache_dir}, the
+    C{PYTHON_SLD_CACHE_DIR} environment variable, or a C{python-sld}
+    directory in the user's XDG cache directory, in that order.
+
+    @rtype: string
+    @return: The root of the schema cache.
+    """
+    if _cache_dir is not None:
+        return _cache_dir
+
+    path = os.environ.get('PYTHON_SLD_CACHE_DIR')
+    if not path:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+        path = os.path.join(base, 'python-sld')
+
+    return path
+
+
+def set_cache_dir(path):
+    """
+    Set the location of the on-disk cache for schemas that are not bundled
+    with this package.
+
+    @type  path: string
+    @param path: The root of the schema cache, or None to restore the default.
+    """
+    global _cache_dir
+    _cache_dir = path
+
+
+def cached_schema_path(url):
+    """
+    Get the path to the cached copy of an OGC schema, fetching it into the
+    cache if it is not there yet. Only schemas on schemas.opengis.net are
+    cached.
+
+    The cache is shared by every process on the host: the schema is fetched
+    under an exclusive file lock, and written to a temporary file that is
+    renamed into place, so no process ever reads a partially written schema,
+    and each schema is fetched at most once.
+
+    @type  url: string
+    @param url: The location of the schema on schemas.opengis.net.
+    @rtype: string
+    @return: The path to the cached schema file, or None if the schema is
+        not on schemas.opengis.net.
+    """
+    if url.startswith('https://'):
+        url = 'http://' + url[8:]
+    if not url.startswith(_schema_host):
+        return None
+
+    root = os.path.abspath(os.path.join(get_cache_dir(), _cache_format))
+    path = os.path.normpath(os.path.join(root, *url[len(_schema_host):].split('/')))
+    if not path.startswith(root + os.sep):
+        return None
+    if os.path.isfile(path):
+        return path
+
+    dirname = os.path.dirname(path)
+    if not os.path.isdir(dirname):
+        try:
+            os.makedirs(dirname)
+        except OSError:
+            if not os.path.isdir(dirname):
+                raise
+
+    lock = open(path + '.lock', 'a')
+    try:
+        if fcntl is not None:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+
+        # another process may have fetched it while we waited for the lock
+        if os.path.isfile(path):
+            return path
+
+        logging.debug('Fetching schema %s into the cache.', url)
+        resp = urlopen(url)
+        try:
+            content = resp.read()
+        finally:
+            resp.close()
+
+        handle, tmppath = tempfile.mkstemp(dir=dirname, suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'wb') as tmp:
+                tmp.write(content)
+                tmp.flush()
+                os.fsync(tmp.fileno())
+            if hasattr(os, 'replace'):
+                os.replace(tmppath, path)
+            else:
+                os.rename(tmppath, path)
+        except:
+            if os.path.exists(tmppath):
+                os.remove(tmppath)
+            raise
+    finally:
+        if fcntl is not None:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+        lock.close()
+
+    return path
+
+
+class SchemaResolver(Resolver):
+    """
+    An lxml resolver that maps schema locations on schemas.opengis.net to
+    the copies bundled with this package, so that compiling a bundled SLD
+    schema never touches the network. Schemas that are not bundled are
+    resolved from the on-disk schema cache.
+    """
+    def resolve(self, url, pubid, context):
+        """
+        Resolve a schema location to a bundled schema file.
+
+        @type      url: string
+        @param     url: The system URL of the requested document.
+        @type    pubid: string
+        @param   pubid: The public ID of the requested document.
+        @type  context: object
+        @param context: The lxml resolver context.
+        @return: The resolved document, or None if the schema is not
+            available locally.
+        """
+        path = bundled_schema_path(url)
+        if path is not None:
+            return self.resolve_filename(path, context)
+
+        try:
+            path = cached_schema_path(url)
+        except (IOError, OSError):
+            logging.warning('Could not fetch schema %s.', url)
+            return None
+        if path is None:
+            return None
+
+        # keep the remote base url, so relative includes resolve through here
+        return self.resolve_file(open(path, 'rb'), context, base_url=url)
+
+
+def set_parser_options(**options):
+    """
+    Set the options of the parser of SLD documents, see
+    C{lxml.etree.XMLParser}. Options that are not given keep their default:
+    entities are not resolved, documents are not fetched from the network,
+    and documents deeper than libxml2's safety limits are rejected. Set
+    huge_tree to True to load such documents from trusted sources.
+
+    The formatting of loaded documents is kept by default. Set
+    remove_blank_text to True to drop the indentation between elements,
+    which makes indented documents faster to parse and smaller in memory,
+    and lets L{StyledLayerDescriptor.as_sld} indent them again.
+
+    @type  options: dict
+    @param options: The parser options.
+    """
+    global _parser_options
+    _parser_options = dict(_parser_defaults, **options)
+    _parser_generation[0] += 1
+
+
+def get_parser():
+    """
+    Get the parser of SLD documents for the current thread. lxml parsers
+    cannot parse in two threads at once, so each thread reuses its own
+    parser, made with the options set with L{set_parser_options}.
+
+    @rtype: XMLParser
+    @return: The parser.
+    """
+    generation = _parser_generation[0]
+    if getattr(_parsers, 'generation', None) != generation:
+        _parsers.parser = XMLParser(**_parser_options)
+        _parsers.generation = generation
+
+    return _parsers.parser
+
+
+def get_schema(version='1.0.0'):
+    """
+    Get the compiled SLD schema for a version of the SLD specification. The
+    schema is compiled on first use, and the compiled object is shared by all
+    L{StyledLayerDescriptor} instances for the life of the process.
+
+    The shared schema is used where only the result of validation is read.
+    Every validation clears and fills the error log of the schema, so
+    L{StyledLayerDescriptor.report}, which reads it, uses a schema compiled
+    once per thread instead, see L{_thread_schema}.
+
+    @type  version: string
+    @param version: The SLD version of the schema.
+    @rtype: XMLSchema
+    @return: The compiled SLD schema.
+    """
+    schema = _schema_cache.get(version)
+    if schema is None:
+        with _schema_lock:
+            schema = _schema_cache.get(version)
+            if schema is None:
+                logging.debug('Compiling schema for SLD version %s.', version)
+                schema = _load_schema(version)
+                _schema_cache[version] = schema
+
+    return schema
+
+
+def _thread_schema(version='1.0.0'):
+    """
+    Get the compiled SLD schema of the current thread for a version of the
+    SLD specification. Every validation clears and fills the error log of
+    the schema, so a schema whose error log is read is not shared with
+    other threads. It is compiled on first use in each thread.
+
+    @type  version: string
+    @param version: The SLD version of the schema.
+    @rtype: XMLSchema
+    @return: The compiled SLD schema.
+    """
+    schemas = getattr(_thread_schemas, 'schemas', None)
+    if schemas is None:
+        schemas = _thread_schemas.schemas = {}
+
+    schema = schemas.get(version)
+    if schema is None:
+        logging.debug('Compiling schema for SLD version %s in this thread.', version)
+        with _schema_lock:
+            schema = schemas[version] = _load_schema(version)
+
+    return schema
+
+
+def _load_schema(version):
+    """
+    Compile the SLD schema for a version of the SLD specification. Bundled
+    schemas are always preferred; any other schema is fetched once into the
+    on-disk schema cache. Network access is disabled while parsing.
+
+    @type  version: string
+    @param version: The SLD version of the schema.
+    @rtype: XMLSchema
+    @return: The compiled SLD schema.
+    """
+    url = '%ssld/%s/StyledLayerDescriptor.xsd' % (_schema_host, version)
+    path = bundled_schema_path(url)
+    if path is None:
+        try:
+            path = cached_schema_path(url)
+        except (IOError, OSError):
+            raise ValueError('The schema for SLD version "%s" is not bundled, and could not be fetched.' % version)
+
+    parser = XMLParser(no_network=True)
+    parser.resolvers.add(SchemaResolver())
+
+    return XMLSchema(parse(path, parser, base_url=url))
+
+
+_xpaths = {}
+"""Compiled XPath expressions for element lookups, keyed by expression."""
+
+
+def _xpath(expr):
+    """
+    Get a compiled XPath expression, in the namespaces of SLD documents.
+    Expressions are compiled on first use, and shared for the life of the
+    process.
+
+    @type  expr: string
+    @param expr: The XPath expression, with namespace prefixes.
+    @rtype: XPath
+    @return: The compiled XPath expression.
+    """
+    xpath = _xpaths.get(expr)
+    if xpath is None:
+        xpath = XPath(expr, namespaces=SLDNode._nsmap)
+        _xpaths[expr] = xpath
+
+    return xpath
+
+
+_wrappers = weakref.WeakValueDictionary()
+"""
+Wrapper objects, keyed by the element they wrap, so that navigating to the
+same element returns the same wrapper. An entry lives as long as its wrapper.
+"""
+
+
+def _forget(node):
+    """
+    Forget the wrapper of an element that is removed from its parent.
+
+    @type  node: etree.Element
+    @param node: The removed element.
+    """
+    _wrappers.pop(node, None)
+
+
+class _Document(object):
+    """
+    The change tracking state of one SLD document. Changes made through this
+    library mark the elements that need to be normalized again, and the
+    elements whose structure needs to be checked again, and advance the
+    generation, which invalidates the cached validation result.
+    """
+    __slots__ = ('generation', 'dirty', 'everything', 'unchecked', 'structured', 'validated', 'valid',
+                 'fragments', 'heads', 'scales', '__weakref__')
+
+    def __init__(self):
+        """
+        Create the state of a document that has not been normalized or
+        validated yet.
+        """
+        self.generation = 0
+        self.dirty = {}
+        self.everything = True
+        self.unchecked = {}
+        self.structured = False
+        self.validated = None
+        self.valid = None
+        self.fragments = {}
+        self.heads = {}
+        self.scales = {}
+
+
+_documents = weakref.WeakValueDictionary()
+"""The change tracking state of each L{StyledLayerDescriptor}, keyed by root element."""
+
+
+def _document_of(node):
+    """
+    Get the change tracking state of the document an element is part of.
+    lxml keeps an element that was removed from its parent in the same
+    document, so the element must also be attached under the root.
+
+    @type  node: etree.Element
+    @param node: The element.
+    @rtype: L{_Document}
+    @return: The state of the document, or None if the element is not
+        attached to a tracked document.
+    """
+    root = node.getroottree().getroot()
+    doc = _documents.get(root)
+    if doc is None or not _attached(node, root):
+        return None
+
+    return doc
+
+
+def _attached(node, root):
+    """
+    Check that an element is attached under the root element of its
+    document.
+
+    @type  node: etree.Element
+    @param node: The element.
+    @type  root: etree.Element
+    @param root: The root element of the document.
+    @rtype: boolean
+    @return: True if the element is the root, or one of its descendants.
+    """
+    return node is root or root in node.iterancestors()
+
+
+def _changed(node, children=True, deep=False):
+    """
+    Record a change made through this library to an element of a document.
+
+    @type      node: etree.Element
+    @param     node: The changed element.
+    @type  children: boolean
+    @param children: Optional. Children may have been added to the element, so
+        they need to be sorted again by L{_normalize}.
+    @type      deep: boolean
+    @param     deep: Optional. The whole subtree of the element is new, and
+        needs to be normalized again.
+    """
+    doc = _document_of(node)
+    if doc is None:
+        return
+
+    doc.generation += 1
+    if doc.fragments:
+        # the serialized text of the element and its ancestors is stale
+        doc.fragments.pop(node, None)
+        for ancestor in node.iterancestors():
+            doc.fragments.pop(ancestor, None)
+
+    if doc.structured:
+        # removed children and attributes change the structure too
+        if deep:
+            doc.unchecked[node] = True
+        elif not node in doc.unchecked:
+            doc.unchecked[node] = False
+
+    if doc.everything:
+        return
+
+    if deep:
+        doc.dirty[node] = True
+    elif children and not node in doc.dirty:
+        doc.dirty[node] = False
 
 
 class SLDNode(object):
@@ -51,7 +552,13 @@ class SLDNode(object):
 
     The SLDNode base class also contains utility methods to construct properties
     for child SLDNode objects.
+
+    Wrappers remember the children found through their properties, and
+    wrappers are shared per element, see L{wrap}. Elements that are removed
+    or replaced through this library are forgotten; changes made directly to
+    the underlying lxml elements may not be seen by existing wrappers.
     """
+    __slots__ = ('_parent', '_node', '_children', '__weakref__')
 
     _nsmap = {
         'sld': "http://www.opengis.net/sld",
@@ -78,6 +585,76 @@ class SLDNode(object):
         else:
             self._parent = parent._parent
         self._node = None
+        self._children = None
+
+    @classmethod
+    def wrap(cls, parent, node):
+        """
+        Wrap an existing element, without looking it up in the parent. If the
+        element is already wrapped in this class, under the same parent, the
+        existing wrapper is returned.
+
+        @type  parent: etree.Element
+        @param parent: The parent element.
+        @type    node: etree.Element
+        @param   node: The element to wrap.
+        @rtype: L{SLDNode}
+        @return: The wrapped node, in this class.
+        """
+        elem = _wrappers.get(node)
+        if elem is not None and elem.__class__ is cls and elem._parent is parent:
+            return elem
+
+        elem = cls.__new__(cls)
+        elem._parent = parent
+        elem._node = node
+        elem._children = None
+        _wrappers[node] = elem
+        return elem
+
+    def _child(self, xpath, cls=None):
+        """
+        Get the only child element matched by an expression, optionally
+        wrapped in a class. The child is remembered, and found again without
+        a query for as long as its element remains a child of this node.
+
+        @type  xpath: XPath
+        @param xpath: The compiled expression for the child element.
+        @type    cls: class
+        @param   cls: Optional. The class of the child wrapper. The same
+            class must be used for every lookup with this expression.
+        @rtype: etree.Element, L{SLDNode}
+        @return: The child element or wrapper, or None if there is not
+            exactly one match.
+        """
+        children = self._children
+        if children is not None:
+            child = children.get(xpath)
+            if child is not None:
+                node = child if cls is None else child._node
+                if node.getparent() is self._node:
+                    return child
+
+        nodes = xpath(self._node)
+        if len(nodes) != 1:
+            return None
+
+        child = nodes[0] if cls is None else cls.wrap(self._node, nodes[0])
+        if children is None:
+            children = self._children = {}
+        children[xpath] = child
+        return child
+
+    def _remove(self, node):
+        """
+        Remove a child element from this node, and forget it.
+
+        @type  node: etree.Element
+        @param node: The child element.
+        """
+        self._node.remove(node)
+        _forget(node)
+        _changed(self._node, children=False)
 
     @staticmethod
     def makeproperty(ns, cls=None, name=None, docstring='', descendant=True):
@@ -101,23 +678,33 @@ class SLDNode(object):
         @rtype:  property attribute
         @return: A property attribute for this named property.
         """
+        if cls is None:
+            child_xpath = _xpath('%s:%s' % (ns, name))
+        else:
+            child_xpath = _xpath('%s:%s' % (ns, cls.__name__))
+
+        def get_node(self):
+            """
+            Get the element of the property.
+            """
+            child = self._child(child_xpath, cls)
+            if cls is None or child is None:
+                return child
+            return child._node
+
         def get_property(self):
             """
             A generic property getter.
             """
             if cls is None:
-                xpath = '%s:%s' % (ns, name)
-            else:
-                xpath = '%s:%s' % (ns, cls.__name__)
+                node = self._child(child_xpath)
+                return None if node is None else node.text
+            elif descendant:
+                return self._child(child_xpath, cls)
 
-            xpath = self._node.xpath(xpath, namespaces=SLDNode._nsmap)
+            xpath = child_xpath(self._node)
             if len(xpath) == 1:
-                if cls is None:
-                    return xpath[0].text
-                else:
-                    elem = cls.__new__(cls)
-                    cls.__init__(elem, self, descendant=descendant)
-                    return elem
+                return cls.wrap(self._parent, xpath[0])
             else:
                 return None
 
@@ -125,17 +712,15 @@ class SLDNode(object):
             """
             A generic property setter.
             """
-            if cls is None:
-                xpath = '%s:%s' % (ns, name)
-            else:
-                xpath = '%s:%s' % (ns, cls.__name__)
-
-            xpath = self._node.xpath(xpath, namespaces=SLDNode._nsmap)
-            if len(xpath) == 1:
+            node = get_node(self)
+            if not node is None:
                 if cls is None:
-                    xpath[0].text = value
-                else:
-                    xpath[0] = value._node
+                    node.text = value
+                    _changed(node, children=False)
+                elif not node is value._node:
+                    self._node.replace(node, value._node)
+                    _forget(node)
+                    _changed(value._node, deep=True)
             else:
                 if cls is None:
                     elem = self._node.makeelement('{%s}%s' % (SLDNode._nsmap[ns], name), nsmap=SLDNode._nsmap)
@@ -143,19 +728,16 @@ class SLDNode(object):
                     self._node.append(elem)
                 else:
                     self._node.append(value._node)
+                    _changed(value._node, deep=True)
+                _changed(self._node)
 
         def del_property(self):
             """
             A generic property deleter.
             """
-            if cls is None:
-                xpath = '%s:%s' % (ns, name)
-            else:
-                xpath = '%s:%s' % (ns, cls.__name__)
-
-            xpath = self._node.xpath(xpath, namespaces=SLDNode._nsmap)
-            if len(xpath) == 1:
-                self._node.remove(xpath[0])
+            node = get_node(self)
+            if not node is None:
+                self._remove(node)
 
         return property(get_property, set_property, del_property, docstring)
 
@@ -173,7 +755,7 @@ class SLDNode(object):
         @return: The wrapped node, in the parent's property class. This will
                  always be a descendent of SLDNode.
         """
-        if len(self._node.xpath('%s:%s' % (ns, name), namespaces=SLDNode._nsmap)) == 1:
+        if len(_xpath('%s:%s' % (ns, name))(self._node)) == 1:
             return getattr(self, name)
 
         return self.create_element(ns, name)
@@ -192,14 +774,222 @@ class SLDNode(object):
         """
         elem = self._node.makeelement('{%s}%s' % (SLDNode._nsmap[ns], name), nsmap=SLDNode._nsmap)
         self._node.append(elem)
+        _changed(self._node)
 
         return getattr(self, name)
 
 
+_child_order = {
+    'sld:StyledLayerDescriptor': ['sld:Name', 'sld:Title', 'sld:Abstract', ('sld:NamedLayer', 'sld:UserLayer')],
+    'sld:NamedLayer': ['sld:Name', 'sld:LayerFeatureConstraints', ('sld:NamedStyle', 'sld:UserStyle')],
+    'sld:UserStyle': ['sld:Name', 'sld:Title', 'sld:Abstract', 'sld:IsDefault', 'sld:FeatureTypeStyle'],
+    'sld:FeatureTypeStyle': ['sld:Name', 'sld:Title', 'sld:Abstract', 'sld:FeatureTypeName',
+                             'sld:SemanticTypeIdentifier', 'sld:Rule'],
+    'sld:Rule': ['sld:Name', 'sld:Title', 'sld:Abstract', 'sld:LegendGraphic', ('ogc:Filter', 'sld:ElseFilter'),
+                 'sld:MinScaleDenominator', 'sld:MaxScaleDenominator', 'sld:PolygonSymbolizer',
+                 'sld:LineSymbolizer', 'sld:TextSymbolizer', 'sld:PointSymbolizer', 'sld:RasterSymbolizer'],
+    'sld:PolygonSymbolizer': ['sld:Geometry', 'sld:Fill', 'sld:Stroke'],
+    'sld:LineSymbolizer': ['sld:Geometry', 'sld:Stroke'],
+    'sld:PointSymbolizer': ['sld:Geometry', 'sld:Graphic'],
+    'sld:TextSymbolizer': ['sld:Geometry', 'sld:Label', 'sld:Font', 'sld:LabelPlacement', 'sld:Halo', 'sld:Fill'],
+    'sld:Graphic': [('sld:ExternalGraphic', 'sld:Mark'), 'sld:Opacity', 'sld:Size', 'sld:Rotation'],
+    'sld:Mark': ['sld:WellKnownName', 'sld:Fill', 'sld:Stroke'],
+    'sld:Fill': ['sld:GraphicFill', 'sld:CssParameter'],
+    'sld:Stroke': [('sld:GraphicFill', 'sld:GraphicStroke'), 'sld:CssParameter'],
+    'sld:Halo': ['sld:Radius', 'sld:Fill'],
+}
+"""
+The schema order of the children of SLD elements. Alternatives in a choice
+share a place in the order. The symbolizers of a rule are ordered by type.
+"""
+
+
+def _qname(name):
+    """
+    Expand a prefixed element name into its qualified tag.
+
+    @type  name: string
+    @param name: The prefixed name, such as 'sld:Rule'.
+    @rtype: string
+    @return: The qualified tag, such as '{http://www.opengis.net/sld}Rule'.
+    """
+    ns, local = name.split(':')
+    return '{%s}%s' % (SLDNode._nsmap[ns], local)
+
+
+def _make_ranks(order):
+    """
+    Build the lookup tables of child ranks from a table of child orders.
+
+    @type  order: dict
+    @param order: The order of children, keyed by prefixed parent name.
+    @rtype: dict
+    @return: Dictionaries of child rank by qualified tag, keyed by the
+        qualified tag of the parent.
+    """
+    ranks = {}
+    for parent, children in order.items():
+        table = ranks[_qname(parent)] = {}
+        for rank, names in enumerate(children):
+            if not isinstance(names, tuple):
+                names = (names,)
+            for name in names:
+                table[_qname(name)] = rank
+
+    return ranks
+
+
+_child_ranks = _make_ranks(_child_order)
+"""Child ranks for normalizing, keyed by the qualified tags of the parent and child."""
+
+
+def _normalize(node):
+    """
+    Sort the children of every element in a subtree into schema order, see
+    L{_child_order}. The sort is stable, and elements that are not in the
+    order table keep their place ahead of the ordered ones, in their original
+    order. Comments and processing instructions stay after the element they
+    follow. Elements that are already in order are not touched.
+
+    @type  node: etree.Element
+    @param node: The root of the subtree to normalize.
+    """
+    for elem in list(node.iter(*_child_ranks)):
+        _sort_children(elem)
+
+
+def _sort_children(elem):
+    """
+    Sort the children of one element into schema order, see L{_normalize}.
+
+    @type  elem: etree.Element
+    @param elem: The element whose children are sorted.
+    """
+    ranks = _child_ranks.get(elem.tag)
+    if ranks is None:
+        return
+
+    keys = []
+    rank = -1
+    ordered = True
+    for child in elem:
+        # comments and processing instructions have a factory as their tag
+        if not callable(child.tag):
+            last, rank = rank, ranks.get(child.tag, -1)
+            if rank < last:
+                ordered = False
+        keys.append(rank)
+
+    if not ordered:
+        children = list(elem)
+        elem[:] = [children[i] for i in sorted(range(len(keys)), key=keys.__getitem__)]
+        _changed(elem, children=False)
+
+
+_containers = frozenset([_qname(name) for name in
+                         ('sld:StyledLayerDescriptor', 'sld:NamedLayer', 'sld:UserStyle', 'sld:FeatureTypeStyle')])
+"""The qualified tags of the elements that are serialized piecewise, see L{_serialize}."""
+
+_start_tag = re.compile(br'<([^\s/>]+)((?: xmlns(?::[^=]+)?="[^"]*")*)')
+"""Matches the tag name and namespace declarations at the start of a serialized element."""
+
+_declaration = re.compile(br' xmlns(?::[^=]+)?="[^"]*"')
+"""Matches one serialized namespace declaration."""
+
+_head = re.compile(br'<[^>"]*(?:"[^"]*"[^>"]*)*>[^<]*')
+"""Matches the start tag and text of a serialized element."""
+
+
+def _declarations(elem):
+    """
+    Get the namespace declarations in scope at an element, as serialized.
+
+    @type  elem: etree.Element
+    @param elem: The element.
+    @rtype: frozenset
+    @return: The serialized declarations.
+    """
+    declarations = []
+    for prefix, uri in elem.nsmap.items():
+        if prefix is None:
+            declarations.append((' xmlns="%s"' % uri).encode('utf-8'))
+        else:
+            declarations.append((' xmlns:%s="%s"' % (prefix, uri)).encode('utf-8'))
+
+    return frozenset(declarations)
+
+
+def _fragment(elem, inherited, with_tail=True):
+    """
+    Serialize an element as it appears inside its parent. lxml declares
+    every namespace in scope on a serialized subtree; the declarations
+    already made by the ancestors are removed again.
+
+    @type       elem: etree.Element
+    @param      elem: The element.
+    @type  inherited: frozenset
+    @param inherited: The declarations in scope at the parent, see L{_declarations}.
+    @rtype: bytes
+    @return: The serialized element.
+    """
+    data = tostring(elem, with_tail=with_tail)
+    match = _start_tag.match(data)
+    if match is None or not match.group(2):
+        return data
+
+    declarations = [decl for decl in _declaration.findall(match.group(2)) if not decl in inherited]
+    return data[:match.start(2)] + b''.join(declarations) + data[match.end(2):]
+
+
+def _serialize(elem, parts, inherited, doc, fragments, heads):
+    """
+    Serialize an element piecewise, from the cached serialized text of its
+    children where possible. The start and end tags of the elements in
+    L{_containers} are cached in the heads, and the text of their other
+    children in the fragments, each keyed by element.
+
+    @type       elem: etree.Element
+    @param      elem: The element.
+    @type      parts: list
+    @param     parts: The serialized text, to which the parts are appended.
+    @type  inherited: frozenset
+    @param inherited: The declarations in scope at the parent, see L{_declarations}.
+    @type        doc: L{_Document}
+    @param       doc: The tracking state, with the text cached by the last pass.
+    @type  fragments: dict
+    @param fragments: The text of non-container elements, cached by this pass.
+    @type      heads: dict
+    @param     heads: The start and end tags of container elements, cached by this pass.
+    """
+    tags = doc.heads.get(elem)
+    if tags is None:
+        data = _fragment(elem, inherited)
+        head = _head.match(data).group(0)
+        tail = data[data.rindex(b'>') + 1:]
+        tags = (head, b'</' + _start_tag.match(data).group(1) + b'>' + tail)
+    heads[elem] = tags
+
+    parts.append(tags[0])
+    inherited = _declarations(elem)
+    for child in elem:
+        if child.tag in _containers and len(child):
+            _serialize(child, parts, inherited, doc, fragments, heads)
+            continue
+
+        data = doc.fragments.get(child)
+        if data is None:
+            data = _fragment(child, inherited)
+        fragments[child] = data
+        parts.append(data)
+    parts.append(tags[1])
+
+
 class CssParameter(SLDNode):
     """
     A css styling parameter. May be a child of L{Fill}, L{Font}, and L{Stroke}.
     """
+    __slots__ = ()
+
     def __init__(self, parent, index, descendant=True):
         """
         Create a new CssParameter from an existing StyleItem.
@@ -212,7 +1002,7 @@ class CssParameter(SLDNode):
         @param descendant: Does this element descend from the parent, or is it a sibling?
         """
         super(CssParameter, self).__init__(parent, descendant=descendant)
-        self._node = self._parent.xpath('sld:CssParameter', namespaces=SLDNode._nsmap)[index]
+        self._node = _xpath('sld:CssParameter')(self._parent)[index]
 
     def get_name(self):
         """
@@ -231,12 +1021,14 @@ class CssParameter(SLDNode):
         @param value: The value of the 'name' attribute.
         """
         self._node.attrib['name'] = value
+        _changed(self._node, children=False)
 
     def del_name(self):
         """
         Delete the name attribute.
         """
         del self._node.attrib['name']
+        _changed(self._node, children=False)
 
     Name = property(get_name, set_name, del_name, "The value of the 'name' attribute.")
     """The value of the 'name' attribute."""
@@ -258,12 +1050,14 @@ class CssParameter(SLDNode):
         @param value: The text content.
         """
         self._node.text = value
+        _changed(self._node, children=False)
 
     def del_value(self):
         """
         Delete the text content.
         """
         self._node.clear()
+        _changed(self._node, children=False)
 
     Value = property(get_value, set_value, del_value, "The value of the parameter.")
     """The value of the parameter."""
@@ -274,6 +1068,8 @@ class CssParameters(SLDNode):
     A collection of L{CssParameter} nodes. This is a pythonic helper (list of
     nodes) that does not correspond to a true element in the SLD spec.
     """
+    __slots__ = ('_nodes',)
+
     def __init__(self, parent):
         """
         Create a new list of CssParameters from the specified parent node.
@@ -283,7 +1079,7 @@ class CssParameters(SLDNode):
         """
         super(CssParameters, self).__init__(parent)
         self._node = None
-        self._nodes = self._parent.xpath('sld:CssParameter', namespaces=SLDNode._nsmap)
+        self._nodes = _xpath('sld:CssParameter')(self._parent)
 
     def __len__(self):
         """
@@ -303,7 +1099,7 @@ class CssParameters(SLDNode):
         @rtype: L{CssParameter}
         @return: The specific L{CssParameter} node.
         """
-        return CssParameter(self, key, descendant=False)
+        return CssParameter.wrap(self._parent, self._nodes[key])
 
     def __setitem__(self, key, value):
         """
@@ -315,9 +1111,12 @@ class CssParameters(SLDNode):
         @param value: The new value of the specific child node.
         """
         if isinstance(value, CssParameter):
-            self._nodes.replace(self._nodes[key], value._node)
-        elif isinstance(value, Element):
-            self._nodes.replace(self._nodes[key], value)
+            value = value._node
+        if iselement(value):
+            self._parent.replace(self._nodes[key], value)
+            _forget(self._nodes[key])
+            self._nodes[key] = value
+            _changed(value, deep=True)
 
     def __delitem__(self, key):
         """
@@ -326,13 +1125,17 @@ class CssParameters(SLDNode):
         @type  key: integer
         @param key: The index of the child node.
         """
-        self._nodes.remove(self._nodes[key])
+        self._parent.remove(self._nodes[key])
+        _forget(self._nodes.pop(key))
+        _changed(self._parent, children=False)
 
 
 class StyleItem(SLDNode):
     """
     Abstract base class for all nodes that contain a list of L{CssParameter} nodes.
     """
+    __slots__ = ()
+
     def __init__(self, parent, name, descendant=True):
         """
         Create a new StyleItem.
@@ -345,10 +1148,11 @@ class StyleItem(SLDNode):
         @param descendant: Does this element descend from the parent, or is it a sibling?
         """
         super(StyleItem, self).__init__(parent, descendant=descendant)
-        xpath = self._parent.xpath('sld:' + name, namespaces=SLDNode._nsmap)
+        xpath = _xpath('sld:' + name)(self._parent)
         if len(xpath) < 1:
             self._node = self._parent.makeelement('{%s}%s' % (SLDNode._nsmap['sld'], name), nsmap=SLDNode._nsmap)
             self._parent.append(self._node)
+            _changed(self._parent)
         else:
             self._node = xpath[0]
 
@@ -376,12 +1180,13 @@ class StyleItem(SLDNode):
         """
         elem = self._node.makeelement('{%s}CssParameter' % SLDNode._nsmap['sld'], nsmap=SLDNode._nsmap)
         self._node.append(elem)
+        _changed(self._node)
 
         if not (name is None or value is None):
             elem.attrib['name'] = name
             elem.text = value
 
-        return CssParameter(self, len(self._node) - 1)
+        return CssParameter.wrap(self._node, elem)
 
 
 class Fill(StyleItem):
@@ -394,6 +1199,8 @@ class Fill(StyleItem):
 
     This class is a property of any L{Symbolizer}.
     """
+    __slots__ = ()
+
     def __init__(self, parent, descendant=True):
         """
         Create a new Fill node from the specified parent.
@@ -418,6 +1225,8 @@ class Font(StyleItem):
 
     This class is a property of any L{Symbolizer}.
     """
+    __slots__ = ()
+
     def __init__(self, parent, descendant=True):
         """
         Create a new Font node from the specified parent.
@@ -445,6 +1254,8 @@ class Stroke(StyleItem):
 
     This class is a property of any L{Symbolizer}.
     """
+    __slots__ = ()
+
     def __init__(self, parent, descendant=True):
         """
         Create a new Stroke node from the specified parent.
@@ -482,6 +1293,8 @@ class Symbolizer(SLDNode):
 
         I{Type}: L{Stroke}
     """
+    __slots__ = ()
+
     def __init__(self, parent, name, descendant=True):
         """
         Create a new Symbolizer node. If the specified node is not found in the
@@ -500,19 +1313,20 @@ class Symbolizer(SLDNode):
         if name[len(name) - 1] == '*':
             name = name[0:-1] + 'Symbolizer'
 
-        xpath = self._parent.xpath('sld:%s' % name, namespaces=SLDNode._nsmap)
+        xpath = _xpath('sld:%s' % name)(self._parent)
         if len(xpath) < 1:
             self._node = self._parent.makeelement('{%s}%s' % (SLDNode._nsmap['sld'], name), nsmap=SLDNode._nsmap)
             self._parent.append(self._node)
+            _changed(self._parent)
         else:
             self._node = xpath[0]
 
-        setattr(self.__class__, 'Fill', SLDNode.makeproperty('sld', cls=Fill,
-                docstring="The parameters for describing the fill styling."))
-        setattr(self.__class__, 'Font', SLDNode.makeproperty('sld', cls=Font,
-                docstring="The parameters for describing the font styling."))
-        setattr(self.__class__, 'Stroke', SLDNode.makeproperty('sld', cls=Stroke,
-                docstring="The parameters for describing the stroke styling."))
+    Fill = SLDNode.makeproperty('sld', cls=Fill,
+                                docstring="The parameters for describing the fill styling.")
+    Font = SLDNode.makeproperty('sld', cls=Font,
+                                docstring="The parameters for describing the font styling.")
+    Stroke = SLDNode.makeproperty('sld', cls=Stroke,
+                                  docstring="The parameters for describing the stroke styling.")
 
     def create_fill(self):
         """
@@ -561,6 +1375,8 @@ class PolygonSymbolizer(Symbolizer):
 
         I{Type}: L{Stroke}
     """
+    __slots__ = ()
+
     def __init__(self, parent, descendant=True):
         """
         Create a new PolygonSymbolizer node, as a child of the specified parent.
@@ -585,6 +1401,8 @@ class LineSymbolizer(Symbolizer):
 
         I{Type}: L{Stroke}
     """
+    __slots__ = ()
+
     def __init__(self, parent, descendant=True):
         """
         Create a new LineSymbolizer node, as a child of the specified parent.
@@ -609,6 +1427,8 @@ class TextSymbolizer(Symbolizer):
 
         I{Type}: L{Fill}
     """
+    __slots__ = ()
+
     def __init__(self, parent, descendant=True):
         """
         Create a new TextSymbolizer node, as a child of the specified parent.
@@ -652,6 +1472,8 @@ class Mark(Symbolizer):
 
         I{Type}: string
     """
+    __slots__ = ()
+
     def __init__(self, parent, descendant=True):
         """
         Create a new Mark node, as a child of the specified parent.
@@ -663,8 +1485,8 @@ class Mark(Symbolizer):
         """
         super(Mark, self).__init__(parent, 'Mark', descendant=descendant)
 
-        setattr(self.__class__, 'WellKnownName', SLDNode.makeproperty('sld', name='WellKnownName',
-                docstring="The well known name for the mark."))
+    WellKnownName = SLDNode.makeproperty('sld', name='WellKnownName',
+                                         docstring="The well known name for the mark.")
 
 
 class Graphic(SLDNode):
@@ -696,6 +1518,8 @@ class Graphic(SLDNode):
 
         I{Type}: float
     """
+    __slots__ = ()
+
     def __init__(self, parent, descendant=True):
         """
         Create a new Graphic node, as a child of the specified parent.
@@ -706,21 +1530,22 @@ class Graphic(SLDNode):
         @param descendant: A flag indicating if this is a descendant node of the parent.
         """
         super(Graphic, self).__init__(parent, descendant=descendant)
-        xpath = self._parent.xpath('sld:Graphic', namespaces=SLDNode._nsmap)
+        xpath = _xpath('sld:Graphic')(self._parent)
         if len(xpath) < 1:
             self._node = self._parent.makeelement('{%s}Graphic' % SLDNode._nsmap['sld'], nsmap=SLDNode._nsmap)
             self._parent.append(self._node)
+            _changed(self._parent)
         else:
             self._node = xpath[0]
 
-        setattr(self.__class__, 'Mark', SLDNode.makeproperty('sld', cls=Mark,
-                docstring="The graphic's mark styling."))
-        setattr(self.__class__, 'Opacity', SLDNode.makeproperty('sld', name='Opacity',
-                docstring="The opacity of the graphic."))
-        setattr(self.__class__, 'Size', SLDNode.makeproperty('sld', name='Size',
-                docstring="The size of the graphic, in pixels."))
-        setattr(self.__class__, 'Rotation', SLDNode.makeproperty('sld', name='Rotation',
-                docstring="The rotation of the graphic, in degrees clockwise."))
+    Mark = SLDNode.makeproperty('sld', cls=Mark,
+                                docstring="The graphic's mark styling.")
+    Opacity = SLDNode.makeproperty('sld', name='Opacity',
+                                   docstring="The opacity of the graphic.")
+    Size = SLDNode.makeproperty('sld', name='Size',
+                                docstring="The size of the graphic, in pixels.")
+    Rotation = SLDNode.makeproperty('sld', name='Rotation',
+                                    docstring="The rotation of the graphic, in degrees clockwise.")
 
 
 class PointSymbolizer(SLDNode):
@@ -734,6 +1559,8 @@ class PointSymbolizer(SLDNode):
 
         I{Type}: L{Graphic}
     """
+    __slots__ = ()
+
     def __init__(self, parent, descendant=True):
         """
         Create a new PointSymbolizer node, as a child of the specified parent.
@@ -744,15 +1571,16 @@ class PointSymbolizer(SLDNode):
         @param descendant: A flag indicating if this is a descendant node of the parent.
         """
         super(PointSymbolizer, self).__init__(parent, descendant=descendant)
-        xpath = self._parent.xpath('sld:PointSymbolizer', namespaces=SLDNode._nsmap)
+        xpath = _xpath('sld:PointSymbolizer')(self._parent)
         if len(xpath) < 1:
             self._node = self._parent.makeelement('{%s}PointSymbolizer' % SLDNode._nsmap['sld'], nsmap=SLDNode._nsmap)
             self._parent.append(self._node)
+            _changed(self._parent)
         else:
             self._node = xpath[0]
 
-        setattr(self.__class__, 'Graphic', SLDNode.makeproperty('sld', cls=Graphic,
-                docstring="The graphic settings for this point geometry."))
+    Graphic = SLDNode.makeproperty('sld', cls=Graphic,
+                                   docstring="The graphic settings for this point geometry.")
 
 
 class PropertyCriterion(SLDNode):
@@ -782,6 +1610,8 @@ class PropertyCriterion(SLDNode):
 
         I{Type}: string
     """
+    __slots__ = ()
+
     def __init__(self, parent, name, descendant=True):
         """
         Create a new PropertyCriterion node, as a child of the specified parent.
@@ -793,17 +1623,18 @@ class PropertyCriterion(SLDNode):
         @param parent: The parent class object.
         """
         super(PropertyCriterion, self).__init__(parent, descendant=descendant)
-        xpath = self._parent.xpath('ogc:' + name, namespaces=SLDNode._nsmap)
+        xpath = _xpath('ogc:' + name)(self._parent)
         if len(xpath) < 1:
             self._node = self._parent.makeelement('{%s}%s' % (SLDNode._nsmap['ogc'], name), nsmap=SLDNode._nsmap)
             self._parent.append(self._node)
+            _changed(self._parent)
         else:
             self._node = xpath[0]
 
-        setattr(self.__class__, 'PropertyName', SLDNode.makeproperty('ogc', name='PropertyName',
-                docstring="The name of the property to compare."))
-        setattr(self.__class__, 'Literal', SLDNode.makeproperty('ogc', name='Literal',
-                docstring="The literal value of the property to compare against."))
+    PropertyName = SLDNode.makeproperty('ogc', name='PropertyName',
+                                        docstring="The name of the property to compare.")
+    Literal = SLDNode.makeproperty('ogc', name='Literal',
+                                   docstring="The literal value of the property to compare against.")
 
 
 class Filter(SLDNode):
@@ -860,6 +1691,8 @@ class Filter(SLDNode):
 
         I{Type}: L{PropertyCriterion}
     """
+    __slots__ = ()
+
     def __init__(self, parent, descendant=True):
         """
         Create a new Filter node.
@@ -870,7 +1703,7 @@ class Filter(SLDNode):
         @param descendant: A flag indicating if this is a descendant node of the parent.
         """
         super(Filter, self).__init__(parent, descendant=descendant)
-        xpath = self._parent.xpath('ogc:Filter', namespaces=SLDNode._nsmap)
+        xpath = _xpath('ogc:Filter')(self._parent)
         if len(xpath) == 1:
             self._node = xpath[0]
         else:
@@ -886,7 +1719,9 @@ class Filter(SLDNode):
         @return: A new filter with an ogc:And element as its child.
         """
         if not self._node.getparent() is None:
-            self._node.getparent().remove(self._node)
+            parent = self._node.getparent()
+            parent.remove(self._node)
+            _changed(parent, children=False)
         elem = self._node.makeelement('{%s}And' % SLDNode._nsmap['ogc'])
         elem.append(copy.copy(self._node[0]))
         elem.append(copy.copy(other._node[0]))
@@ -927,11 +1762,7 @@ class Filter(SLDNode):
         """
         if not name.startswith('PropertyIs'):
             raise AttributeError('Property name must be one of: PropertyIsEqualTo, PropertyIsNotEqualTo, PropertyIsLessThan, PropertyIsLessThanOrEqualTo, PropertyIsGreaterThan, PropertyIsGreaterThanOrEqualTo, PropertyIsLike.')
-        xpath = self._node.xpath('ogc:' + name, namespaces=SLDNode._nsmap)
-        if len(xpath) == 0:
-            return None
-
-        return PropertyCriterion(self, name)
+        return self._child(_xpath('ogc:' + name), PropertyCriterion)
 
     def __setattr__(self, name, value):
         """
@@ -947,12 +1778,46 @@ class Filter(SLDNode):
             object.__setattr__(self, name, value)
             return
 
-        xpath = self._node.xpath('ogc:' + name, namespaces=SLDNode._nsmap)
+        xpath = _xpath('ogc:' + name)(self._node)
         if len(xpath) > 0:
             xpath[0] = value
         else:
             elem = self._node.makeelement('{%s}%s' % (SLDNode._nsmap['ogc'], name), nsmap=SLDNode._nsmap)
             self._node.append(elem)
+            _changed(self._node)
+
+    def compile(self):
+        """
+        Compile this filter into a function that evaluates it against a
+        feature. Compiled functions are kept, and shared by all filters with
+        the same content, so compiling a filter again is cheap; compile it
+        again after changing it. See L{sld.filters.compile_filter}.
+
+        @rtype: function
+        @return: A function that takes a feature, a mapping from property
+            names to values, and returns True if the filter matches it.
+        """
+        from sld.filters import compile_filter
+
+        return compile_filter(self._node)
+
+    def mask(self, columns, size=None):
+        """
+        Evaluate this filter against a batch of features stored by column,
+        with vectorized NumPy operations. See L{sld.filters.compile_columns}.
+
+        @type  columns: dict
+        @param columns: A mapping from property names to NumPy arrays of
+            values, one per feature.
+        @type     size: integer
+        @param    size: Optional. The number of features. Defaults to the
+            length of the columns.
+        @rtype: numpy.ndarray
+        @return: A boolean array, true for the features this filter matches.
+        """
+        from sld.filters import compile_columns
+
+        return compile_columns(self._node)(columns, size)
 
     def __delattr__(self, name):
         """
@@ -962,9 +1827,9 @@ class Filter(SLDNode):
         @type  name: string
         @param name: The name of the property.
         """
-        xpath = self._node.xpath('ogc:' + name, namespaces=SLDNode._nsmap)
+        xpath = _xpath('ogc:' + name)(self._node)
         if len(xpath) > 0:
-            self._node.remove(xpath[0])
+            self._remove(xpath[0])
 
 
 class Rule(SLDNode):
@@ -1008,6 +1873,8 @@ class Rule(SLDNode):
 
         I{Type}: L{PointSymbolizer}
     """
+    __slots__ = ()
+
     def __init__(self, parent, index, descendant=True):
         """
         Create a new Rule node.
@@ -1018,43 +1885,32 @@ class Rule(SLDNode):
         @param descendant: A flag indicating if this is a descendant node of the parent.
         """
         super(Rule, self).__init__(parent, descendant=descendant)
-        self._node = self._parent.xpath('sld:Rule', namespaces=SLDNode._nsmap)[index]
-
-        setattr(self.__class__, 'Title', SLDNode.makeproperty('sld', name='Title',
-                docstring="The title of the Rule."))
-        setattr(self.__class__, 'Filter', SLDNode.makeproperty('ogc', cls=Filter,
-                docstring="The optional filter object, with property comparitors."))
-        setattr(self.__class__, 'PolygonSymbolizer', SLDNode.makeproperty('sld', cls=PolygonSymbolizer,
-                docstring="The optional polygon symbolizer for this rule."))
-        setattr(self.__class__, 'LineSymbolizer', SLDNode.makeproperty('sld', cls=LineSymbolizer,
-                docstring="The optional line symbolizer for this rule."))
-        setattr(self.__class__, 'TextSymbolizer', SLDNode.makeproperty('sld', cls=TextSymbolizer,
-                docstring="The optional text symbolizer for this rule."))
-        setattr(self.__class__, 'PointSymbolizer', SLDNode.makeproperty('sld', cls=PointSymbolizer,
-                docstring="The optional point symbolizer for this rule."))
-        setattr(self.__class__, 'MinScaleDenominator', SLDNode.makeproperty('sld', name='MinScaleDenominator',
-                docstring="The minimum scale denominator for this rule."))
-        setattr(self.__class__, 'MaxScaleDenominator', SLDNode.makeproperty('sld', name='MaxScaleDenominator',
-                docstring="The maximum scale denominator for this rule."))
+        self._node = _xpath('sld:Rule')(self._parent)[index]
+
+    Title = SLDNode.makeproperty('sld', name='Title',
+                                 docstring="The title of the Rule.")
+    Filter = SLDNode.makeproperty('ogc', cls=Filter,
+                                  docstring="The optional filter object, with property comparitors.")
+    PolygonSymbolizer = SLDNode.makeproperty('sld', cls=PolygonSymbolizer,
+                                             docstring="The optional polygon symbolizer for this rule.")
+    LineSymbolizer = SLDNode.makeproperty('sld', cls=LineSymbolizer,
+                                          docstring="The optional line symbolizer for this rule.")
+    TextSymbolizer = SLDNode.makeproperty('sld', cls=TextSymbolizer,
+                                          docstring="The optional text symbolizer for this rule.")
+    PointSymbolizer = SLDNode.makeproperty('sld', cls=PointSymbolizer,
+                                           docstring="The optional point symbolizer for this rule.")
+    MinScaleDenominator = SLDNode.makeproperty('sld', name='MinScaleDenominator',
+                                               docstring="The minimum scale denominator for this rule.")
+    MaxScaleDenominator = SLDNode.makeproperty('sld', name='MaxScaleDenominator',
+                                               docstring="The maximum scale denominator for this rule.")
 
     def normalize(self):
         """
-        Normalize this node prior to validation. This is required, as the
-        ogc:Filter node must come before any symbolizer nodes. The SLD
-        is modified in place.
+        Normalize this node and all child nodes prior to validation. This is
+        required, as the ogc:Filter node must come before any symbolizer
+        nodes. The SLD is modified in place.
         """
-        order = [
-            'sld:Title', 'ogc:Filter', 'sld:MinScaleDenominator',
-            'sld:MaxScaleDenominator', 'sld:PolygonSymbolizer',
-            'sld:LineSymbolizer', 'sld:TextSymbolizer', 'sld:PointSymbolizer']
-        for item in order:
-            xpath = self._node.xpath(item, namespaces=SLDNode._nsmap)
-            for xitem in xpath:
-                # move this to the end
-                self._node.remove(xitem)
-                self._node.append(xitem)
-
-        # no need to normalize children
+        _normalize(self._node)
 
     def create_filter(self, propname=None, comparitor=None, value=None):
         """
@@ -1116,11 +1972,23 @@ class Rule(SLDNode):
         return self.create_element('sld', stype + 'Symbolizer')
 
 
-class Rules(SLDNode):
+class Rules(SLDNode, MutableSequence):
     """
     A collection of L{Rule} nodes. This is a pythonic helper (list of
     nodes) that does not correspond to a true element in the SLD spec.
+
+    The list keeps the rule elements of its parent at construction time, so
+    indexing is constant time and iteration is linear. Changes made through
+    the list are applied to both the list and the document; changes made to
+    the document by other means are seen by a new list, from the
+    L{FeatureTypeStyle.Rules} property.
+
+    The list is a mutable sequence. A rule element is only ever in one
+    place in the document, so assigning or inserting a rule that is
+    already in the list moves it, rather than copying it.
     """
+    __slots__ = ('_nodes',)
+
     def __init__(self, parent, descendant=True):
         """
         Create a new list of Rules from the specified parent node.
@@ -1132,60 +2000,486 @@ class Rules(SLDNode):
         """
         super(Rules, self).__init__(parent, descendant=descendant)
         self._node = None
-        self._nodes = self._parent.xpath('sld:Rule', namespaces=SLDNode._nsmap)
+        self._nodes = _xpath('sld:Rule')(self._parent)
 
     def normalize(self):
         """
         Normalize this node and all rules contained within. The SLD model is
         modified in place.
         """
-        for i, rnode in enumerate(self._nodes):
-            rule = Rule(self, i - 1, descendant=False)
-            rule.normalize()
+        for node in self._nodes:
+            _normalize(node)
+
+    def _element(self, value):
+        """
+        Get the element of a rule.
+
+        @type  value: L{Rule}, etree.Element
+        @param value: A rule, or its element.
+        @rtype: etree.Element
+        @return: The rule element.
+        """
+        if isinstance(value, Rule):
+            return value._node
+        elif iselement(value):
+            return value
+
+        raise TypeError('Rules may only contain Rule objects or elements, not %s.' % type(value).__name__)
+
+    def _position(self, node):
+        """
+        Get the index of a rule element in this list.
+
+        @type  node: etree.Element
+        @param node: The rule element.
+        @rtype: integer
+        @return: The index of the element, or None if it is not in this list.
+        """
+        if not node.getparent() is self._parent:
+            return None
+
+        for i, other in enumerate(self._nodes):
+            if other is node:
+                return i
+
+        return None
 
     def __len__(self):
         """
-        Get the number of L{CssParameter} nodes in this list.
+        Get the number of L{Rule} nodes in this list.
 
         @rtype: integer
-        @return: The number of L{CssParameter} nodes.
+        @return: The number of L{Rule} nodes.
         """
         return len(self._nodes)
 
+    def __iter__(self):
+        """
+        Iterate over the L{Rule} nodes in this list.
+
+        @rtype: iterator
+        @return: An iterator of L{Rule} objects.
+        """
+        for node in self._nodes:
+            yield Rule.wrap(self._parent, node)
+
+    def __contains__(self, value):
+        """
+        Test if a L{Rule} is in this list.
+
+        @type  value: L{Rule}, etree.Element
+        @param value: A rule, or its element.
+        @rtype: boolean
+        @return: A flag indicating if the rule is in this list.
+        """
+        return self._element(value) in self._nodes
+
     def __getitem__(self, key):
         """
-        Get one of the L{Rule} nodes in the list.
+        Get one or more of the L{Rule} nodes in the list.
 
-        @type  key: integer
-        @param key: The index of the child node.
-        @rtype: L{Rule}
-        @return: The specific L{Rule} node.
+        @type  key: integer, slice
+        @param key: The index of the child node, or a slice of indexes.
+        @rtype: L{Rule}, list
+        @return: The specific L{Rule} node, or a list of L{Rule} nodes for a slice.
         """
-        rule = Rule(self, key, descendant=False)
-        return rule
+        if isinstance(key, slice):
+            return [Rule.wrap(self._parent, node) for node in self._nodes[key]]
+
+        return Rule.wrap(self._parent, self._nodes[key])
 
     def __setitem__(self, key, value):
         """
-        Set one of the L{Rule} nodes in the list with a new value.
+        Set one or more of the L{Rule} nodes in the list with a new value.
 
-        @type    key: integer
-        @param   key: The index of the child node.
+        @type    key: integer, slice
+        @param   key: The index of the child node, or a slice of indexes.
         @type  value: L{Rule}, etree.Element
-        @param value: The new value of the specific child node.
-        """
-        if isinstance(value, Rule):
-            self._nodes.replace(self._nodes[key], value._node)
-        elif isinstance(value, Element):
-            self._nodes.replace(self._nodes[key], value)
+        @param value: The new value of the specific child node, or a sequence
+            of new values for a slice. A rule that is already in this list
+            is moved.
+        """
+        if not isinstance(key, slice):
+            node = self._element(value)
+            old = self._nodes[key]
+            if node is old:
+                return
+
+            key = range(len(self._nodes))[key]
+            moved = self._position(node)
+            self._parent.replace(old, node)
+            _forget(old)
+            self._nodes[key] = node
+            if not moved is None:
+                del self._nodes[moved]
+            _changed(node, deep=True)
+            return
+
+        nodes = [self._element(item) for item in value]
+        start, stop, step = key.indices(len(self._nodes))
+        if step != 1:
+            old = self._nodes[key]
+            if len(old) != len(nodes):
+                raise ValueError('attempt to assign sequence of size %d to extended slice of size %d' %
+                                 (len(nodes), len(old)))
+            for oldnode, node in zip(old, nodes):
+                self._parent.replace(oldnode, node)
+                _forget(oldnode)
+                _changed(node, deep=True)
+            if any(not self._position(node) is None for node in nodes):
+                # rules of this list were moved
+                self._nodes = _xpath('sld:Rule')(self._parent)
+            else:
+                self._nodes[key] = nodes
+            return
+
+        del self[start:max(start, stop)]
+        for i, node in enumerate(nodes):
+            self.insert(start + i, node)
 
     def __delitem__(self, key):
         """
-        Delete one of the L{Rule} nodes from the list.
+        Delete one or more of the L{Rule} nodes from the list.
 
-        @type  key: integer
-        @param key: The index of the child node.
+        @type  key: integer, slice
+        @param key: The index of the child node, or a slice of indexes.
+        """
+        if isinstance(key, slice):
+            nodes = self._nodes[key]
+        else:
+            nodes = [self._nodes[key]]
+
+        doc = _document_of(self._parent)
+        index = None if doc is None else doc.scales.get(self._parent)
+        if not index is None and index.generation != doc.generation:
+            index = None
+
+        for node in nodes:
+            self._parent.remove(node)
+            _forget(node)
+            if not index is None:
+                index.remove(node)
+        del self._nodes[key]
+        _changed(self._parent, children=False)
+
+        if not index is None:
+            index.generation = doc.generation
+
+    def index(self, value):
+        """
+        Get the index of a L{Rule} in this list.
+
+        @type  value: L{Rule}, etree.Element
+        @param value: A rule, or its element.
+        @rtype: integer
+        @return: The index of the rule.
+        """
+        return self._nodes.index(self._element(value))
+
+    def insert(self, index, value):
+        """
+        Insert a L{Rule} into this list, and into the document, before the
+        specified index. A rule that is already in this list is moved.
+
+        @type  index: integer
+        @param index: The index to insert before.
+        @type  value: L{Rule}, etree.Element
+        @param value: The rule, or rule element, to insert.
+        """
+        node = self._element(value)
+        if index < 0:
+            index = max(0, index + len(self._nodes))
+
+        moved = self._position(node)
+        if not moved is None:
+            if moved < index:
+                index -= 1
+            del self._nodes[moved]
+
+        if index < len(self._nodes):
+            self._nodes[index].addprevious(node)
+        elif len(self._nodes) > 0:
+            self._nodes[-1].addnext(node)
+        else:
+            self._parent.append(node)
+
+        self._nodes.insert(index, node)
+        _changed(node, deep=True)
+
+    def reverse(self):
+        """
+        Reverse the order of the L{Rule} nodes in this list, and in the
+        document.
+        """
+        if len(self._nodes) < 2:
+            return
+
+        anchor = self._nodes[-1]
+        for node in self._nodes[-2::-1]:
+            anchor.addnext(node)
+            anchor = node
+        self._nodes.reverse()
+        _changed(self._parent, children=False)
+
+    def append(self, value):
+        """
+        Append a L{Rule} to the end of this list, and to the document.
+
+        @type  value: L{Rule}, etree.Element
+        @param value: The rule, or rule element, to append.
+        """
+        self.insert(len(self._nodes), value)
+
+
+
+_scale_tags = {'{%s}MinScaleDenominator' % SLDNode._nsmap['sld']: 0,
+               '{%s}MaxScaleDenominator' % SLDNode._nsmap['sld']: 1}
+"""The ends of the scale range of a rule, by tag."""
+
+
+def _scale_range(rule):
+    """
+    Get the range of scale denominators of a rule element.
+
+    @type  rule: etree.Element
+    @param rule: The rule element.
+    @rtype: tuple
+    @return: The minimum scale denominator, inclusive, and the maximum,
+        exclusive. Missing ends are infinite.
+    """
+    bounds = [float('-inf'), float('inf')]
+    for child in rule:
+        end = _scale_tags.get(child.tag)
+        if end is None or child.text is None or not child.text.strip():
+            continue
+
+        try:
+            bounds[end] = float(child.text)
+        except ValueError:
+            raise ValueError('The %s "%s" of a rule is not a number.' % (QName(child).localname, child.text))
+
+    return tuple(bounds)
+
+
+def _interval_tree(entries):
+    """
+    Build a centered interval tree of non-empty ranges. Each node holds the
+    ranges that contain its center, which is the median minimum of its
+    ranges, sorted by minimum and by maximum. The ranges before the center
+    are in its left subtree, and those after it in its right subtree, each
+    with at most half of the ranges, so the tree is balanced.
+
+    @type  entries: list
+    @param entries: The ranges, as (minimum, maximum, position, item)
+        tuples.
+    @rtype: list
+    @return: The root node, or None if there are no ranges.
+    """
+    if not entries:
+        return None
+
+    minimums = sorted([entry[0] for entry in entries])
+    center = minimums[len(minimums) // 2]
+    here, left, right = [], [], []
+    for entry in entries:
+        if entry[1] <= center:
+            left.append(entry)
+        elif entry[0] > center:
+            right.append(entry)
+        else:
+            here.append(entry)
+
+    by_min = sorted(here, key=lambda entry: (entry[0], entry[2]))
+    by_max = sorted(here, key=lambda entry: (-entry[1], entry[2]))
+    return [center, _interval_tree(left), _interval_tree(right),
+            [(entry[0], entry[2]) for entry in by_min], [entry[3] for entry in by_min],
+            [(-entry[1], entry[2]) for entry in by_max], [entry[3] for entry in by_max]]
+
+
+class ScaleIndex(object):
+    """
+    An index of items, such as rules, by their range of scale denominators.
+    The ranges are kept in centered interval trees, so building the index
+    takes O(n log n) time and O(n) memory, and finding the k items in scale
+    takes O(log^2 n + k log k) time.
+
+    Items are kept in the order they were added. The index holds a few
+    trees of doubling sizes: an added item is merged with the smaller trees
+    into a new tree, so adding items one at a time stays cheap.
+    """
+    __slots__ = ('generation', '_ranges', '_levels', '_trees', '_count')
+
+    def __init__(self, items=()):
+        """
+        Create an index.
+
+        @type  items: iterable
+        @param items: Optional. The items to add, as (item, minimum, maximum)
+            tuples, see L{add}.
+        """
+        self.generation = None
+        self._ranges = {}
+        self._levels = {}
+        self._trees = []
+        self._count = 0
+
+        entries = []
+        for item, minimum, maximum in items:
+            if item in self._ranges:
+                raise ValueError('The item is already in the index.')
+            self._ranges[item] = (minimum, maximum, self._count)
+            if minimum < maximum:
+                entries.append((minimum, maximum, self._count, item))
+            self._count += 1
+
+        if entries:
+            level = (len(entries) - 1).bit_length()
+            self._trees = [None] * level + [_interval_tree(entries)]
+            for entry in entries:
+                self._levels[entry[3]] = level
+
+    def __len__(self):
+        """
+        Get the number of items.
+
+        @rtype: integer
+        @return: The number of items.
+        """
+        return len(self._ranges)
+
+    def __contains__(self, item):
+        """
+        Test if an item is in this index.
+
+        @rtype: boolean
+        @return: A flag indicating if the item is in this index.
+        """
+        return item in self._ranges
+
+    def add(self, item, minimum, maximum):
+        """
+        Add an item, after all of the items in this index.
+
+        @type     item: object
+        @param    item: The item. Items must be hashable.
+        @type  minimum: float
+        @param minimum: The minimum scale denominator of the item, inclusive,
+            or -inf.
+        @type  maximum: float
+        @param maximum: The maximum scale denominator of the item, exclusive,
+            or inf.
+        """
+        if item in self._ranges:
+            raise ValueError('The item is already in the index.')
+
+        self._ranges[item] = (minimum, maximum, self._count)
+        self._count += 1
+        if not minimum < maximum:
+            return
+
+        # merge with the trees of the lower levels, as a binary counter
+        items = [item]
+        level = 0
+        while level < len(self._trees) and not self._trees[level] is None:
+            items.extend(self._tree_items(self._trees[level]))
+            self._trees[level] = None
+            level += 1
+        if level == len(self._trees):
+            self._trees.append(None)
+
+        self._trees[level] = _interval_tree([self._ranges[other] + (other,) for other in items])
+        for other in items:
+            self._levels[other] = level
+
+    def _tree_items(self, node):
+        """
+        Get the items of a tree.
+        """
+        items = []
+        nodes = [node]
+        while nodes:
+            node = nodes.pop()
+            if not node is None:
+                items.extend(node[4])
+                nodes.extend((node[1], node[2]))
+
+        return items
+
+    def remove(self, item):
+        """
+        Remove an item.
+
+        @type  item: object
+        @param item: The item.
         """
-        self._nodes.remove(self._nodes[key])
+        minimum, maximum, position = self._ranges.pop(item)
+        level = self._levels.pop(item, None)
+        if level is None:
+            return
+
+        node = self._trees[level]
+        while maximum <= node[0] or minimum > node[0]:
+            node = node[1] if maximum <= node[0] else node[2]
+
+        i = bisect_left(node[3], (minimum, position))
+        del node[3][i], node[4][i]
+        i = bisect_left(node[5], (-maximum, position))
+        del node[5][i], node[6][i]
+
+    def active(self, scale):
+        """
+        Get the items in scale.
+
+        @type  scale: float
+        @param scale: The scale denominator.
+        @rtype: list
+        @return: The items whose range contains the scale, in the order they
+            were added.
+        """
+        hits = []
+        for node in self._trees:
+            while not node is None:
+                if scale < node[0]:
+                    # the ranges of this node end after the scale
+                    for (minimum, position), item in zip(node[3], node[4]):
+                        if minimum > scale:
+                            break
+                        hits.append((position, item))
+                    node = node[1]
+                else:
+                    # the ranges of this node start before the scale
+                    for (maximum, position), item in zip(node[5], node[6]):
+                        if -maximum <= scale:
+                            break
+                        hits.append((position, item))
+                    node = node[2]
+
+        hits.sort(key=lambda hit: hit[0])
+        return [item for position, item in hits]
+
+
+def _scale_index(fts):
+    """
+    Get the up to date L{ScaleIndex} of the rule elements of a
+    FeatureTypeStyle element, building it if needed.
+
+    @type  fts: etree.Element
+    @param fts: The FeatureTypeStyle element.
+    @rtype: L{ScaleIndex}
+    @return: The index of the rule elements, or None if the element is not
+        part of a tracked document.
+    """
+    doc = _document_of(fts)
+    if doc is None:
+        return None
+
+    index = doc.scales.get(fts)
+    if index is None or index.generation != doc.generation:
+        rules = fts.iterchildren('{%s}Rule' % SLDNode._nsmap['sld'])
+        index = doc.scales[fts] = ScaleIndex((rule,) + _scale_range(rule) for rule in rules)
+        index.generation = doc.generation
+
+    return index
 
 
 class FeatureTypeStyle(SLDNode):
@@ -1193,6 +2487,8 @@ class FeatureTypeStyle(SLDNode):
     A FeatureTypeStyle node contains all L{Rule} objects applicable to a
     specific layer. A FeatureTypeStyle is a child of a L{UserStyle} element.
     """
+    __slots__ = ()
+
     def __init__(self, parent, descendant=True):
         """
         Create a new FeatureTypeNode node, as a child of the specified parent.
@@ -1203,15 +2499,14 @@ class FeatureTypeStyle(SLDNode):
         @param descendant: A flag indicating if this is a descendant node of the parent.
         """
         super(FeatureTypeStyle, self).__init__(parent, descendant=descendant)
-        self._node = self._parent.xpath('sld:FeatureTypeStyle', namespaces=SLDNode._nsmap)[0]
+        self._node = _xpath('sld:FeatureTypeStyle')(self._parent)[0]
 
     def normalize(self):
         """
         Normalize this element and all child L{Rule}s. The SLD model is
         modified in place.
         """
-        if not self.Rules is None:
-            self.Rules.normalize()
+        _normalize(self._node)
 
     @property
     def Rules(self):
@@ -1224,6 +2519,28 @@ class FeatureTypeStyle(SLDNode):
         """
         return Rules(self)
 
+    def rules_at(self, scale):
+        """
+        Get the L{Rule}s of this style that are in scale. The rules are found
+        with a L{ScaleIndex}, which is kept up to date as rules are created
+        with L{create_rule} and deleted from L{Rules}, and built again after
+        any other change.
+
+        @type  scale: float
+        @param scale: The scale denominator.
+        @rtype: list
+        @return: The rules whose MinScaleDenominator is at most the scale,
+            and whose MaxScaleDenominator is above it, in document order.
+        """
+        index = _scale_index(self._node)
+        if index is None:
+            rules = self._node.iterchildren('{%s}Rule' % SLDNode._nsmap['sld'])
+            index = ScaleIndex((rule,) + _scale_range(rule) for rule in rules)
+
+        nodes = index.active(scale)
+
+        return [Rule.wrap(self._node, node) for node in nodes]
+
     def create_rule(self, title, symbolizer=None, MinScaleDenominator=None, MaxScaleDenominator=None):
         """
         Create a L{Rule} object on this style. A rule requires a title and
@@ -1238,10 +2555,16 @@ class FeatureTypeStyle(SLDNode):
         @rtype: L{Rule}
         @return: A newly created rule, attached to this FeatureTypeStyle.
         """
+        doc = _document_of(self._node)
+        index = None if doc is None else doc.scales.get(self._node)
+        if not index is None and index.generation != doc.generation:
+            index = None
+
         elem = self._node.makeelement('{%s}Rule' % SLDNode._nsmap['sld'], nsmap=SLDNode._nsmap)
         self._node.append(elem)
+        _changed(elem)
 
-        rule = Rule(self, len(self._node) - 1)
+        rule = Rule.wrap(self._node, elem)
         rule.Title = title
 
         if MinScaleDenominator is not None:
@@ -1271,6 +2594,15 @@ class FeatureTypeStyle(SLDNode):
             stroke.create_cssparameter('stroke', '#000000')
             stroke.create_cssparameter('stroke-width', '1')
 
+        if not index is None:
+            # the new rule is the last one, so the index stays in order; a
+            # bad scale denominator is reported when the index is rebuilt
+            try:
+                index.add(elem, *_scale_range(elem))
+                index.generation = doc.generation
+            except ValueError:
+                pass
+
         return rule
 
 
@@ -1296,6 +2628,8 @@ class UserStyle(SLDNode):
 
         I{Type}: L{FeatureTypeStyle}
     """
+    __slots__ = ()
+
     def __init__(self, parent, descendant=True):
         """
         Create a new UserStyle node.
@@ -1306,22 +2640,21 @@ class UserStyle(SLDNode):
         @param descendant: A flag indicating if this is a descendant node of the parent.
         """
         super(UserStyle, self).__init__(parent, descendant=descendant)
-        self._node = self._parent.xpath('sld:UserStyle', namespaces=SLDNode._nsmap)[0]
+        self._node = _xpath('sld:UserStyle')(self._parent)[0]
 
-        setattr(self.__class__, 'Title', SLDNode.makeproperty('sld', name='Title',
-                docstring="The title of the UserStyle."))
-        setattr(self.__class__, 'Abstract', SLDNode.makeproperty('sld', name='Abstract',
-                docstring="The abstract of the UserStyle."))
-        setattr(self.__class__, 'FeatureTypeStyle', SLDNode.makeproperty('sld', cls=FeatureTypeStyle,
-                docstring="The feature type style of the UserStyle."))
+    Title = SLDNode.makeproperty('sld', name='Title',
+                                 docstring="The title of the UserStyle.")
+    Abstract = SLDNode.makeproperty('sld', name='Abstract',
+                                    docstring="The abstract of the UserStyle.")
+    FeatureTypeStyle = SLDNode.makeproperty('sld', cls=FeatureTypeStyle,
+                                            docstring="The feature type style of the UserStyle.")
 
     def normalize(self):
         """
         Normalize this node and all child nodes prior to validation. The SLD
         is modified in place.
         """
-        if not self.FeatureTypeStyle is None:
-            self.FeatureTypeStyle.normalize()
+        _normalize(self._node)
 
     def create_featuretypestyle(self):
         """
@@ -1350,6 +2683,8 @@ class NamedLayer(SLDNode):
 
         I{Type}: L{UserStyle}
     """
+    __slots__ = ()
+
     def __init__(self, parent, descendant=True):
         """
         Create a new NamedLayer node.
@@ -1360,20 +2695,19 @@ class NamedLayer(SLDNode):
         @param descendant: A flag indicating if this is a descendant node of the parent.
         """
         super(NamedLayer, self).__init__(parent, descendant=descendant)
-        self._node = self._parent.xpath('sld:NamedLayer', namespaces=SLDNode._nsmap)[0]
+        self._node = _xpath('sld:NamedLayer')(self._parent)[0]
 
-        setattr(self.__class__, 'UserStyle', SLDNode.makeproperty('sld', cls=UserStyle,
-                docstring="The UserStyle of the NamedLayer."))
-        setattr(self.__class__, 'Name', SLDNode.makeproperty('sld', name='Name',
-                docstring="The name of the layer."))
+    UserStyle = SLDNode.makeproperty('sld', cls=UserStyle,
+                                     docstring="The UserStyle of the NamedLayer.")
+    Name = SLDNode.makeproperty('sld', name='Name',
+                                docstring="The name of the layer.")
 
     def normalize(self):
         """
         Normalize this node and all child nodes prior to validation. The SLD
         is modified in place.
         """
-        if not self.UserStyle is None:
-            self.UserStyle.normalize()
+        _normalize(self._node)
 
     def create_userstyle(self):
         """
@@ -1385,130 +2719,405 @@ class NamedLayer(SLDNode):
         return self.get_or_create_element('sld', 'UserStyle')
 
 
+class ValidationEntry(object):
+    """
+    One problem found while validating an SLD document. The location of the
+    problem is only worked out when it is read.
+    """
+    __slots__ = ('_entry', '_element', '_message')
+
+    def __init__(self, entry=None, element=None, message=None):
+        """
+        Create a validation entry, either from an entry of a schema error log,
+        or from an element and a message.
+
+        @type    entry: etree._LogEntry
+        @param   entry: Optional. An entry of a schema error log.
+        @type  element: etree.Element
+        @param element: Optional. The offending element.
+        @type  message: string
+        @param message: Optional. The description of the problem.
+        """
+        self._entry = entry
+        self._element = element
+        self._message = message
+
+    @property
+    def line(self):
+        """
+        The line of the offending element, or 0 if it is not known.
+        """
+        if self._entry is None:
+            return self._element.sourceline or 0
+        return self._entry.line
+
+    @property
+    def column(self):
+        """
+        The column of the problem, or 0 if it is not known.
+        """
+        if self._entry is None:
+            return 0
+        return self._entry.column
+
+    @property
+    def message(self):
+        """
+        The description of the problem.
+        """
+        if self._entry is None:
+            return self._message
+        return self._entry.message
+
+    @property
+    def path(self):
+        """
+        The XPath of the offending element in the document.
+        """
+        if self._entry is None:
+            return self._element.getroottree().getpath(self._element)
+        return self._entry.path
+
+    def __str__(self):
+        """
+        Format the entry as a log message.
+        """
+        return 'Line:%d, Column:%d -- %s' % (self.line, self.column, self.message)
+
+
+class ValidationReport(object):
+    """
+    The result of validating an SLD document. A report is true if the
+    document is valid, and behaves as a list of the L{ValidationEntry}
+    problems found.
+
+    @prop: valid
+
+        A flag indicating if the SLD is valid.
+
+        I{Type}: boolean
+
+    @prop: truncated
+
+        A flag indicating that validation stopped before all problems were
+        found, because the maximum number of errors was reached.
+
+        I{Type}: boolean
+    """
+    __slots__ = ('valid', 'truncated', '_entries')
+
+    def __init__(self, valid, entries=(), truncated=False):
+        """
+        Create a validation report.
+
+        @type      valid: boolean
+        @param     valid: A flag indicating if the SLD is valid.
+        @type    entries: list
+        @param   entries: Optional. The L{ValidationEntry} problems found.
+        @type  truncated: boolean
+        @param truncated: Optional. A flag indicating that not all problems
+            were found.
+        """
+        self.valid = valid
+        self.truncated = truncated
+        self._entries = list(entries)
+
+    def __bool__(self):
+        """
+        A report is true if the document is valid.
+        """
+        return self.valid
+
+    __nonzero__ = __bool__
+
+    def __len__(self):
+        """
+        Get the number of problems found.
+        """
+        return len(self._entries)
+
+    def __iter__(self):
+        """
+        Iterate over the problems found.
+        """
+        return iter(self._entries)
+
+    def __getitem__(self, key):
+        """
+        Get one of the problems found.
+        """
+        return self._entries[key]
+
+    def log(self, level=logging.INFO):
+        """
+        Log every problem found.
+
+        @type  level: integer
+        @param level: Optional. The logging level of the messages.
+        """
+        for entry in self._entries:
+            logging.log(level, 'Line:%d, Column:%d -- %s', entry.line, entry.column, entry.message)
+
+
 class StyledLayerDescriptor(SLDNode):
     """
     An object representation of an SLD document.
 
+    Changes made through this library are tracked, so that L{normalize} only
+    sorts the parts of the document that changed, and L{validate} returns
+    the previous result if nothing changed since it last ran. Call
+    L{invalidate} after changing the underlying lxml elements directly.
+
     @prop: NamedLayer
 
         The named layer that this styling applies to.
 
         I{Type}: L{NamedLayer}
     """
+    __slots__ = ('_document',)
 
-    _cached_schema = None
-    """A cached schema document, to prevent repeated web requests for the schema document."""
-
-    def __init__(self, sld_file=None):
+    def __init__(self, sld_file=None, validate=True):
         """
         Create a new SLD document. If an sld file is provided, this constructor
-        will fetch the SLD schema from the internet and validate the file
-        against that schema.
+        will validate the file against the SLD schema, unless validation is
+        disabled. The schema is only loaded when it is first needed, and is
+        compiled only once per process, see L{get_schema}.
 
         @type  sld_file: string
-        @param sld_file: The name of a pre-existing SLD file.
+        @param sld_file: The name of a pre-existing SLD file, a file object,
+            or the content of an SLD document as bytes, a bytearray, a
+            memoryview or an mmap, which is parsed in place. Bytes are only
+            parsed as content if they start with markup or a byte order
+            mark; other bytes are the name of a file. Documents
+            are parsed with the parser of the current thread, see
+            L{get_parser}.
+        @type  validate: boolean
+        @param validate: Optional. Validate a pre-existing SLD file when it is
+            loaded. Set this to False for trusted, pre-validated files.
         """
         super(StyledLayerDescriptor, self).__init__(None)
 
-        if StyledLayerDescriptor._cached_schema is None:
-            logging.debug('Storing new schema into cache.')
-
-            localschema = NamedTemporaryFile(delete=False)
-
-            localschema_backup_path = './StyledLayerDescriptor-backup.xsd'
-            try:
-                logging.debug('Cache hit for backup schema document.')
-                localschema_backup = open(localschema_backup_path, 'rb')
-            except IOError:
-                logging.debug('Cache miss for backup schema document.')
-                localschema_backup = open(localschema_backup_path, 'wb')
-
-                schema_url = 'http://schemas.opengis.net/sld/1.0.0/StyledLayerDescriptor.xsd'
-                resp = urlopen(schema_url)
-                localschema_backup.write(resp.read())
-                resp.close()
-                localschema_backup.close()
-                localschema_backup = open(localschema_backup_path, 'rb')
-
-            localschema.write(localschema_backup.read())
-            localschema.close()
-            localschema_backup.close()
-
-            localschema = open(localschema.name, 'rt')
-            self._schemadoc = parse(localschema)
-            localschema.close()
-
-            StyledLayerDescriptor._cached_schema = localschema.name
-        else:
-            logging.debug('Fetching schema from cache.')
-
-            localschema = open(StyledLayerDescriptor._cached_schema, 'rt')
-            self._schemadoc = parse(localschema)
-            localschema.close()
-
         if not sld_file is None:
-            self._node = parse(sld_file)
-            self._schema = XMLSchema(self._schemadoc)
-            if not self._schema.validate(self._node):
-                logging.warn('SLD File "%s" does not validate against the SLD schema.', sld_file)
+            content = _is_content(sld_file)
+            if content:
+                self._node = fromstring(sld_file, get_parser()).getroottree()
+            else:
+                self._node = parse(sld_file, get_parser())
+
+            if validate:
+                if not get_schema().validate(self._node):
+                    if content:
+                        sld_file = '<%s>' % type(sld_file).__name__
+                    logging.warn('SLD File "%s" does not validate against the SLD schema.', sld_file)
+                    validate = False
         else:
             self._node = Element("{%s}StyledLayerDescriptor" % SLDNode._nsmap['sld'], version="1.0.0", nsmap=SLDNode._nsmap)
-            self._schema = None
 
-        setattr(self.__class__, 'NamedLayer', SLDNode.makeproperty('sld', cls=NamedLayer,
-                docstring="The named layer of the SLD."))
+        self._track()
+        # a valid document is also structurally valid
+        self._document.structured = not sld_file is None and validate
 
-    def __del__(self):
-        """
-        Destroy the StyledLayerDescriptor object, and clear its cache.
-        """
-        if not StyledLayerDescriptor._cached_schema is None:
-            logging.debug('Clearing cached schema.')
-
-            os.remove(StyledLayerDescriptor._cached_schema)
-            StyledLayerDescriptor._cached_schema = None
+    NamedLayer = SLDNode.makeproperty('sld', cls=NamedLayer,
+                                      docstring="The named layer of the SLD.")
 
     def __deepcopy__(self, memo):
         """
-        Perform a deep copy. Instead of copying references to the schema
-        object, create a new SLD, and deepcopy the SLD node.
+        Perform a deep copy. Create a new SLD, and deepcopy the SLD node.
         """
         sld = StyledLayerDescriptor()
         sld._node = copy.deepcopy(self._node)
+        sld._track()
         return sld
 
+    def _track(self):
+        """
+        Start tracking the changes to the current document.
+        """
+        root = self._node
+        if not iselement(root):
+            root = root.getroot()
+
+        self._document = _Document()
+        _documents[root] = self._document
+
+    def invalidate(self):
+        """
+        Forget which parts of the document changed, and the last validation
+        result. The whole document is normalized and validated again on the
+        next call to L{validate}. Call this after changing the underlying
+        lxml elements directly, since those changes are not tracked.
+        """
+        self._document.everything = True
+        self._document.dirty.clear()
+        self._document.structured = False
+        self._document.unchecked.clear()
+        self._document.fragments = {}
+        self._document.heads = {}
+        self._document.scales = {}
+        self._document.generation += 1
+
     def normalize(self):
         """
-        Normalize this node and all child nodes prior to validation. The SLD
-        is modified in place.
+        Normalize this node and all child nodes prior to validation. Only the
+        parts of the document changed through this library since the last
+        call are normalized, see L{invalidate}. The SLD is modified in place.
         """
-        if not self.NamedLayer is None:
-            self.NamedLayer.normalize()
+        doc = self._document
+        if doc.everything:
+            _normalize(self._node)
+        else:
+            for node, deep in doc.dirty.items():
+                if deep:
+                    _normalize(node)
+                else:
+                    _sort_children(node)
 
-    def validate(self):
+        doc.everything = False
+        doc.dirty.clear()
+
+    def validate(self, mode='full', log=False):
         """
         Validate the current file against the SLD schema. This first normalizes
-        the SLD document, then validates it. Any schema validation error messages
-        are logged at the INFO level.
-
+        the SLD document, then validates it. The schema is loaded on the first
+        call. Use L{report} to get the problems found.
+
+        If the document has not changed through this library since the last
+        call, the previous result is returned without validating again.
+
+        The 'fast' mode checks only the structure of the document: the order
+        and number of the children of every element, and the required
+        attributes. Text values are not checked. It gives the same verdict as
+        a full validation for any document that differs from a valid one only
+        in its structure. The whole document is checked once, then only the
+        elements changed through this library since the last successful
+        check, which is much faster than a full validation of a large
+        document. See L{sld.structure.StructureValidator}.
+
+        @type  mode: string
+        @param mode: Optional. The validation mode, 'full' or 'fast'.
+        @type   log: boolean
+        @param  log: Optional. Log the problems found at the INFO level.
         @rtype: boolean
         @return: A flag indicating if the SLD is valid.
         """
-        self.normalize()
+        if not log and not self._node is None:
+            self.normalize()
+
+            doc = self._document
+            # a valid document is also structurally valid
+            if doc.validated == doc.generation and (mode == 'full' or doc.valid):
+                return doc.valid
+
+        return self.report(mode=mode, log=log).valid
+
+    def report(self, mode='full', max_errors=None, fail_fast=False, log=False):
+        """
+        Validate the current file against the SLD schema, and report the
+        problems found. See L{validate} for the validation modes.
+
+        The schema validator of libxml2 always checks the whole document, and
+        takes time quadratic in the number of errors to do so. When the number
+        of errors is limited, the structure of the document is checked first,
+        and a document with structural errors is rejected without running the
+        schema validator, so large invalid documents are rejected in bounded
+        time.
+
+        Reports can be made in several threads at once: the problems are
+        read from a schema compiled for the current thread, see
+        L{_thread_schema}.
+
+        @type        mode: string
+        @param       mode: Optional. The validation mode, 'full' or 'fast'.
+        @type  max_errors: integer
+        @param max_errors: Optional. Stop after finding this many problems.
+        @type   fail_fast: boolean
+        @param  fail_fast: Optional. Stop after finding the first problem.
+        @type         log: boolean
+        @param        log: Optional. Log the problems found at the INFO level.
+        @rtype: L{ValidationReport}
+        @return: The validation report.
+        """
+        if not mode in ('full', 'fast'):
+            raise ValueError('The validation mode must be "full" or "fast", not "%s".' % mode)
 
         if self._node is None:
             logging.debug('The node is empty, and cannot be validated.')
-            return False
+            return ValidationReport(False)
+
+        self.normalize()
 
-        if self._schema is None:
-            self._schema = XMLSchema(self._schemadoc)
+        doc = self._document
+        if doc.validated == doc.generation and doc.valid:
+            return ValidationReport(True)
 
-        is_valid = self._schema.validate(self._node)
+        limit = max_errors
+        if fail_fast:
+            limit = 1
 
-        for msg in self._schema.error_log:
-            logging.info('Line:%d, Column:%d -- %s', msg.line, msg.column, msg.message)
+        if mode == 'fast' or not limit is None:
+            report = self._report_structure(limit)
+            if mode == 'fast' or not report.valid:
+                if log:
+                    report.log()
+                return report
 
-        return is_valid
+        # the error log of the shared schema is overwritten by other threads
+        schema = _thread_schema()
+        is_valid = schema.validate(self._node)
+
+        error_log = schema.error_log
+        if limit is None:
+            entries = error_log
+        else:
+            entries = error_log[:limit]
+        report = ValidationReport(is_valid, [ValidationEntry(entry) for entry in entries],
+                                  truncated=not limit is None and len(error_log) > limit)
+        if log:
+            report.log()
+
+        doc.validated = doc.generation
+        doc.valid = is_valid
+        if is_valid:
+            doc.structured = True
+            doc.unchecked.clear()
+        return report
+
+    def _report_structure(self, limit=None):
+        """
+        Check the structure of the document, or only of the elements changed
+        since the last successful check.
+
+        @type  limit: integer
+        @param limit: Optional. Stop after finding this many problems.
+        @rtype: L{ValidationReport}
+        @return: The report of the structural check.
+        """
+        from sld.structure import get_structure
+
+        structure = get_structure()
+        doc = self._document
+        if doc.structured:
+            root = self._node
+            if not iselement(root):
+                root = root.getroot()
+
+            # skip elements removed from the document since
+            nodes = [(node, deep) for node, deep in doc.unchecked.items() if _attached(node, root)]
+            errors = chain.from_iterable([structure.element_errors(node, deep=deep) for node, deep in nodes])
+        else:
+            errors = structure.errors(self._node)
+
+        if not limit is None:
+            errors = islice(errors, limit + 1)
+        entries = [ValidationEntry(element=elem, message=msg) for elem, msg in errors]
+
+        if entries:
+            truncated = not limit is None and len(entries) > limit
+            return ValidationReport(False, entries[:limit], truncated=truncated)
+
+        doc.structured = True
+        doc.unchecked.clear()
+        return ValidationReport(True)
 
     @property
     def version(self):
@@ -1539,9 +3148,124 @@ class StyledLayerDescriptor(SLDNode):
 
     def as_sld(self, pretty_print=False):
         """
-        Serialize this SLD model into a string.
+        Serialize this SLD model into a string. The serialized text of each
+        rule is cached, and only the rules changed since the last call are
+        serialized again, see L{write}.
 
+        @type  pretty_print: boolean
+        @param pretty_print: Optional. Indent the output.
         @rtype: string
         @returns: The content of the SLD.
         """
-        return tostring(self._node, pretty_print=pretty_print)
+        if pretty_print:
+            return tostring(self._node, pretty_print=True)
+
+        return b''.join(self._serialize())
+
+    def write(self, fileobj, pretty_print=False):
+        """
+        Serialize this SLD model into a file, without building the content
+        in memory first.
+
+        The serialized text of each rule and of the other children of the
+        layers and styles is cached, and only the parts changed through this
+        library since the last call are serialized again. Call L{invalidate}
+        after changing the underlying lxml elements directly.
+
+        @type       fileobj: file
+        @param      fileobj: A file object opened for writing in binary mode.
+        @type  pretty_print: boolean
+        @param pretty_print: Optional. Indent the output.
+        """
+        if pretty_print:
+            tree = self._node
+            if iselement(tree):
+                tree = tree.getroottree()
+            tree.write(fileobj, pretty_print=True)
+        else:
+            fileobj.writelines(self._serialize())
+
+    def _serialize(self):
+        """
+        Serialize this SLD model piecewise, from the cached text of the parts
+        that did not change.
+
+        @rtype: list
+        @return: The serialized parts, in order.
+        """
+        doc = self._document
+        if doc.fragments is None:
+            return [tostring(self._node)]
+
+        root = self._node
+        if not iselement(root):
+            root = root.getroot()
+        if not len(root):
+            return [tostring(self._node)]
+
+        parts = []
+        if not iselement(self._node):
+            for sibling in reversed(list(root.itersiblings(preceding=True))):
+                parts.append(tostring(sibling))
+
+        # only the parts still in the document are kept
+        fragments = {}
+        heads = {}
+        cold = not doc.heads
+        _serialize(root, parts, frozenset(), doc, fragments, heads)
+
+        if not iselement(self._node):
+            for sibling in root.itersiblings():
+                parts.append(tostring(sibling))
+
+        if cold and b''.join(parts) != tostring(self._node):
+            # this document does not serialize piecewise, such as one with a DOCTYPE
+            logging.debug('The SLD cannot be serialized piecewise.')
+            doc.fragments = None
+            return [tostring(self._node)]
+
+        doc.fragments = fragments
+        doc.heads = heads
+        return parts
+
+
+def warmup(version='1.0.0'):
+    """
+    Perform the one-time setup work of this library ahead of time. This
+    compiles the SLD schema shared by the process, and the schema of the
+    calling thread used for validation reports, see L{get_schema},
+    generates the structural validator used by the 'fast' validation mode,
+    builds and validates a throwaway document, and compiles the XPath
+    expressions of the element lookups that are not compiled when this
+    module is imported.
+
+    Call this in the parent process of a pre-forking server, before the
+    workers are forked. The workers then inherit the compiled schemas and
+    expressions, instead of each paying for them on their first request.
+    The schema used for reports is compiled once per thread, so workers
+    that report from other threads compile it once in each of them.
+
+    @type  version: string
+    @param version: The SLD version of the schema to compile.
+    """
+    from sld.structure import get_structure
+
+    get_schema(version)
+    _thread_schema(version)
+    get_structure(version)
+
+    sld_doc = StyledLayerDescriptor()
+    fts = sld_doc.create_namedlayer('warmup').create_userstyle().create_featuretypestyle()
+    for symbolizer in (PointSymbolizer, LineSymbolizer, PolygonSymbolizer, TextSymbolizer):
+        fts.create_rule('warmup', symbolizer, MinScaleDenominator='1', MaxScaleDenominator='2')
+
+    for rule in fts.Rules:
+        rule.create_filter('warmup', '==', '1')
+
+    sld_doc.validate()
+
+    # these lookups are compiled on first use, the others when their classes are defined
+    comparisons = ('PropertyIsEqualTo', 'PropertyIsNotEqualTo', 'PropertyIsLessThan', 'PropertyIsLessThanOrEqualTo',
+                   'PropertyIsGreaterThan', 'PropertyIsGreaterThanOrEqualTo', 'PropertyIsLike')
+    for expr in ['sld:Rule', 'sld:CssParameter'] + ['ogc:' + name for name in comparisons]:
+        _xpath(expr)
@@ -0,0 +1,285 @@
+"""
+Batch operations on many SLD files.
+
+Validating a large catalog of SLD files one at a time leaves all but one
+core idle. L{validate_many} fans the files out across a pool of worker
+processes, each of which compiles the SLD schema once, and streams back a
+L{FileReport} for every file. The same is available from the command line:
+
+    sld-validate -j 8 /path/to/styles
+
+L{load_many} loads many files into L{sld.StyledLayerDescriptor} objects
+with a pool of threads. lxml releases the GIL while it parses and
+validates, so the files are loaded concurrently.
+
+License
+=======
+Copyright 2011-2014 David Zwarg <U{david.a@zwarg.com}>
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+U{http://www.apache.org/licenses/LICENSE-2.0}
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+@author: David Zwarg
+@contact: david.a@zwarg.com
+@copyright: 2011-2014, Azavea
+@license: Apache 2.0
+@version: 1.0.10
+"""
+from collections import deque, namedtuple
+from itertools import islice
+from optparse import OptionParser
+from lxml.etree import XMLSyntaxError
+try:
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+except ImportError:
+    ProcessPoolExecutor = ThreadPoolExecutor = None
+import multiprocessing
+import os
+import sys
+
+import sld
+
+_warmed = set()
+"""The SLD versions that this worker process was warmed up for, see L{sld.warmup}."""
+
+
+class FileError(namedtuple('FileError', 'line column message path')):
+    """
+    One problem found in an SLD file. The path is the XPath of the offending
+    element, or None if the file could not be read.
+    """
+    __slots__ = ()
+
+    def __str__(self):
+        """
+        Format the problem as a log message.
+        """
+        return 'Line:%d, Column:%d -- %s' % (self.line, self.column, self.message)
+
+
+class FileReport(namedtuple('FileReport', 'path valid truncated errors')):
+    """
+    The result of validating one SLD file. A report is true if the file is
+    valid. The errors are a list of L{FileError} problems; truncated is set
+    when validation stopped before all problems were found.
+    """
+    __slots__ = ()
+
+    def __bool__(self):
+        """
+        A report is true if the file is valid.
+        """
+        return self.valid
+
+    __nonzero__ = __bool__
+
+
+def find_files(paths, extension='.sld'):
+    """
+    Expand a list of files and directories into a list of files. Directories
+    are searched recursively for files with the given extension.
+
+    @type       paths: list
+    @param      paths: The names of files and directories.
+    @type   extension: string
+    @param  extension: Optional. The extension of the files to find in
+        directories.
+    @rtype: iterator
+    @return: The names of the files, in order.
+    """
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                if filename.endswith(extension):
+                    yield os.path.join(dirpath, filename)
+
+
+def validate_file(path, mode='full', max_errors=None, fail_fast=False):
+    """
+    Validate one SLD file. Files that cannot be read or parsed are reported
+    as invalid.
+
+    @type        path: string
+    @param       path: The name of the SLD file.
+    @type        mode: string
+    @param       mode: Optional. The validation mode, 'full' or 'fast', see
+        L{sld.StyledLayerDescriptor.validate}.
+    @type  max_errors: integer
+    @param max_errors: Optional. Stop after finding this many problems.
+    @type   fail_fast: boolean
+    @param  fail_fast: Optional. Stop after finding the first problem.
+    @rtype: L{FileReport}
+    @return: The report of the file.
+    """
+    try:
+        sld_doc = sld.StyledLayerDescriptor(path, validate=False)
+    except XMLSyntaxError as e:
+        return FileReport(path, False, False, [FileError(e.lineno or 0, e.offset or 0, e.msg, None)])
+    except (IOError, OSError) as e:
+        return FileReport(path, False, False, [FileError(0, 0, str(e), None)])
+
+    report = sld_doc.report(mode=mode, max_errors=max_errors, fail_fast=fail_fast)
+    errors = [FileError(entry.line, entry.column, entry.message, entry.path) for entry in report]
+    return FileReport(path, report.valid, report.truncated, errors)
+
+
+def _validate_chunk(paths, mode, max_errors, fail_fast, version):
+    """
+    Validate a chunk of SLD files in a worker process, which is warmed up
+    with its first chunk.
+    """
+    if not version in _warmed:
+        sld.warmup(version)
+        _warmed.add(version)
+
+    return [validate_file(path, mode, max_errors, fail_fast) for path in paths]
+
+
+def validate_many(paths, max_workers=None, chunksize=64, mode='full', max_errors=None, fail_fast=False,
+                  version='1.0.0'):
+    """
+    Validate many SLD files in parallel, with a pool of worker processes.
+    Each worker compiles the schema once, before it validates its first
+    files, see L{sld.warmup}. The files are sent to the workers in chunks,
+    and only a few chunks per worker are in flight at any time, so the
+    paths may be a lazy iterator over a very large catalog.
+
+    @type         paths: iterable
+    @param        paths: The names of the SLD files.
+    @type   max_workers: integer
+    @param  max_workers: Optional. The number of worker processes. Defaults
+        to the number of cores.
+    @type     chunksize: integer
+    @param    chunksize: Optional. The number of files sent to a worker at once.
+    @type          mode: string
+    @param         mode: Optional. The validation mode, 'full' or 'fast'.
+    @type    max_errors: integer
+    @param   max_errors: Optional. Stop after finding this many problems in a file.
+    @type     fail_fast: boolean
+    @param    fail_fast: Optional. Stop after finding the first problem in a file.
+    @type       version: string
+    @param      version: Optional. The SLD version of the schema.
+    @rtype: iterator
+    @return: An iterator of L{FileReport} results, in the order of the paths.
+    """
+    if ProcessPoolExecutor is None:
+        raise ImportError('Batch validation requires concurrent.futures.')
+
+    if max_workers is None:
+        max_workers = multiprocessing.cpu_count()
+
+    paths = iter(paths)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque()
+        while True:
+            while len(pending) < max_workers * 2:
+                chunk = list(islice(paths, chunksize))
+                if not chunk:
+                    break
+                pending.append(executor.submit(_validate_chunk, chunk, mode, max_errors, fail_fast, version))
+
+            if not pending:
+                break
+
+            for report in pending.popleft().result():
+                yield report
+
+
+def load_many(paths, max_workers=None, validate=True):
+    """
+    Load many SLD files concurrently, with a pool of threads. The schema is
+    compiled before the files are loaded, if they are validated.
+
+    @type        paths: iterable
+    @param       paths: The names of the SLD files.
+    @type  max_workers: integer
+    @param max_workers: Optional. The number of threads. Defaults to the
+        number of cores.
+    @type     validate: boolean
+    @param    validate: Optional. Validate the files when they are loaded, see
+        L{sld.StyledLayerDescriptor}.
+    @rtype: list
+    @return: The L{sld.StyledLayerDescriptor} documents, in the order of the
+        paths. If a file cannot be loaded, the error of the first such file
+        is raised.
+    """
+    if max_workers is None:
+        max_workers = multiprocessing.cpu_count()
+
+    if validate:
+        sld.get_schema()
+
+    # lxml parses more slowly in a new thread than in the calling thread
+    if max_workers == 1:
+        return [sld.StyledLayerDescriptor(path, validate=validate) for path in paths]
+
+    if ThreadPoolExecutor is None:
+        raise ImportError('Concurrent loading requires concurrent.futures.')
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(lambda path: sld.StyledLayerDescriptor(path, validate=validate), paths))
+
+
+def main(args=None):
+    """
+    Validate SLD files and directories from the command line. Prints one
+    line for each file, and the problems found in invalid files.
+
+    @type  args: list
+    @param args: Optional. The command line arguments. Defaults to sys.argv.
+    @rtype: integer
+    @return: The exit status: 0 if every file is valid, 1 otherwise.
+    """
+    parser = OptionParser(usage='%prog [options] FILE|DIRECTORY...')
+    parser.add_option('-j', '--jobs', dest='jobs', type='int',
+                      help='Worker processes. Defaults to the number of cores.', default=None)
+    parser.add_option('-c', '--chunksize', dest='chunksize', type='int',
+                      help='Files sent to a worker at once.', default=64)
+    parser.add_option('-f', '--fast', dest='mode', action='store_const', const='fast', default='full',
+                      help='Check only the structure of the files.')
+    parser.add_option('-m', '--max-errors', dest='max_errors', type='int',
+                      help='Stop after finding this many problems in a file.', default=None)
+    parser.add_option('-x', '--fail-fast', dest='fail_fast', action='store_true', default=False,
+                      help='Stop after finding the first problem in a file.')
+    parser.add_option('-q', '--quiet', dest='quiet', action='store_true', default=False,
+                      help='Only print invalid files.')
+
+    (options, args) = parser.parse_args(args)
+    if not args:
+        parser.error('No files given.')
+
+    status = 0
+    for report in validate_many(find_files(args), max_workers=options.jobs, chunksize=options.chunksize,
+                                mode=options.mode, max_errors=options.max_errors,
+                                fail_fast=options.fail_fast):
+        if report.valid:
+            if not options.quiet:
+                sys.stdout.write('%s: valid\n' % report.path)
+            continue
+
+        status = 1
+        sys.stdout.write('%s: invalid\n' % report.path)
+        for error in report.errors:
+            sys.stdout.write('  %s\n' % str(error))
+        if report.truncated:
+            sys.stdout.write('  ...\n')
+
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
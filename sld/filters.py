@@ -0,0 +1,739 @@
+"""
+Evaluation of OGC filters against features.
+
+L{compile_filter} translates an ogc:Filter element into the source of one
+Python function over a feature mapping, and compiles it. The structure of
+the filter is walked once, when it is compiled: the property names, the
+literal values and their numeric forms, and the comparison operators are
+all constants in the generated code. Compiled functions are shared by all
+filters with the same serialized form.
+
+L{compile_columns} compiles a filter into a function over a batch of
+features stored by column, as NumPy arrays, which returns a boolean mask
+of the features that match. It requires NumPy.
+
+A comparison is numeric when both of its values are numbers, or strings
+that parse as decimal numbers; otherwise the values are compared as text.
+A property is missing if the feature does not have it, or if its value is
+None or NaN. A comparison with a missing property is false.
+
+License
+=======
+Copyright 2011-2014 David Zwarg <U{david.a@zwarg.com}>
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+U{http://www.apache.org/licenses/LICENSE-2.0}
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+@author: David Zwarg
+@contact: david.a@zwarg.com
+@copyright: 2011-2014, Azavea
+@license: Apache 2.0
+@version: 1.0.10
+"""
+from lxml.etree import QName, iselement, tostring
+import numbers
+import operator
+import re
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    text_type = unicode
+    string_types = basestring
+    _numbers = frozenset((int, long, float))
+except NameError:
+    text_type = str
+    string_types = str
+    _numbers = frozenset((int, float))
+
+_ogc = 'http://www.opengis.net/ogc'
+"""The OGC Filter namespace."""
+
+_comparisons = {
+    'PropertyIsEqualTo': '==',
+    'PropertyIsNotEqualTo': '!=',
+    'PropertyIsLessThan': '<',
+    'PropertyIsLessThanOrEqualTo': '<=',
+    'PropertyIsGreaterThan': '>',
+    'PropertyIsGreaterThanOrEqualTo': '>=',
+}
+"""The Python operators of the binary comparison elements."""
+
+_mirrored = {'==': '==', '!=': '!=', '<': '>', '<=': '>=', '>': '<', '>=': '<='}
+"""The operators with their operands swapped."""
+
+_operators = {'==': operator.eq, '!=': operator.ne, '<': operator.lt, '<=': operator.le,
+              '>': operator.gt, '>=': operator.ge}
+"""The functions of the Python operators."""
+
+_decimal = re.compile(r'\s*[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?\s*\Z')
+"""Matches the text of a decimal number."""
+
+_compiled = {}
+"""Compiled filter functions, keyed by the serialized filter."""
+
+_compiled_columns = {}
+"""Compiled columnar filter functions, keyed by the serialized filter."""
+
+_compiled_limit = 4096
+"""The number of compiled filter functions kept, before they are all dropped."""
+
+
+def parse_number(text):
+    """
+    Parse the text of a decimal number. Integers are parsed exactly.
+
+    @type  text: string
+    @param text: The text.
+    @rtype: number
+    @return: The number, or None if the text is not a decimal number.
+    """
+    if not _decimal.match(text):
+        return None
+
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+def is_missing(value):
+    """
+    Check whether a property value is missing.
+
+    @type  value: object
+    @param value: The property value.
+    @rtype: boolean
+    @return: True if the value is None or NaN.
+    """
+    return value is None or value != value
+
+
+def to_number(value):
+    """
+    Get the numeric form of a property value.
+
+    @type  value: object
+    @param value: The property value.
+    @rtype: number
+    @return: The value if it is a number, the parsed value if it is the text
+        of a decimal number, or None otherwise.
+    """
+    if isinstance(value, numbers.Real):
+        return value
+    if isinstance(value, string_types):
+        return parse_number(value)
+
+    return None
+
+
+def to_text(value):
+    """
+    Get the text form of a property value.
+
+    @type  value: object
+    @param value: The property value.
+    @rtype: string
+    @return: The text of the value.
+    """
+    if isinstance(value, text_type):
+        return value
+    if isinstance(value, bytes):
+        return value.decode('utf-8')
+
+    return text_type(value)
+
+
+def equality_key(value):
+    """
+    Get the key of a value for equality comparisons, see L{compare}: two
+    values are equal if and only if their keys are equal. Numeric values
+    have numeric keys, and other values text keys.
+
+    @type  value: object
+    @param value: The value.
+    @rtype: object
+    @return: The key, or None if the value is missing, or is not a number.
+    """
+    if value is None:
+        return None
+    if isinstance(value, bytes):
+        value = value.decode('utf-8')
+
+    number = to_number(value)
+    if number is None:
+        return to_text(value)
+    if number != number:
+        return None
+
+    return number
+
+
+def compare(left, right, op, match_case=True):
+    """
+    Compare two values, as numbers if both are numeric and as text
+    otherwise. A comparison with a missing value, see L{is_missing}, is
+    false.
+
+    @type        left: object
+    @param       left: The left value, or None if it is missing.
+    @type       right: object
+    @param      right: The right value, or None if it is missing.
+    @type          op: string
+    @param         op: The Python comparison operator.
+    @type  match_case: boolean
+    @param match_case: Optional. Compare text case sensitively.
+    @rtype: boolean
+    @return: The result of the comparison.
+    """
+    if is_missing(left) or is_missing(right):
+        return False
+
+    lnum = to_number(left)
+    if not lnum is None:
+        rnum = to_number(right)
+        if not rnum is None:
+            return _operators[op](lnum, rnum)
+
+    left = to_text(left)
+    right = to_text(right)
+    if not match_case:
+        left = left.lower()
+        right = right.lower()
+
+    return _operators[op](left, right)
+
+
+def like_pattern(elem):
+    """
+    Translate the pattern of an ogc:PropertyIsLike element into a regular
+    expression.
+
+    @type  elem: etree.Element
+    @param elem: The ogc:PropertyIsLike element.
+    @rtype: string
+    @return: The regular expression, which matches the whole value.
+    """
+    wild = elem.get('wildCard', '*')
+    single = elem.get('singleChar', '?')
+    escape = elem.get('escapeChar', elem.get('escape', '\\'))
+    literal = elem.find('{%s}Literal' % _ogc)
+    text = '' if literal is None or literal.text is None else literal.text
+
+    pattern = []
+    chars = iter(text)
+    for char in chars:
+        if char == escape:
+            pattern.append(re.escape(next(chars, '')))
+        elif char == wild:
+            pattern.append('.*')
+        elif char == single:
+            pattern.append('.')
+        else:
+            pattern.append(re.escape(char))
+
+    return '(?s)' + ''.join(pattern) + r'\Z'
+
+
+class _Generator(object):
+    """
+    Generates the source of the function of one filter.
+    """
+    __slots__ = ('properties', 'constants')
+
+    def __init__(self):
+        self.properties = {}
+        self.constants = {}
+
+    def property(self, name):
+        """
+        Get the local variable holding a property of the feature.
+        """
+        if not name in self.properties:
+            self.properties[name] = 'p%d' % len(self.properties)
+
+        return self.properties[name]
+
+    def constant(self, value):
+        """
+        Get the global name of a constant of the generated code.
+        """
+        name = '_c%d' % len(self.constants)
+        self.constants[name] = value
+        return name
+
+    def expression(self, elem):
+        """
+        Get the variable or the constant of an expression element, and its
+        value if it is a literal.
+        """
+        tag = QName(elem).localname
+        if tag == 'PropertyName':
+            return self.property((elem.text or '').strip()), None
+        if tag == 'Literal' and len(elem) == 0:
+            text = elem.text or ''
+            return self.constant(text), text
+
+        raise ValueError('The expression ogc:%s cannot be compiled.' % tag)
+
+    def predicate(self, elem):
+        """
+        Get the Python expression of a filter predicate element.
+        """
+        if not iselement(elem) or not isinstance(elem.tag, string_types):
+            raise ValueError('The filter contains an unexpected node.')
+
+        tag = QName(elem).localname
+        children = [child for child in elem if isinstance(child.tag, string_types)]
+        if tag in ('And', 'Or'):
+            if len(children) < 2:
+                raise ValueError('The filter ogc:%s needs at least two operands.' % tag)
+            joiner = ' and ' if tag == 'And' else ' or '
+            return '(%s)' % joiner.join([self.predicate(child) for child in children])
+        if tag == 'Not':
+            if len(children) != 1:
+                raise ValueError('The filter ogc:Not needs exactly one operand.')
+            return '(not %s)' % self.predicate(children[0])
+
+        match_case = not elem.get('matchCase', 'true') in ('false', '0')
+        if tag in _comparisons:
+            if len(children) != 2:
+                raise ValueError('The filter ogc:%s needs exactly two expressions.' % tag)
+            return self.comparison(_comparisons[tag], children[0], children[1], match_case)
+        if tag == 'PropertyIsBetween':
+            lower = elem.find('{%s}LowerBoundary' % _ogc)
+            upper = elem.find('{%s}UpperBoundary' % _ogc)
+            if len(children) != 3 or lower is None or upper is None or len(lower) != 1 or len(upper) != 1:
+                raise ValueError('The filter ogc:PropertyIsBetween needs an expression and two boundaries.')
+            return '(%s and %s)' % (self.comparison('>=', children[0], lower[0], True),
+                                    self.comparison('<=', children[0], upper[0], True))
+        if tag == 'PropertyIsNull':
+            if len(children) != 1:
+                raise ValueError('The filter ogc:PropertyIsNull needs exactly one property.')
+            return '(%s is None)' % self.expression(children[0])[0]
+        if tag == 'PropertyIsLike':
+            name = elem.find('{%s}PropertyName' % _ogc)
+            if name is None:
+                raise ValueError('The filter ogc:PropertyIsLike needs a property.')
+            var = self.expression(name)[0]
+            flags = 0 if match_case else re.IGNORECASE | re.UNICODE
+            regex = self.constant(re.compile(like_pattern(elem), flags).match)
+            return '(%s is not None and %s(_text(%s)) is not None)' % (var, regex, var)
+
+        raise ValueError('The filter ogc:%s cannot be compiled.' % tag)
+
+    def comparison(self, op, left, right, match_case):
+        """
+        Get the Python expression of a binary comparison.
+        """
+        left, ltext = self.expression(left)
+        right, rtext = self.expression(right)
+        if ltext is not None and rtext is None:
+            left, ltext, right, rtext, op = right, rtext, left, ltext, _mirrored[op]
+
+        if rtext is None or ltext is not None:
+            # two properties, or two literals
+            return '_compare(%s, %s, %r, %r)' % (left, right, op, match_case)
+
+        number = parse_number(rtext)
+        if number is None:
+            # text comparison
+            if match_case:
+                return '(%s is not None and _text(%s) %s %s)' % (left, left, op, right)
+            text = self.constant(rtext.lower())
+            return '(%s is not None and _text(%s).lower() %s %s)' % (left, left, op, text)
+
+        # numeric comparison, unless the value is not a number
+        number = self.constant(number)
+        return '(%s %s %s if %s.__class__ in _numbers else _compare(%s, %s, %r, %r))' % \
+            (left, op, number, left, left, right, op, match_case)
+
+    def source(self, elem):
+        """
+        Get the source of the function of a filter.
+        """
+        body = self.predicate(elem)
+        lines = ['def match(feature):', '    get = feature.get']
+        for name, var in sorted(self.properties.items(), key=lambda item: item[1]):
+            lines.append('    %s = get(%r)' % (var, name))
+            # NaN is missing, as None
+            lines.append('    if %s != %s:' % (var, var))
+            lines.append('        %s = None' % var)
+        lines.append('    return %s' % body)
+
+        return '\n'.join(lines) + '\n'
+
+
+def compile_filter(elem):
+    """
+    Compile an ogc:Filter element into a function over a feature mapping.
+    Filters made of comparisons, ogc:PropertyIsLike, ogc:PropertyIsBetween,
+    ogc:PropertyIsNull, ogc:And, ogc:Or and ogc:Not can be compiled.
+
+    @type  elem: etree.Element
+    @param elem: The ogc:Filter element.
+    @rtype: function
+    @return: A function that takes a feature, a mapping from property names
+        to values, and returns True if the filter matches the feature.
+    """
+    key = tostring(elem, with_tail=False)
+    function = _compiled.get(key)
+    if not function is None:
+        return function
+
+    predicates = [child for child in elem if isinstance(child.tag, string_types)]
+    if len(predicates) != 1:
+        raise ValueError('The filter must have exactly one predicate to be compiled.')
+
+    generator = _Generator()
+    source = generator.source(predicates[0])
+    namespace = dict(generator.constants, _compare=compare, _text=to_text, _numbers=_numbers)
+    exec(compile(source, '<ogc:Filter>', 'exec'), namespace)
+    function = namespace['match']
+    function.source = source
+
+    if len(_compiled) >= _compiled_limit:
+        _compiled.clear()
+    _compiled[key] = function
+
+    return function
+
+
+class _Columns(object):
+    """
+    A batch of features stored by column, with the numeric and text forms
+    of each column computed once per batch.
+    """
+    __slots__ = ('columns', 'size', 'cache')
+
+    def __init__(self, columns, size=None):
+        if size is None:
+            if not columns:
+                raise ValueError('The number of features is needed when there are no columns.')
+            size = len(next(iter(columns.values())))
+        self.columns = columns
+        self.size = size
+        self.cache = {}
+
+    def _cached(self, kind, name, function):
+        key = (kind, name)
+        if not key in self.cache:
+            self.cache[key] = function(name)
+        return self.cache[key]
+
+    def has(self, name):
+        return name in self.columns
+
+    def raw(self, name):
+        """
+        Get a column as an array.
+        """
+        return self._cached('raw', name, lambda name: numpy.asarray(self.columns[name]))
+
+    def present(self, name):
+        """
+        Get the mask of the features that have a value, see L{is_missing}.
+        """
+        def present(name):
+            column = self.raw(name)
+            if column.dtype.kind == 'O':
+                return ~numpy.frompyfunc(is_missing, 1, 1)(column).astype(bool)
+            if column.dtype.kind == 'f':
+                return ~numpy.isnan(column)
+            return numpy.ones(self.size, dtype=bool)
+
+        return self._cached('present', name, present)
+
+    def numbers(self, name):
+        """
+        Get the numeric form of a column, and the mask of the values that
+        are numbers, see L{to_number}.
+        """
+        def numbers(name):
+            column = self.raw(name)
+            if column.dtype.kind in 'biuf':
+                return column, self.present(name)
+            if column.dtype.kind in 'US':
+                # NumPy also parses digits grouped with underscores, which
+                # parse_number does not, and the names of special values
+                underscore = '_' if column.dtype.kind == 'U' else b'_'
+                try:
+                    values = column.astype(numpy.float64)
+                    if numpy.isfinite(values).all() and (numpy.char.find(column, underscore) < 0).all():
+                        return values, numpy.ones(self.size, dtype=bool)
+                except ValueError:
+                    pass
+
+            values = numpy.frompyfunc(to_number, 1, 1)(column)
+            valid = numpy.frompyfunc(lambda value: not value is None, 1, 1)(values).astype(bool)
+            return numpy.where(valid, values, numpy.nan).astype(numpy.float64), valid
+
+        return self._cached('numbers', name, numbers)
+
+    def categories(self, name):
+        """
+        Get the distinct equality keys of a column, see L{equality_key}, and
+        the index of the key of each value.
+        """
+        def categories(name):
+            column = self.raw(name)
+            if column.dtype.kind in 'biufUS':
+                uniques, inverse = numpy.unique(column, return_inverse=True)
+                return [equality_key(value) for value in uniques.tolist()], inverse.reshape(-1)
+
+            keys = {}
+            inverse = numpy.empty(self.size, dtype=numpy.intp)
+            for i, value in enumerate(column):
+                inverse[i] = keys.setdefault(equality_key(value), len(keys))
+            return sorted(keys, key=keys.get), inverse
+
+        return self._cached('categories', name, categories)
+
+    def text(self, name, lower=False):
+        """
+        Get the text form of a column, see L{to_text}.
+        """
+        if lower:
+            return self._cached('lower', name, lambda name: numpy.char.lower(self.text(name)))
+
+        def text(name):
+            column = self.raw(name)
+            if column.dtype.kind == 'U':
+                return column
+            if column.dtype.kind == 'S':
+                return numpy.char.decode(column, 'utf-8')
+            if column.dtype.kind == 'O':
+                text = numpy.frompyfunc(lambda value: u'' if value is None else to_text(value), 1, 1)
+                return text(column).astype(text_type)
+            return numpy.frompyfunc(to_text, 1, 1)(column).astype(text_type)
+
+        return self._cached('text', name, text)
+
+
+def _vector_expression(elem):
+    """
+    Get the property name, or the literal text, of an expression element.
+    """
+    tag = QName(elem).localname
+    if tag == 'PropertyName':
+        return (elem.text or '').strip(), None
+    if tag == 'Literal' and len(elem) == 0:
+        return None, elem.text or ''
+
+    raise ValueError('The expression ogc:%s cannot be compiled.' % tag)
+
+
+def _vector_comparison(op, left, right, match_case):
+    """
+    Compile a binary comparison into a function over a batch of features.
+    """
+    lname, ltext = _vector_expression(left)
+    rname, rtext = _vector_expression(right)
+    if lname is None and not rname is None:
+        lname, ltext, rname, rtext, op = rname, rtext, lname, ltext, _mirrored[op]
+    function = _operators[op]
+
+    if lname is None:
+        # two literals
+        constant = compare(ltext, rtext, op, match_case)
+        return lambda columns: numpy.full(columns.size, constant, dtype=bool)
+
+    if not rname is None:
+        # two properties, compared one feature at a time
+        pair = numpy.frompyfunc(lambda left, right: compare(left, right, op, match_case), 2, 1)
+
+        def evaluate(columns):
+            if not columns.has(lname) or not columns.has(rname):
+                return numpy.zeros(columns.size, dtype=bool)
+            return pair(columns.raw(lname), columns.raw(rname)).astype(bool)
+
+        return evaluate
+
+    number = parse_number(rtext)
+    text = rtext if match_case else rtext.lower()
+
+    def evaluate(columns):
+        if not columns.has(lname):
+            return numpy.zeros(columns.size, dtype=bool)
+
+        if number is None:
+            result = function(columns.text(lname, lower=not match_case), text)
+        else:
+            values, valid = columns.numbers(lname)
+            with numpy.errstate(invalid='ignore'):
+                result = function(values, number)
+            if not valid.all():
+                # values that are not numbers are compared as text
+                result = numpy.where(valid, result, function(columns.text(lname, lower=not match_case), text))
+
+        return result & columns.present(lname)
+
+    return evaluate
+
+
+def _vector_like(elem, match_case):
+    """
+    Compile an ogc:PropertyIsLike element into a function over a batch of
+    features. Patterns with wild cards only at their ends are matched with
+    vectorized string operations, and other patterns with a regular
+    expression, one feature at a time.
+    """
+    name = elem.find('{%s}PropertyName' % _ogc)
+    if name is None:
+        raise ValueError('The filter ogc:PropertyIsLike needs a property.')
+    name = _vector_expression(name)[0]
+
+    wild = elem.get('wildCard', '*')
+    single = elem.get('singleChar', '?')
+    escape = elem.get('escapeChar', elem.get('escape', '\\'))
+    literal = elem.find('{%s}Literal' % _ogc)
+    text = '' if literal is None or literal.text is None else literal.text
+    if not match_case:
+        text = text.lower()
+
+    parts = text.split(wild)
+    if single in text or escape in text or len(parts) > 3 or (len(parts) == 3 and (parts[0] or parts[2])):
+        flags = 0 if match_case else re.IGNORECASE | re.UNICODE
+        search = re.compile(like_pattern(elem), flags).match
+        matches = numpy.frompyfunc(lambda value: not search(value) is None, 1, 1)
+
+        def match(values):
+            return matches(values).astype(bool)
+    elif len(parts) == 1:
+        def match(values):
+            return values == text
+    elif len(parts) == 3:
+        def match(values):
+            return numpy.char.find(values, parts[1]) >= 0
+    elif not parts[1]:
+        def match(values):
+            return numpy.char.startswith(values, parts[0])
+    elif not parts[0]:
+        def match(values):
+            return numpy.char.endswith(values, parts[1])
+    else:
+        def match(values):
+            return numpy.char.startswith(values, parts[0]) & numpy.char.endswith(values, parts[1]) & \
+                (numpy.char.str_len(values) >= len(parts[0]) + len(parts[1]))
+
+    def evaluate(columns):
+        if not columns.has(name):
+            return numpy.zeros(columns.size, dtype=bool)
+        return match(columns.text(name, lower=not match_case)) & columns.present(name)
+
+    return evaluate
+
+
+def _vector_predicate(elem):
+    """
+    Compile a filter predicate element into a function over a batch of
+    features.
+    """
+    if not iselement(elem) or not isinstance(elem.tag, string_types):
+        raise ValueError('The filter contains an unexpected node.')
+
+    tag = QName(elem).localname
+    children = [child for child in elem if isinstance(child.tag, string_types)]
+    if tag in ('And', 'Or'):
+        if len(children) < 2:
+            raise ValueError('The filter ogc:%s needs at least two operands.' % tag)
+        operands = [_vector_predicate(child) for child in children]
+        combine = operator.and_ if tag == 'And' else operator.or_
+
+        def evaluate(columns):
+            result = operands[0](columns)
+            for operand in operands[1:]:
+                result = combine(result, operand(columns))
+            return result
+
+        return evaluate
+    if tag == 'Not':
+        if len(children) != 1:
+            raise ValueError('The filter ogc:Not needs exactly one operand.')
+        operand = _vector_predicate(children[0])
+        return lambda columns: ~operand(columns)
+
+    match_case = not elem.get('matchCase', 'true') in ('false', '0')
+    if tag in _comparisons:
+        if len(children) != 2:
+            raise ValueError('The filter ogc:%s needs exactly two expressions.' % tag)
+        return _vector_comparison(_comparisons[tag], children[0], children[1], match_case)
+    if tag == 'PropertyIsBetween':
+        lower = elem.find('{%s}LowerBoundary' % _ogc)
+        upper = elem.find('{%s}UpperBoundary' % _ogc)
+        if len(children) != 3 or lower is None or upper is None or len(lower) != 1 or len(upper) != 1:
+            raise ValueError('The filter ogc:PropertyIsBetween needs an expression and two boundaries.')
+        above = _vector_comparison('>=', children[0], lower[0], True)
+        below = _vector_comparison('<=', children[0], upper[0], True)
+        return lambda columns: above(columns) & below(columns)
+    if tag == 'PropertyIsNull':
+        if len(children) != 1:
+            raise ValueError('The filter ogc:PropertyIsNull needs exactly one property.')
+        name = _vector_expression(children[0])[0]
+
+        def evaluate(columns):
+            if not columns.has(name):
+                return numpy.ones(columns.size, dtype=bool)
+            return ~columns.present(name)
+
+        return evaluate
+    if tag == 'PropertyIsLike':
+        return _vector_like(elem, match_case)
+
+    raise ValueError('The filter ogc:%s cannot be compiled.' % tag)
+
+
+def compile_columns(elem):
+    """
+    Compile an ogc:Filter element into a function over a batch of features
+    stored by column. The same filters as by L{compile_filter} can be
+    compiled, with the same results. Requires NumPy.
+
+    Numeric and string columns are compared with vectorized operations.
+    Values that are None or NaN are missing, see L{is_missing}. Object
+    columns, and string columns with values that are not numbers compared
+    against a number, are converted one value at a time, once per batch.
+
+    @type  elem: etree.Element
+    @param elem: The ogc:Filter element.
+    @rtype: function
+    @return: A function that takes a mapping from property names to arrays
+        of values, one per feature, and an optional number of features, and
+        returns a boolean array, true for the features the filter matches.
+        The number of features defaults to the length of the columns. Its
+        predicate attribute evaluates the filter against a L{_Columns}
+        batch, so several filters can share the forms of the columns.
+    """
+    if numpy is None:
+        raise ImportError('Columnar filter evaluation requires NumPy.')
+
+    key = tostring(elem, with_tail=False)
+    function = _compiled_columns.get(key)
+    if not function is None:
+        return function
+
+    predicates = [child for child in elem if isinstance(child.tag, string_types)]
+    if len(predicates) != 1:
+        raise ValueError('The filter must have exactly one predicate to be compiled.')
+    predicate = _vector_predicate(predicates[0])
+
+    def function(columns, size=None):
+        return predicate(_Columns(columns, size))
+    function.predicate = predicate
+
+    if len(_compiled_columns) >= _compiled_limit:
+        _compiled_columns.clear()
+    _compiled_columns[key] = function
+
+    return function
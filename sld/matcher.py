@@ -0,0 +1,339 @@
+"""
+Matching of features to the rules of a style.
+
+A L{StyleMatcher} compiles the rules of a L{sld.FeatureTypeStyle} once:
+their scale ranges, and their filters, see L{sld.filters.compile_columns}.
+It then assigns the rules to batches of features stored by column, at a
+given scale denominator, with vectorized NumPy operations. It requires
+NumPy.
+
+Styles often classify features by the value of one property, with a rule
+for each value, or each set of values. Such rules are not tested one at a
+time: the matcher maps each value to its rules with a dictionary, so the
+time taken does not grow with the number of rules.
+
+License
+=======
+Copyright 2011-2014 David Zwarg <U{david.a@zwarg.com}>
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+U{http://www.apache.org/licenses/LICENSE-2.0}
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+@author: David Zwarg
+@contact: david.a@zwarg.com
+@copyright: 2011-2014, Azavea
+@license: Apache 2.0
+@version: 1.0.10
+"""
+from sld import SLDNode, ScaleIndex, _documents, _scale_range
+from sld.filters import compile_columns, compile_filter, equality_key, numpy, parse_number, string_types, \
+    _Columns
+
+_sld = SLDNode._nsmap['sld']
+_ogc = SLDNode._nsmap['ogc']
+
+_never = object()
+"""The generation of rules that were never compiled."""
+
+_dispatch_minimum = 4
+"""The number of equality rules on one property, from which they are matched with a dictionary."""
+
+
+def _categories(rfilter):
+    """
+    Get the property and the values of a filter that is an equality on one
+    property, or an ogc:Or of equalities on the same property.
+
+    @type  rfilter: etree.Element
+    @param rfilter: The ogc:Filter element.
+    @rtype: tuple
+    @return: The name of the property, and the equality keys of the values,
+        see L{sld.filters.equality_key}, or None for any other filter.
+    """
+    predicates = [child for child in rfilter if isinstance(child.tag, string_types)]
+    if len(predicates) != 1:
+        return None
+
+    terms = [predicates[0]]
+    if terms[0].tag == '{%s}Or' % _ogc:
+        terms = [child for child in terms[0] if isinstance(child.tag, string_types)]
+
+    name = None
+    keys = []
+    for term in terms:
+        if term.tag != '{%s}PropertyIsEqualTo' % _ogc or term.get('matchCase', 'true') in ('false', '0'):
+            return None
+
+        children = [child for child in term if isinstance(child.tag, string_types)]
+        names = [child for child in children if child.tag == '{%s}PropertyName' % _ogc]
+        literals = [child for child in children if child.tag == '{%s}Literal' % _ogc and len(child) == 0]
+        if len(children) != 2 or len(names) != 1 or len(literals) != 1:
+            return None
+
+        if name is None:
+            name = (names[0].text or '').strip()
+        elif name != (names[0].text or '').strip():
+            return None
+
+        text = literals[0].text or ''
+        number = parse_number(text)
+        keys.append(text if number is None else number)
+
+    return name, keys
+
+
+class StyleMatcher(object):
+    """
+    The rules of a L{sld.FeatureTypeStyle}, compiled to match features. A
+    rule applies to a feature if the scale denominator is in the range of
+    the rule, where the MinScaleDenominator is inclusive and the
+    MaxScaleDenominator exclusive, and its filter matches the feature. A
+    rule without a filter matches every feature, and a rule with an
+    ElseFilter matches the features that no other rule in scale matches.
+
+    Rules whose filter is an equality on a property, or an ogc:Or of
+    equalities on the same property, are matched with a dictionary from
+    the values of the property to the rules, when there are at least a few
+    such rules on the same property. The other rules are tested in order.
+
+    The rules are compiled again when the document changed since they were
+    last compiled. Call L{sld.StyledLayerDescriptor.invalidate} after
+    changing the underlying lxml elements directly.
+    """
+
+    def __init__(self, featuretypestyle):
+        """
+        Compile the rules of a style.
+
+        @type  featuretypestyle: L{sld.FeatureTypeStyle}
+        @param featuretypestyle: The style.
+        """
+        if numpy is None:
+            raise ImportError('Rule matching requires NumPy.')
+
+        self._node = featuretypestyle._node
+        self._generation = _never
+        self._compile()
+
+    def _compile(self):
+        """
+        Compile the rules, if the document changed since they were last
+        compiled.
+        """
+        doc = _documents.get(self._node.getroottree().getroot())
+        generation = None if doc is None else doc.generation
+        if generation == self._generation:
+            return
+
+        rules = list(self._node.iterchildren('{%s}Rule' % _sld))
+        filters = [rule.find('{%s}Filter' % _ogc) for rule in rules]
+        otherwise = [not rule.find('{%s}ElseFilter' % _sld) is None for rule in rules]
+
+        groups = {}
+        for i, rfilter in enumerate(filters):
+            categories = None if rfilter is None else _categories(rfilter)
+            if not categories is None:
+                groups.setdefault(categories[0], []).append((i, categories[1]))
+
+        # the rules of each value, in document order
+        tables = {}
+        dispatched = set()
+        for name, members in groups.items():
+            if len(members) < _dispatch_minimum:
+                continue
+
+            table = tables[name] = {}
+            for i, keys in members:
+                for key in keys:
+                    indexes = table.setdefault(key, [])
+                    if not indexes or indexes[-1] != i:
+                        indexes.append(i)
+                dispatched.add(i)
+
+        self._scales = ScaleIndex((i,) + _scale_range(rule) for i, rule in enumerate(rules))
+        self._filters = filters
+        self._tables = tables
+        self._sequential = [i for i in range(len(rules)) if not i in dispatched and not otherwise[i]]
+        self._predicates = dict((i, compile_columns(filters[i]).predicate) for i in self._sequential
+                                if not filters[i] is None)
+        self._functions = {}
+        self._otherwise = numpy.array(otherwise, dtype=bool)
+        self._active = (None, None)
+        self._generation = generation
+
+    def __len__(self):
+        """
+        Get the number of rules.
+
+        @rtype: integer
+        @return: The number of rules.
+        """
+        self._compile()
+        return len(self._filters)
+
+    def active(self, scale):
+        """
+        Get the rules in scale.
+
+        @type  scale: float
+        @param scale: The scale denominator.
+        @rtype: numpy.ndarray
+        @return: The indexes of the rules in scale, in document order.
+        """
+        self._compile()
+        return numpy.array(self._scales.active(scale), dtype=numpy.intp)
+
+    def _active_mask(self, scale):
+        """
+        Get the rules in scale, as a boolean array, and their indexes. The
+        last result is kept, since consecutive calls are usually at the
+        same scale.
+        """
+        self._compile()
+        if self._active[0] != scale:
+            active = self.active(scale)
+            mask = numpy.zeros(len(self._filters), dtype=bool)
+            mask[active] = True
+            self._active = (scale, (mask, active))
+
+        return self._active[1]
+
+    def _first(self, indexes, mask):
+        """
+        Get the first of some rules that is in scale.
+        """
+        for i in indexes or ():
+            if mask[i]:
+                return i
+
+        return len(self._filters)
+
+    def match(self, columns, scale, first=True, size=None):
+        """
+        Assign the rules to a batch of features.
+
+        @type  columns: dict
+        @param columns: A mapping from property names to NumPy arrays of
+            values, one per feature.
+        @type    scale: float
+        @param   scale: The scale denominator.
+        @type    first: boolean
+        @param   first: Optional. Find only the first matching rule of each
+            feature, rather than all of them.
+        @type     size: integer
+        @param    size: Optional. The number of features. Defaults to the
+            length of the columns.
+        @rtype: numpy.ndarray
+        @return: If first is set, an integer array with the index of the
+            first matching rule of each feature, or -1 if no rule matches it.
+            Otherwise, a boolean array with a row for each feature and a
+            column for each rule, true where the rule matches the feature.
+        """
+        mask, active = self._active_mask(scale)
+        batch = _Columns(columns, size)
+        count = len(self._filters)
+
+        if first:
+            # in reverse order, so the first matching rule is written last
+            result = numpy.full(batch.size, count, dtype=numpy.intp)
+            for index in reversed(self._sequential):
+                if not mask[index]:
+                    continue
+                if not index in self._predicates:
+                    result[:] = index
+                else:
+                    numpy.putmask(result, self._predicates[index](batch), index)
+
+            for name, table in self._tables.items():
+                if not batch.has(name):
+                    continue
+                keys, inverse = batch.categories(name)
+                firsts = numpy.array([self._first(table.get(key), mask) for key in keys], dtype=numpy.intp)
+                if len(firsts):
+                    numpy.minimum(result, firsts[inverse], out=result)
+
+            unmatched = result == count
+            otherwise = active[self._otherwise[active]]
+            result[unmatched] = otherwise[0] if len(otherwise) else -1
+            return result
+
+        # one row per rule while matching, transposed on return
+        result = numpy.zeros((count, batch.size), dtype=bool)
+        for index in self._sequential:
+            if not mask[index]:
+                continue
+            if not index in self._predicates:
+                result[index] = True
+            else:
+                result[index] = self._predicates[index](batch)
+
+        for name, table in self._tables.items():
+            if not batch.has(name):
+                continue
+            keys, inverse = batch.categories(name)
+            order = numpy.argsort(inverse, kind='stable')
+            starts = numpy.concatenate(([0], numpy.cumsum(numpy.bincount(inverse, minlength=len(keys)))))
+            for j, key in enumerate(keys):
+                indexes = [i for i in table.get(key, ()) if mask[i]]
+                if indexes:
+                    features = order[starts[j]:starts[j + 1]]
+                    for i in indexes:
+                        result[i, features] = True
+
+        otherwise = active[self._otherwise[active]]
+        if len(otherwise):
+            unmatched = ~result.any(axis=0)
+            for index in otherwise:
+                result[index] = unmatched
+        return result.T
+
+    def match_feature(self, feature, scale):
+        """
+        Find the first rule that matches one feature. Rules matched with a
+        dictionary take constant time, and the other rules are tested in
+        order, see L{sld.filters.compile_filter}.
+
+        @type  feature: dict
+        @param feature: A mapping from property names to values.
+        @type    scale: float
+        @param   scale: The scale denominator.
+        @rtype: integer
+        @return: The index of the first matching rule, or -1 if no rule
+            matches the feature.
+        """
+        mask, active = self._active_mask(scale)
+        count = len(self._filters)
+
+        result = count
+        for name, table in self._tables.items():
+            indexes = table.get(equality_key(feature.get(name)))
+            if indexes:
+                result = min(result, self._first(indexes, mask))
+
+        for index in self._sequential:
+            if index >= result:
+                break
+            if not mask[index]:
+                continue
+
+            function = self._functions.get(index)
+            if function is None and not self._filters[index] is None:
+                function = self._functions[index] = compile_filter(self._filters[index])
+            if function is None or function(feature):
+                result = index
+                break
+
+        if result < count:
+            return result
+
+        otherwise = active[self._otherwise[active]]
+        return int(otherwise[0]) if len(otherwise) else -1
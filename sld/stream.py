@@ -0,0 +1,229 @@
+"""
+Streaming access to very large SLD documents.
+
+L{iter_rules} reads the rules of an SLD document one at a time, without
+building the whole document tree, and L{SLDWriter} writes the rules of an
+SLD document one at a time, without building the whole document tree or
+its text. The memory used does not grow with the size of the document.
+
+License
+=======
+Copyright 2011-2014 David Zwarg <U{david.a@zwarg.com}>
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+U{http://www.apache.org/licenses/LICENSE-2.0}
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+@author: David Zwarg
+@contact: david.a@zwarg.com
+@copyright: 2011-2014, Azavea
+@license: Apache 2.0
+@version: 1.0.10
+"""
+from collections import namedtuple
+from lxml.etree import cleanup_namespaces, iterparse, iselement, xmlfile
+
+import sld
+from sld import SLDNode, StyledLayerDescriptor, NamedLayer, UserStyle, FeatureTypeStyle, Rule, _forget
+
+_rule_tag = '{%s}Rule' % SLDNode._nsmap['sld']
+_layer_tags = ('{%s}NamedLayer' % SLDNode._nsmap['sld'], '{%s}UserLayer' % SLDNode._nsmap['sld'])
+
+
+class RuleItem(namedtuple('RuleItem', 'namedlayer userstyle featuretypestyle rule')):
+    """
+    A L{Rule} read from a stream, with the L{NamedLayer}, L{UserStyle} and
+    L{FeatureTypeStyle} that enclose it. The enclosing elements only contain
+    the children that precede the rule in the document, such as their names
+    and titles.
+    """
+    __slots__ = ()
+
+
+def iter_rules(source):
+    """
+    Read the rules of an SLD document one at a time. Each rule is removed
+    from the document once the next one is read, and each layer once all of
+    its rules were read, so the memory used does not grow with the number
+    of rules. A rule may be kept, or changed, after the next rule is read.
+
+    The document is not validated. As for documents loaded into a
+    L{StyledLayerDescriptor}, entities are not resolved and the network is
+    not accessed, unless allowed with L{sld.set_parser_options}, which also
+    sets the huge_tree and remove_blank_text options. Rules of user layers
+    are skipped, since this library does not model them.
+
+    @type  source: string
+    @param source: The name of an SLD file, or a file object.
+    @rtype: iterator
+    @return: An iterator of L{RuleItem} tuples, in document order.
+    """
+    options = dict((name, sld._parser_options[name]) for name in sld._parser_defaults)
+    for event, elem in iterparse(source, events=('end',), tag=(_rule_tag,) + _layer_tags, **options):
+        if elem.tag != _rule_tag:
+            # all of the rules of this layer were read
+            elem.getparent().remove(elem)
+            continue
+
+        fts = elem.getparent()
+        style = None if fts is None else fts.getparent()
+        layer = None if style is None else style.getparent()
+        if layer is None or layer.tag != _layer_tags[0]:
+            if not fts is None:
+                fts.remove(elem)
+            continue
+
+        yield RuleItem(NamedLayer.wrap(layer.getparent(), layer), UserStyle.wrap(layer, style),
+                       FeatureTypeStyle.wrap(style, fts), Rule.wrap(fts, elem))
+
+        # unless the caller moved the rule elsewhere
+        if elem.getparent() is fts:
+            fts.remove(elem)
+
+
+class SLDWriter(object):
+    """
+    A writer of SLD documents with one L{NamedLayer}, one L{UserStyle} and
+    one L{FeatureTypeStyle}, which writes each rule as soon as it is added.
+    The memory used does not grow with the number of rules.
+
+    Each rule is written as a self-contained element, which declares the
+    namespaces it uses again.
+
+    The writer is a context manager: the enclosing elements are written when
+    the context is entered, and closed when it is exited::
+
+        with SLDWriter('parcels.sld', 'parcels') as writer:
+            for parcel_class in classes:
+                writer.create_rule(parcel_class.name, PolygonSymbolizer,
+                                   filter=('class', '==', parcel_class.code))
+    """
+
+    def __init__(self, output, name, title=None):
+        """
+        Create a writer. Nothing is written until the context is entered.
+
+        @type  output: string
+        @param output: The name of a file, or a file object opened for
+            writing in binary mode, such as a socket's makefile('wb').
+        @type    name: string
+        @param   name: The name of the L{NamedLayer}.
+        @type   title: string
+        @param  title: Optional. The title of the L{UserStyle}.
+        """
+        self._output = output
+        self._name = name
+        self._title = title
+        self._xmlfile = None
+        self._writer = None
+        self._elements = None
+        self._scratch = None
+
+    def __enter__(self):
+        """
+        Write the declaration, and open the enclosing elements.
+        """
+        ns = SLDNode._nsmap['sld']
+
+        self._xmlfile = xmlfile(self._output, encoding='UTF-8')
+        self._writer = self._xmlfile.__enter__()
+        self._writer.write_declaration()
+
+        self._elements = []
+        self._open('{%s}StyledLayerDescriptor' % ns, {'version': '1.0.0'}, nsmap=SLDNode._nsmap)
+        self._open('{%s}NamedLayer' % ns)
+        self._text('{%s}Name' % ns, self._name)
+        self._open('{%s}UserStyle' % ns)
+        if not self._title is None:
+            self._text('{%s}Title' % ns, self._title)
+        self._open('{%s}FeatureTypeStyle' % ns)
+
+        # new rules are built in a scratch document, then written and removed
+        self._scratch = StyledLayerDescriptor().create_namedlayer(self._name).create_userstyle() \
+            .create_featuretypestyle()
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """
+        Close the enclosing elements, and the output.
+        """
+        while self._elements:
+            self._elements.pop().__exit__(exc_type, exc_value, traceback)
+
+        self._scratch = None
+        self._writer = None
+        return self._xmlfile.__exit__(exc_type, exc_value, traceback)
+
+    def _open(self, tag, attrib=None, nsmap=None):
+        """
+        Open an enclosing element.
+        """
+        element = self._writer.element(tag, attrib or {}, nsmap=nsmap)
+        element.__enter__()
+        self._elements.append(element)
+
+    def _text(self, tag, text):
+        """
+        Write an element with only text content.
+        """
+        with self._writer.element(tag):
+            self._writer.write(text)
+
+    def write(self, rule):
+        """
+        Write a rule. The rule is copied to the output as it is; it is not
+        normalized.
+
+        @type  rule: L{Rule}
+        @param rule: The rule, or its element.
+        """
+        if not iselement(rule):
+            rule = rule._node
+
+        self._writer.write(rule, with_tail=False)
+
+    def create_rule(self, title, symbolizer=None, MinScaleDenominator=None, MaxScaleDenominator=None,
+                    filter=None):
+        """
+        Create a rule, and write it. The rule is built as by
+        L{FeatureTypeStyle.create_rule}, with an optional filter built as by
+        L{Rule.create_filter}.
+
+        @type                title: string
+        @param               title: The title of the new rule.
+        @type           symbolizer: L{Symbolizer} I{class}
+        @param          symbolizer: Optional. The symbolizer type.
+        @type  MinScaleDenominator: string
+        @param MinScaleDenominator: Optional. The minimum scale denominator.
+        @type  MaxScaleDenominator: string
+        @param MaxScaleDenominator: Optional. The maximum scale denominator.
+        @type               filter: tuple
+        @param              filter: Optional. The property name, comparitor
+            and value of a filter on the rule.
+        """
+        rule = self._scratch.create_rule(title, symbolizer, MinScaleDenominator, MaxScaleDenominator)
+        if not filter is None:
+            rule.create_filter(*filter)
+            rule.normalize()
+
+        # a detached rule only declares the namespaces it uses
+        self._scratch._node.remove(rule._node)
+        _forget(rule._node)
+        cleanup_namespaces(rule._node)
+
+        self.write(rule)
+
+    def flush(self):
+        """
+        Write any buffered output.
+        """
+        self._writer.flush()
@@ -0,0 +1,418 @@
+"""
+A fast structural validator for SLD documents.
+
+The validator checks the element structure of a document: the order and
+number of the children of every element, which implies the required
+children and the allowed parents of every element, and the required and
+fixed attributes. It does not check text values or optional attributes.
+Its tables are generated from the bundled XSD files, so it follows the
+schema exactly for the parts of the schema that it covers.
+
+Each content model in the schema is translated to a regular expression,
+over a string with one character per child element. Validating an element
+is then a single regular expression match.
+
+License
+=======
+Copyright 2011-2014 David Zwarg <U{david.a@zwarg.com}>
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+U{http://www.apache.org/licenses/LICENSE-2.0}
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from lxml.etree import parse, XMLParser, Comment, Entity, ProcessingInstruction, iselement
+import logging
+import os
+import re
+import threading
+
+try:
+    unichr
+except NameError:
+    unichr = chr
+
+_xsd = 'http://www.w3.org/2001/XMLSchema'
+"""The XML Schema namespace."""
+
+_structures = {}
+"""Structural validators, keyed by SLD version. Shared by every document in the process."""
+
+_structure_lock = threading.Lock()
+"""Serializes validator generation, so each version is generated only once."""
+
+_unknown = u'\x01'
+"""The token of an element that is not declared in the schema."""
+
+
+def get_structure(version='1.0.0'):
+    """
+    Get the structural validator for a version of the SLD specification. The
+    validator is generated from the bundled schema on first use, and shared
+    for the life of the process.
+
+    @type  version: string
+    @param version: The SLD version of the schema.
+    @rtype: L{StructureValidator}
+    @return: The structural validator.
+    """
+    structure = _structures.get(version)
+    if structure is None:
+        with _structure_lock:
+            structure = _structures.get(version)
+            if structure is None:
+                logging.debug('Generating structural validator for SLD version %s.', version)
+                structure = StructureValidator(version)
+                _structures[version] = structure
+
+    return structure
+
+
+class StructureValidator(object):
+    """
+    A table-driven validator for the element structure of SLD documents,
+    generated from the bundled XSD files.
+    """
+
+    def __init__(self, version='1.0.0'):
+        """
+        Generate the validator tables from the bundled schema.
+
+        @type  version: string
+        @param version: The SLD version of the schema.
+        """
+        # imported here, since this module is imported by the sld package
+        from sld import bundled_schema_path, _schema_host
+
+        path = bundled_schema_path('%ssld/%s/StyledLayerDescriptor.xsd' % (_schema_host, version))
+        if path is None:
+            raise ValueError('There is no bundled schema for SLD version "%s".' % version)
+
+        self._elements = {}
+        self._types = {}
+        self._attribute_groups = {}
+        self._substitutes = {}
+        self._locals = {}
+
+        parser = XMLParser(no_network=True, remove_comments=True)
+        pending = [path]
+        loaded = set()
+        while pending:
+            path = os.path.normpath(pending.pop())
+            if path in loaded:
+                continue
+            loaded.add(path)
+
+            schema = parse(path, parser).getroot()
+            for location in self._collect(schema):
+                if '://' in location:
+                    location = bundled_schema_path(location)
+                else:
+                    location = os.path.join(os.path.dirname(path), location)
+                if location is not None:
+                    pending.append(location)
+
+        self.roots = frozenset([tag for tag, decl in self._elements.items() if decl.get('abstract') != 'true'])
+        """The qualified tags of the elements allowed as the document element."""
+
+        self.tokens = {}
+        """The character standing for each declared element, keyed by qualified tag."""
+        for i, tag in enumerate(sorted(set(self._elements) | set(self._locals))):
+            self.tokens[tag] = unichr(0x100 + i)
+        # comments, entities and processing instructions have a factory as their tag
+        for factory in (Comment, Entity, ProcessingInstruction):
+            self.tokens[factory] = u''
+
+        self.models = {}
+        """The content model of each element, as a compiled regular expression, keyed by qualified tag."""
+
+        self.required = {}
+        """The names of the required attributes of each element, keyed by qualified tag."""
+
+        self.fixed = {}
+        """The fixed attribute values of each element, keyed by qualified tag."""
+
+        declarations = [(tag, decl) for tag, decl in self._elements.items() if decl.get('abstract') != 'true']
+        # local declarations are only used for names that are declared in one place
+        declarations += [(tag, decls[0]) for tag, decls in self._locals.items()
+                         if len(decls) == 1 and not tag in self._elements]
+        for tag, decl in declarations:
+            ctype = self._element_type(decl)
+            if ctype is False:
+                continue
+
+            model, required, fixed = self._type_model(ctype)
+            if not model is None:
+                self.models[tag] = re.compile(u'(?:%s)\\Z' % model, re.DOTALL)
+            if required:
+                self.required[tag] = required
+            if fixed:
+                self.fixed[tag] = fixed
+
+    def _qname(self, node, value):
+        """
+        Expand a prefixed name in a schema into a qualified name.
+        """
+        if ':' in value:
+            prefix, local = value.split(':', 1)
+        else:
+            prefix, local = None, value
+
+        return '{%s}%s' % (node.nsmap.get(prefix, ''), local)
+
+    def _collect(self, schema):
+        """
+        Collect the global declarations of a schema document, and return the
+        locations of the schemas it includes and imports.
+        """
+        target = schema.get('targetNamespace', '')
+        qualified = schema.get('elementFormDefault') == 'qualified'
+
+        for node in schema:
+            if not iselement(node) or callable(node.tag):
+                continue
+
+            name = node.get('name')
+            if node.tag == '{%s}element' % _xsd:
+                tag = '{%s}%s' % (target, name)
+                self._elements[tag] = node
+                group = node.get('substitutionGroup')
+                if not group is None:
+                    self._substitutes.setdefault(self._qname(node, group), []).append(tag)
+            elif node.tag == '{%s}complexType' % _xsd or node.tag == '{%s}simpleType' % _xsd:
+                self._types['{%s}%s' % (target, name)] = node
+            elif node.tag == '{%s}attributeGroup' % _xsd:
+                self._attribute_groups['{%s}%s' % (target, name)] = node
+
+        for node in schema.iter('{%s}element' % _xsd):
+            if not node.getparent() is schema and not node.get('name') is None:
+                namespace = target if qualified or node.get('form') == 'qualified' else ''
+                self._locals.setdefault('{%s}%s' % (namespace, node.get('name')), []).append(node)
+
+        locations = []
+        for node in schema:
+            if node.tag in ('{%s}include' % _xsd, '{%s}import' % _xsd) and node.get('schemaLocation'):
+                locations.append(node.get('schemaLocation'))
+
+        return locations
+
+    def _element_type(self, decl):
+        """
+        Get the type definition of an element declaration: a complexType or
+        simpleType node, None for a built-in simple type, or False for the
+        unconstrained anyType.
+        """
+        for child in decl:
+            if child.tag in ('{%s}complexType' % _xsd, '{%s}simpleType' % _xsd):
+                return child
+
+        name = decl.get('type')
+        if name is None:
+            return False
+
+        name = self._qname(decl, name)
+        if name == '{%s}anyType' % _xsd:
+            return False
+
+        return self._types.get(name)
+
+    def _type_model(self, ctype):
+        """
+        Translate a type definition into a content model expression, and the
+        required and fixed attributes.
+        """
+        if ctype is None or ctype.tag == '{%s}simpleType' % _xsd:
+            return u'', set(), {}
+
+        model = u''
+        required = set()
+        fixed = {}
+        for child in ctype:
+            if child.tag == '{%s}simpleContent' % _xsd:
+                for derivation in child:
+                    self._attributes(derivation, required, fixed)
+            elif child.tag == '{%s}complexContent' % _xsd:
+                for derivation in child:
+                    if derivation.tag == '{%s}extension' % _xsd:
+                        base = self._types.get(self._qname(derivation, derivation.get('base')))
+                        model, required, fixed = self._type_model(base)
+                        required, fixed = set(required), dict(fixed)
+                    if derivation.tag in ('{%s}extension' % _xsd, '{%s}restriction' % _xsd):
+                        model += self._particles(derivation)
+                        self._attributes(derivation, required, fixed)
+            else:
+                model += self._particle(child)
+
+        self._attributes(ctype, required, fixed)
+        return model, required, fixed
+
+    def _attributes(self, node, required, fixed):
+        """
+        Collect the required and fixed attributes declared in a type.
+        """
+        for child in node:
+            if child.tag == '{%s}attribute' % _xsd:
+                if child.get('name') is None:
+                    name = self._qname(child, child.get('ref'))
+                else:
+                    name = child.get('name')
+                if child.get('use') == 'required':
+                    required.add(name)
+                if not child.get('fixed') is None:
+                    fixed[name] = child.get('fixed')
+            elif child.tag == '{%s}attributeGroup' % _xsd:
+                group = self._attribute_groups.get(self._qname(child, child.get('ref')))
+                if not group is None:
+                    self._attributes(group, required, fixed)
+
+    def _particles(self, node):
+        """
+        Translate all particles directly inside a node into an expression.
+        """
+        return u''.join([self._particle(child) for child in node])
+
+    def _particle(self, node):
+        """
+        Translate a particle (an element, sequence, choice or wildcard) into
+        an expression, including its number of occurrences.
+        """
+        if node.tag == '{%s}element' % _xsd:
+            if node.get('ref') is None:
+                expr = self._tokens_for(['{%s}%s' % (self._namespace(node), node.get('name'))])
+            else:
+                expr = self._tokens_for(self._substitutable(self._qname(node, node.get('ref'))))
+        elif node.tag == '{%s}sequence' % _xsd:
+            expr = u'(?:%s)' % self._particles(node)
+        elif node.tag == '{%s}choice' % _xsd:
+            expr = u'(?:%s)' % u'|'.join([self._particle(child) for child in node
+                                          if not child.tag == '{%s}annotation' % _xsd])
+        elif node.tag == '{%s}any' % _xsd:
+            expr = u'.'
+        else:
+            return u''
+
+        low = node.get('minOccurs', '1')
+        high = node.get('maxOccurs', '1')
+        if low == '1' and high == '1':
+            return expr
+        elif low == '0' and high == '1':
+            return expr + u'?'
+        elif low == '0' and high == 'unbounded':
+            return expr + u'*'
+        elif low == '1' and high == 'unbounded':
+            return expr + u'+'
+        elif high == 'unbounded':
+            return expr + u'{%s,}' % low
+
+        return expr + u'{%s,%s}' % (low, high)
+
+    def _namespace(self, node):
+        """
+        Get the namespace of a local element declaration.
+        """
+        schema = node.getroottree().getroot()
+        if schema.get('elementFormDefault') == 'qualified' or node.get('form') == 'qualified':
+            return schema.get('targetNamespace', '')
+        return ''
+
+    def _substitutable(self, tag):
+        """
+        Get all concrete elements that may appear in place of an element.
+        """
+        tags = []
+        pending = [tag]
+        while pending:
+            tag = pending.pop()
+            decl = self._elements.get(tag)
+            if not decl is None and decl.get('abstract') != 'true':
+                tags.append(tag)
+            pending.extend(self._substitutes.get(tag, []))
+
+        return tags
+
+    def _tokens_for(self, tags):
+        """
+        Get an expression matching the token of any of a list of elements.
+        """
+        tokens = u''.join(sorted([self.tokens[tag] for tag in tags if tag in self.tokens]))
+        if not tokens:
+            return u'(?!)'
+        elif len(tokens) == 1:
+            return tokens
+        return u'[%s]' % tokens
+
+    def errors(self, node):
+        """
+        Check the structure of a document, and yield every problem found.
+
+        @type  node: etree.Element
+        @param node: The document, or its root element.
+        @rtype: iterator
+        @return: An iterator of (element, message) tuples.
+        """
+        if not iselement(node):
+            node = node.getroot()
+
+        if not node.tag in self.roots:
+            yield node, 'Element %s is not allowed as the document element.' % node.tag
+            return
+
+        for error in self.element_errors(node, deep=True):
+            yield error
+
+    def element_errors(self, node, deep=False):
+        """
+        Check the structure of one element of a document, and yield every
+        problem found. The children of the element are checked against its
+        content model, but not against their own.
+
+        @type  node: etree.Element
+        @param node: The element.
+        @type  deep: boolean
+        @param deep: Check all the descendants of the element too.
+        @rtype: iterator
+        @return: An iterator of (element, message) tuples.
+        """
+        tokens = self.tokens
+        models = self.models
+        required = self.required
+        fixed = self.fixed
+        for elem in (node.iter() if deep else (node,)):
+            tag = elem.tag
+            model = models.get(tag)
+            if not model is None:
+                children = u''.join([tokens.get(child.tag, _unknown) for child in elem]) if len(elem) else u''
+                if model.match(children) is None:
+                    yield elem, 'Element %s has unexpected children: %s.' % (
+                        tag, ', '.join([child.tag for child in elem if not callable(child.tag)]) or 'none')
+
+            if tag in required:
+                for name in required[tag]:
+                    if elem.get(name) is None:
+                        yield elem, 'Element %s is missing the required attribute %s.' % (tag, name)
+
+            if tag in fixed:
+                for name, value in fixed[tag].items():
+                    if not elem.get(name) in (None, value):
+                        yield elem, 'Attribute %s of element %s must be %s.' % (name, tag, value)
+
+    def validate(self, node):
+        """
+        Check the structure of a document.
+
+        @type  node: etree.Element
+        @param node: The document, or its root element.
+        @rtype: boolean
+        @return: A flag indicating if the structure of the document is valid.
+        """
+        for error in self.errors(node):
+            return False
+
+        return True
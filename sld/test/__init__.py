@@ -26,7 +26,14 @@ limitations under the License.
 """
 import sld
 import unittest
+try:
+    from collections.abc import MutableSequence
+except ImportError:
+    from collections import MutableSequence
 import copy
+import os
+import shutil
+import tempfile
 from lxml import etree
 
 
@@ -318,6 +325,80 @@ class SLD_Test(unittest.TestCase):
         sld_doc.normalize()
         self.assertTrue(sld_doc.validate())
 
+    def test_featuretypestyle_rules3(self):
+        """
+        Test the sequence operations of the Rules property.
+        """
+        sld_doc = copy.deepcopy(self._sld0)
+        fts = sld_doc.NamedLayer.UserStyle.FeatureTypeStyle
+        rules = fts.Rules
+        titles = [rule.Title for rule in rules]
+        self.assertEqual(len(titles), 6)
+
+        self.assertEqual([rule.Title for rule in rules[1:3]], titles[1:3])
+        self.assertEqual(rules[-1].Title, titles[-1])
+        self.assertEqual(rules.index(rules[2]), 2)
+        self.assertTrue(rules[3] in rules)
+
+        first = rules[0]
+        del rules[0]
+        self.assertEqual(len(rules), 5)
+        self.assertEqual([rule.Title for rule in fts.Rules], titles[1:])
+
+        rules.append(first)
+        self.assertEqual([rule.Title for rule in fts.Rules], titles[1:] + titles[:1])
+        self.assertEqual([rule.Title for rule in rules], titles[1:] + titles[:1])
+
+        # rules already in the list are moved
+        rules.insert(0, rules[-1])
+        self.assertEqual(len(rules), 6)
+        self.assertEqual([rule.Title for rule in rules], titles)
+        self.assertEqual([rule.Title for rule in fts.Rules], titles)
+
+        rules.insert(4, rules[1])
+        self.assertEqual([rule.Title for rule in rules], titles[:1] + titles[2:4] + titles[1:2] + titles[4:])
+        rules.insert(1, rules[3])
+        self.assertEqual([rule.Title for rule in rules], titles)
+
+        moved = rules[2]
+        rules[0] = moved
+        self.assertEqual(len(rules), 5)
+        self.assertEqual([rule.Title for rule in rules], titles[2:3] + titles[1:2] + titles[3:])
+        self.assertEqual([rule.Title for rule in fts.Rules], [rule.Title for rule in rules])
+        rules.insert(0, first)
+        rules[2] = moved
+        self.assertEqual([rule.Title for rule in rules], titles[:1] + titles[2:])
+        rules.insert(1, copy.deepcopy(first._node))
+        rules[1].Title = titles[1]
+
+        rules[1] = copy.deepcopy(rules[0]._node)
+        self.assertEqual(fts.Rules[1].Title, titles[0])
+        self.assertEqual(len(fts.Rules), 6)
+        self.assertEqual(len(rules), 6)
+
+        del rules[1:3]
+        self.assertEqual([rule.Title for rule in fts.Rules], titles[:1] + titles[3:])
+        self.assertEqual([rule.Title for rule in rules], titles[:1] + titles[3:])
+
+        self.assertRaises(TypeError, rules.append, 'not a rule')
+
+        # the methods of mutable sequences
+        self.assertTrue(isinstance(rules, MutableSequence))
+        last = rules.pop()
+        self.assertEqual(last.Title, titles[-1])
+        rules.extend([last])
+        rules.reverse()
+        self.assertEqual([rule.Title for rule in rules], list(reversed(titles[:1] + titles[3:])))
+        self.assertEqual([rule.Title for rule in fts.Rules], [rule.Title for rule in rules])
+        rules.remove(last)
+        self.assertEqual(rules.count(rules[0]), 1)
+        rules += [last]
+        self.assertEqual(len(fts.Rules), 4)
+        rules.reverse()
+
+        sld_doc.normalize()
+        self.assertTrue(sld_doc.validate())
+
     def test_rule_title1(self):
         """
         Test the parsing of the individual Rule properties.
@@ -825,7 +906,884 @@ class SLD_Test(unittest.TestCase):
 
         sld_doc.normalize()
         self.assertTrue(sld_doc.validate())
-        
+
+    def test_schema_cache(self):
+        """
+        Test that the compiled schema is shared by all documents.
+        """
+        schemas = dict(sld._schema_cache)
+        sld._schema_cache.clear()
+        try:
+            sld.StyledLayerDescriptor('test/style.sld')
+            schema = sld._schema_cache['1.0.0']
+            sld.StyledLayerDescriptor('test/style.sld')
+            self.assertTrue(sld._schema_cache['1.0.0'] is schema)
+            self.assertTrue(sld.get_schema() is sld.get_schema('1.0.0'))
+            self.assertTrue(sld.get_schema() is schema)
+        finally:
+            sld._schema_cache.clear()
+            sld._schema_cache.update(schemas)
+
+        # reports use a schema of their thread
+        self.assertTrue(sld._thread_schema() is sld._thread_schema('1.0.0'))
+
+    def test_schema_bundled(self):
+        """
+        Test that the OGC schemas resolve to the copies bundled with the package.
+        """
+        for url in ['http://schemas.opengis.net/sld/1.0.0/StyledLayerDescriptor.xsd',
+                    'http://schemas.opengis.net/filter/1.0.0/filter.xsd',
+                    'http://schemas.opengis.net/filter/1.0.0/expr.xsd',
+                    'http://schemas.opengis.net/gml/2.1.2/geometry.xsd',
+                    'https://schemas.opengis.net/xlink/1.0.0/xlinks.xsd']:
+            path = sld.bundled_schema_path(url)
+            self.assertFalse(path is None, "Schema '%s' is not bundled." % url)
+
+        self.assertTrue(sld.bundled_schema_path('http://schemas.opengis.net/sld/1.1.0/StyledLayerDescriptor.xsd') is None)
+        self.assertTrue(sld.bundled_schema_path('http://schemas.opengis.net/../../etc/passwd') is None)
+        self.assertTrue(sld.bundled_schema_path('http://example.com/schema.xsd') is None)
+
+    def test_constructor_novalidate(self):
+        """
+        Test that the schema is not loaded until the SLD is validated.
+        """
+        schemas = dict(sld._schema_cache)
+        sld._schema_cache.clear()
+        sld._thread_schemas.schemas = {}
+        try:
+            sld.StyledLayerDescriptor()
+            sld_doc = sld.StyledLayerDescriptor('test/style.sld', validate=False)
+            self.assertEqual(len(sld._schema_cache), 0)
+            self.assertEqual(len(sld._thread_schemas.schemas), 0)
+
+            self.assertTrue(sld_doc.validate())
+            self.assertTrue('1.0.0' in sld._thread_schemas.schemas)
+        finally:
+            sld._schema_cache.update(schemas)
+
+    def test_schema_disk_cache(self):
+        """
+        Test that schemas which are not bundled are read from the on-disk cache.
+        """
+        fetched = []
+
+        def urlopen(url):
+            # the suite runs offline; no schema is available to fetch
+            fetched.append(url)
+            raise IOError('Not found: %s' % url)
+
+        cachedir = tempfile.mkdtemp()
+        sld.set_cache_dir(cachedir)
+        sld.urlopen, orig_urlopen = urlopen, sld.urlopen
+        try:
+            url = 'http://schemas.opengis.net/sld/9.9.9/StyledLayerDescriptor.xsd'
+            path = os.path.join(cachedir, sld._cache_format, 'sld', '9.9.9', 'StyledLayerDescriptor.xsd')
+            os.makedirs(os.path.dirname(path))
+            shutil.copy(sld.bundled_schema_path(url.replace('9.9.9', '1.0.0')), path)
+
+            self.assertEqual(sld.get_cache_dir(), cachedir)
+            self.assertEqual(sld.cached_schema_path(url), path)
+            self.assertTrue(sld.cached_schema_path('http://example.com/schema.xsd') is None)
+            self.assertTrue(sld.cached_schema_path('http://schemas.opengis.net/../../etc/passwd') is None)
+
+            schema = sld._load_schema('9.9.9')
+            sld_doc = sld.StyledLayerDescriptor('test/style.sld')
+            self.assertTrue(schema.validate(sld_doc._node))
+
+            # unknown versions are neither bundled nor available to fetch
+            self.assertRaises(ValueError, sld._load_schema, '0.0.0')
+            self.assertEqual(fetched, [url.replace('9.9.9', '0.0.0')])
+
+            os.environ['PYTHON_SLD_CACHE_DIR'] = cachedir
+            sld.set_cache_dir(None)
+            self.assertEqual(sld.get_cache_dir(), cachedir)
+        finally:
+            sld.urlopen = orig_urlopen
+            os.environ.pop('PYTHON_SLD_CACHE_DIR', None)
+            sld.set_cache_dir(None)
+            shutil.rmtree(cachedir)
+
+    def test_warmup(self):
+        """
+        Test that warming up compiles the schema and the element lookups.
+        """
+        schemas = dict(sld._schema_cache)
+        sld._schema_cache.clear()
+        try:
+            sld.warmup()
+            self.assertTrue('1.0.0' in sld._schema_cache)
+
+            for expr in ['sld:NamedLayer', 'sld:UserStyle', 'sld:FeatureTypeStyle', 'sld:Rule',
+                         'ogc:Filter', 'ogc:PropertyIsEqualTo', 'ogc:Literal', 'sld:PointSymbolizer',
+                         'sld:Graphic', 'sld:Mark', 'sld:Fill', 'sld:Font', 'sld:Stroke', 'sld:CssParameter',
+                         'ogc:PropertyIsNotEqualTo', 'ogc:PropertyIsLike']:
+                self.assertTrue(expr in sld._xpaths, "'%s' is not compiled." % expr)
+        finally:
+            sld._schema_cache.update(schemas)
+
+    def test_xpath_cache(self):
+        """
+        Test that element lookups share compiled XPath expressions.
+        """
+        xpath = sld._xpath('sld:Rule')
+        self.assertTrue(xpath is sld._xpath('sld:Rule'))
+
+        fts = self._sld0.NamedLayer.UserStyle.FeatureTypeStyle
+        self.assertEqual(len(xpath(fts._node)), len(fts.Rules))
+
+    def test_class_properties(self):
+        """
+        Test that constructing wrappers does not redefine the class properties.
+        """
+        props = [(cls, name, cls.__dict__[name]) for cls, name in [
+            (sld.StyledLayerDescriptor, 'NamedLayer'), (sld.NamedLayer, 'UserStyle'),
+            (sld.UserStyle, 'Title'), (sld.Rule, 'Filter'), (sld.Rule, 'MaxScaleDenominator'),
+            (sld.Symbolizer, 'Fill'), (sld.Mark, 'WellKnownName'), (sld.Graphic, 'Size'),
+            (sld.PointSymbolizer, 'Graphic'), (sld.PropertyCriterion, 'Literal')]]
+
+        sld_doc = copy.deepcopy(self._sld0)
+        rule = sld_doc.NamedLayer.UserStyle.FeatureTypeStyle.Rules[0]
+        rule.PolygonSymbolizer.Fill
+        rule.Filter.PropertyIsGreaterThanOrEqualTo.Literal
+
+        for cls, name, prop in props:
+            self.assertTrue(cls.__dict__[name] is prop, "%s.%s was redefined." % (cls.__name__, name))
+        self.assertFalse('Fill' in sld.PolygonSymbolizer.__dict__)
+
+    def test_slots(self):
+        """
+        Test that the wrapper objects do not carry an instance dictionary.
+        """
+        sld_doc = copy.deepcopy(self._sld0)
+        rule = sld_doc.NamedLayer.UserStyle.FeatureTypeStyle.Rules[0]
+        rfilter = rule.Filter
+
+        for wrapper in [sld_doc, sld_doc.NamedLayer, rule, rfilter, rfilter.PropertyIsGreaterThanOrEqualTo,
+                        rule.PolygonSymbolizer, rule.PolygonSymbolizer.Fill,
+                        rule.PolygonSymbolizer.Fill.CssParameters, rule.PolygonSymbolizer.Fill.CssParameters[0],
+                        sld_doc.NamedLayer.UserStyle.FeatureTypeStyle.Rules]:
+            self.assertFalse(hasattr(wrapper, '__dict__'), "%s has a __dict__." % wrapper.__class__.__name__)
+
+        # filters still accept comparitors as attributes
+        rfilter.PropertyIsEqualTo = sld.PropertyCriterion(rfilter, 'PropertyIsEqualTo')
+        self.assertFalse(rfilter.PropertyIsEqualTo is None)
+
+    def test_wrapper_identity(self):
+        """
+        Test that navigating to the same element returns the same wrapper,
+        until the element is removed or replaced.
+        """
+        sld_doc = copy.deepcopy(self._sld0)
+        rules = sld_doc.NamedLayer.UserStyle.FeatureTypeStyle.Rules
+
+        self.assertTrue(rules[0] is rules[0])
+        self.assertTrue(sld_doc.NamedLayer.UserStyle is sld_doc.NamedLayer.UserStyle)
+
+        fill = rules[0].PolygonSymbolizer.Fill
+        self.assertTrue(fill is rules[0].PolygonSymbolizer.Fill)
+        self.assertTrue(fill.CssParameters[0] is rules[0].PolygonSymbolizer.Fill.CssParameters[0])
+
+        rfilter = rules[0].Filter
+        self.assertTrue(rfilter.PropertyIsGreaterThanOrEqualTo is rfilter.PropertyIsGreaterThanOrEqualTo)
+
+        # property deleters
+        del rules[0].PolygonSymbolizer.Fill
+        self.assertTrue(rules[0].PolygonSymbolizer.Fill is None)
+        rules[0].PolygonSymbolizer.create_fill()
+        self.assertFalse(rules[0].PolygonSymbolizer.Fill is fill)
+
+        # property setters
+        symbolizer = rules[0].PolygonSymbolizer
+        rules[0].PolygonSymbolizer = sld.PolygonSymbolizer.wrap(None, copy.deepcopy(symbolizer._node))
+        self.assertFalse(rules[0].PolygonSymbolizer is symbolizer)
+        self.assertEqual(len(sld._xpath('sld:PolygonSymbolizer')(rules[0]._node)), 1)
+
+        # list helpers
+        rule = rules[1]
+        del rules[1]
+        self.assertFalse(rules[1] is rule)
+
+        rule = rules[1]
+        rules[1] = copy.deepcopy(rule._node)
+        self.assertFalse(rules[1] is rule)
+        self.assertFalse(sld_doc.NamedLayer.UserStyle.FeatureTypeStyle.Rules[1] is rule)
+
+        rules[0].PolygonSymbolizer.Fill.create_cssparameter('fill', '#ffffff')
+        params = rules[0].PolygonSymbolizer.Fill.CssParameters
+        param = params[0]
+        self.assertTrue(param is rules[0].PolygonSymbolizer.Fill.CssParameters[0])
+        del params[0]
+        self.assertEqual(len(rules[0].PolygonSymbolizer.Fill.CssParameters), 0)
+        self.assertFalse(param._node in sld._wrappers)
+
+        sld_doc.normalize()
+        self.assertTrue(sld_doc.validate())
+
+    def test_normalize_order(self):
+        """
+        Test that normalizing sorts the children of rules and symbolizers into
+        schema order, in one pass over the document.
+        """
+        sld_doc = copy.deepcopy(self._sld0)
+        rule = sld_doc.NamedLayer.UserStyle.FeatureTypeStyle.Rules[0]
+
+        # move the title after the symbolizer, and the fill after the stroke
+        rule._node.append(sld._xpath('sld:Title')(rule._node)[0])
+        symbolizer = rule.PolygonSymbolizer
+        symbolizer.create_stroke()
+        symbolizer._node.append(sld._xpath('sld:Fill')(symbolizer._node)[0])
+
+        sld_doc.normalize()
+        names = [etree.QName(child).localname for child in rule._node if not callable(child.tag)]
+        self.assertEqual(names, ['Title', 'Filter', 'MaxScaleDenominator', 'PolygonSymbolizer'])
+        names = [etree.QName(child).localname for child in symbolizer._node]
+        self.assertEqual(names, ['Fill', 'Stroke'])
+        self.assertTrue(sld_doc.validate())
+
+        # normalizing an ordered document changes nothing
+        xml = sld_doc.as_sld()
+        sld_doc.normalize()
+        self.assertEqual(sld_doc.as_sld(), xml)
+
+    def test_dirty_tracking(self):
+        """
+        Test that only changed parts of a document are normalized, and that
+        validation results are reused until the document changes.
+        """
+        sld_doc = copy.deepcopy(self._sld0)
+        self.assertTrue(sld_doc.validate())
+        generation = sld_doc._document.generation
+        self.assertEqual(sld_doc._document.validated, generation)
+
+        # nothing changed, so the cached result is used
+        self.assertTrue(sld_doc.validate())
+        self.assertEqual(sld_doc._document.generation, generation)
+
+        rules = sld_doc.NamedLayer.UserStyle.FeatureTypeStyle.Rules
+
+        # untracked edits are not normalized
+        rules[1]._node.append(sld._xpath('sld:Title')(rules[1]._node)[0])
+        sld_doc.normalize()
+        self.assertNotEqual(etree.QName(rules[1]._node[0]).localname, 'Title')
+
+        # tracked edits are normalized, and invalidate the validation result
+        rules[0].Title = 'changed'
+        rules[0].create_symbolizer('Line')
+        self.assertTrue(sld_doc._document.generation > generation)
+        self.assertEqual(list(sld_doc._document.dirty.keys()), [rules[0]._node])
+        symbolizer = rules[0].LineSymbolizer
+        rules[0]._node.remove(symbolizer._node)
+        rules[0]._node.insert(0, symbolizer._node)
+        sld_doc.normalize()
+        self.assertEqual(etree.QName(rules[0]._node[-1]).localname, 'LineSymbolizer')
+        self.assertEqual(len(sld_doc._document.dirty), 0)
+
+        # the untracked edit is still out of order
+        self.assertFalse(sld_doc.validate())
+        self.assertEqual(sld_doc._document.validated, sld_doc._document.generation)
+
+        sld_doc.invalidate()
+        self.assertTrue(sld_doc._document.everything)
+        sld_doc.normalize()
+        self.assertEqual(etree.QName(rules[1]._node[0]).localname, 'Title')
+
+        del rules[0].LineSymbolizer
+        self.assertTrue(sld_doc.validate())
+
+    def test_validate_fast(self):
+        """
+        Test that the structural validator agrees with the schema, and only checks changed elements.
+        """
+        from sld.structure import get_structure
+
+        self.assertTrue(get_structure() is get_structure('1.0.0'))
+        self.assertRaises(ValueError, self._sld0.validate, 'quick')
+
+        schema = sld.get_schema()
+        structure = get_structure()
+        base = etree.parse('test/style.sld')
+
+        def check(tree):
+            self.assertEqual(structure.validate(tree), schema.validate(tree))
+            return structure.validate(tree)
+
+        self.assertTrue(check(base))
+
+        # wrong order
+        tree = copy.deepcopy(base)
+        rule = tree.find('.//{http://www.opengis.net/sld}Rule')
+        rule.append(rule[0])
+        self.assertFalse(check(tree))
+
+        # missing required child
+        tree = copy.deepcopy(base)
+        rule = tree.find('.//{http://www.opengis.net/sld}Rule')
+        rule.remove(rule.find('{http://www.opengis.net/sld}Title'))
+        self.assertTrue(check(tree))
+        tree.getroot().find('.//{http://www.opengis.net/sld}NamedLayer').clear()
+        self.assertFalse(check(tree))
+
+        # unknown element
+        tree = copy.deepcopy(base)
+        etree.SubElement(tree.find('.//{http://www.opengis.net/sld}Fill'), '{http://www.opengis.net/sld}Unknown')
+        self.assertFalse(check(tree))
+
+        # missing required attribute
+        tree = copy.deepcopy(base)
+        del tree.getroot().attrib['version']
+        self.assertFalse(check(tree))
+        tree.getroot().set('version', '1.1.0')
+        self.assertFalse(check(tree))
+
+        # document element
+        self.assertTrue(check(etree.ElementTree(copy.deepcopy(rule))))
+        self.assertFalse(check(etree.ElementTree(etree.Element('{http://www.opengis.net/sld}Unknown'))))
+
+        sld_doc = sld.StyledLayerDescriptor()
+        fts = sld_doc.create_namedlayer('layer').create_userstyle().create_featuretypestyle()
+        fts.create_rule('rule', sld.PointSymbolizer)
+        self.assertTrue(sld_doc.validate(mode='fast'))
+        self.assertTrue(sld_doc._document.structured)
+        self.assertTrue(sld_doc.validate())
+
+        # only changed elements are checked again
+        rule = fts.Rules[0]
+        rule.Title = 'title'
+        self.assertEqual(list(sld_doc._document.unchecked), [rule._node.find('{http://www.opengis.net/sld}Title')])
+        self.assertTrue(sld_doc.validate(mode='fast'))
+        self.assertEqual(len(sld_doc._document.unchecked), 0)
+
+        del rule.PointSymbolizer
+        self.assertFalse(sld_doc.validate(mode='fast'))
+        self.assertFalse(sld_doc.validate())
+        rule.create_symbolizer('Line')
+        self.assertTrue(sld_doc.validate(mode='fast'))
+        self.assertTrue(sld_doc.validate())
+
+        etree.SubElement(fts.Rules[0]._node, '{http://www.opengis.net/sld}Unknown')
+        sld_doc.invalidate()
+        self.assertFalse(sld_doc.validate(mode='fast'))
+        self.assertFalse(sld_doc.validate())
+
+    def test_validate_removed(self):
+        """
+        Test that changes to removed elements do not affect their former
+        document, and that fast validation skips them.
+        """
+        sld_doc = copy.deepcopy(self._sld0)
+        self.assertTrue(sld_doc.validate())
+        rules = sld_doc.NamedLayer.UserStyle.FeatureTypeStyle.Rules
+
+        # a rule edited into an invalid state, then deleted
+        rule = rules[2]
+        del rule.PolygonSymbolizer
+        del rules[2]
+        self.assertTrue(sld_doc.validate(mode='fast'))
+        self.assertTrue(sld_doc.validate())
+
+        generation = sld_doc._document.generation
+        rule.Title = 'removed'
+        rule.create_symbolizer('Line')
+        self.assertEqual(sld_doc._document.generation, generation)
+        self.assertEqual(len(sld_doc._document.unchecked), 0)
+        self.assertEqual(len(sld_doc._document.dirty), 0)
+
+    def test_validation_report(self):
+        """
+        Test that reports list the problems found, and stop after the limit.
+        """
+        sld_doc = copy.deepcopy(self._sld0)
+        report = sld_doc.report()
+        self.assertTrue(isinstance(report, sld.ValidationReport))
+        self.assertTrue(report)
+        self.assertEqual(len(report), 0)
+        self.assertFalse(report.truncated)
+
+        rules = sld_doc.NamedLayer.UserStyle.FeatureTypeStyle.Rules
+        for rule in rules:
+            etree.SubElement(rule._node, '{http://www.opengis.net/sld}Unknown')
+        sld_doc.invalidate()
+
+        report = sld_doc.report()
+        self.assertFalse(report)
+        self.assertEqual(len(report), len(rules))
+        self.assertFalse(report.truncated)
+        self.assertTrue('Unknown' in report[0].message)
+        self.assertTrue(report[0].path.startswith(sld_doc._node.getpath(rules[0]._node) + '/'))
+
+        report = sld_doc.report(max_errors=2)
+        self.assertFalse(report)
+        self.assertEqual(len(report), 2)
+        self.assertTrue(report.truncated)
+        self.assertEqual(report[0].path, sld_doc._node.getpath(rules[0]._node))
+        self.assertEqual(report[0].line, rules[0]._node.sourceline)
+        self.assertTrue(str(report[0]).startswith('Line:%d, Column:0 -- ' % report[0].line))
+
+        report = sld_doc.report(fail_fast=True)
+        self.assertEqual(len(report), 1)
+        self.assertTrue(report.truncated)
+
+        report = sld_doc.report(mode='fast')
+        self.assertFalse(report)
+        self.assertEqual(len(report), len(rules))
+
+        self.assertFalse(sld_doc.validate())
+        for rule in rules:
+            rule._node.remove(rule._node.find('{http://www.opengis.net/sld}Unknown'))
+        sld_doc.invalidate()
+        self.assertTrue(sld_doc.report(max_errors=2))
+        self.assertTrue(sld_doc.validate())
+
+    def test_report_threads(self):
+        """
+        Test that reports made in concurrent threads only contain the errors
+        of their own document.
+        """
+        import threading
+
+        valid = copy.deepcopy(self._sld0)
+        invalid = copy.deepcopy(self._sld0)
+        rules = invalid.NamedLayer.UserStyle.FeatureTypeStyle.Rules
+        for rule in rules:
+            etree.SubElement(rule._node, '{http://www.opengis.net/sld}Unknown')
+
+        counts = []
+
+        def run(sld_doc):
+            for i in range(20):
+                sld_doc.invalidate()
+                counts.append((sld_doc is valid, len(sld_doc.report())))
+
+        threads = [threading.Thread(target=run, args=(sld_doc,)) for sld_doc in (valid, invalid) * 2]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(counts), 80)
+        self.assertEqual(set(counts), set([(True, 0), (False, len(rules))]))
+        self.assertFalse(sld._thread_schema() is sld.get_schema())
+
+    def test_validate_many(self):
+        """
+        Test that many files are validated in worker processes, in order.
+        """
+        from sld.batch import FileReport, find_files, validate_many
+
+        tmpdir = tempfile.mkdtemp()
+        try:
+            broken = os.path.join(tmpdir, 'broken.sld')
+            with open(broken, 'wb') as f:
+                f.write(etree.tostring(self._sld0._node).replace(b'<Rule>', b'<Rule><Unknown/>', 1))
+            truncated = os.path.join(tmpdir, 'truncated.sld')
+            with open(truncated, 'wb') as f:
+                f.write(b'<StyledLayerDescriptor')
+            with open(os.path.join(tmpdir, 'README'), 'w') as f:
+                f.write('not a style')
+
+            self.assertEqual(list(find_files([tmpdir])), [broken, truncated])
+
+            paths = ['test/style.sld', broken, truncated, os.path.join(tmpdir, 'missing.sld')] * 3
+            reports = list(validate_many(paths, max_workers=2, chunksize=2))
+            self.assertEqual([report.path for report in reports], paths)
+            self.assertEqual([bool(report) for report in reports], [True, False, False, False] * 3)
+            self.assertTrue(isinstance(reports[0], FileReport))
+            self.assertEqual(reports[0].errors, [])
+            self.assertTrue('Unknown' in reports[1].errors[0].message)
+            self.assertTrue(reports[1].errors[0].path.startswith('/'))
+            self.assertEqual(len(reports[2].errors), 1)
+            self.assertEqual(reports[3].errors[0].path, None)
+
+            reports = list(validate_many([broken], max_workers=1, fail_fast=True))
+            self.assertEqual(len(reports[0].errors), 1)
+            self.assertTrue(reports[0].truncated is False)
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_load_many(self):
+        """
+        Test that many files are loaded concurrently into separate documents.
+        """
+        from sld.batch import load_many
+
+        paths = ['test/style.sld'] * 5
+        docs = load_many(paths, max_workers=3)
+        self.assertEqual(len(docs), 5)
+        for sld_doc in docs:
+            self.assertTrue(isinstance(sld_doc, sld.StyledLayerDescriptor))
+            self.assertEqual(sld_doc.NamedLayer.Name, 'poptot')
+            self.assertTrue(sld_doc._document.structured)
+        self.assertEqual(len(set([id(sld_doc._node) for sld_doc in docs])), 5)
+
+        docs = load_many(paths[:2], validate=False)
+        self.assertFalse(docs[0]._document.structured)
+
+        self.assertRaises((IOError, OSError), load_many, paths + ['missing.sld'])
+
+    def test_iter_rules(self):
+        """
+        Test that streamed rules are read in order, and removed once read.
+        """
+        from sld.stream import RuleItem, iter_rules
+
+        expected = [rule.Title for rule in self._sld0.NamedLayer.UserStyle.FeatureTypeStyle.Rules]
+
+        items = []
+        for item in iter_rules('test/style.sld'):
+            self.assertTrue(isinstance(item, RuleItem))
+            self.assertTrue(isinstance(item.rule, sld.Rule))
+            self.assertEqual(item.namedlayer.Name, 'poptot')
+            self.assertEqual(item.userstyle.Title, 'Population')
+            # rules already read are removed from the document
+            self.assertEqual([other for other in items if not other.rule._node.getparent() is None], [])
+            items.append(item)
+
+        self.assertEqual([item.rule.Title for item in items], expected)
+        self.assertTrue(items[0].rule.Filter.PropertyIsGreaterThanOrEqualTo is not None)
+        self.assertEqual(items[0].rule._node.getparent(), None)
+
+        with open('test/style.sld', 'rb') as f:
+            self.assertEqual(len(list(iter_rules(f))), len(expected))
+
+        # rules may be moved elsewhere while reading
+        kept = etree.Element('kept')
+        for item in iter_rules('test/style.sld'):
+            kept.append(item.rule._node)
+        self.assertEqual(len(kept), len(expected))
+
+        # entities are not expanded, as by the constructor
+        from io import BytesIO
+        doc = b'<!DOCTYPE StyledLayerDescriptor [<!ENTITY e "expanded">]>' + \
+            b'<StyledLayerDescriptor xmlns="http://www.opengis.net/sld" version="1.0.0"><NamedLayer>' + \
+            b'<UserStyle><FeatureTypeStyle><Rule><Title>&e;</Title></Rule></FeatureTypeStyle></UserStyle>' + \
+            b'</NamedLayer></StyledLayerDescriptor>'
+        items = list(iter_rules(BytesIO(doc)))
+        self.assertEqual(len(items), 1)
+        self.assertTrue(items[0].rule.Title is None)
+
+    def test_sld_writer(self):
+        """
+        Test that the streaming writer produces a valid document.
+        """
+        from io import BytesIO
+        from sld.stream import SLDWriter
+
+        output = BytesIO()
+        with SLDWriter(output, 'parcels', title='Parcels') as writer:
+            for i in range(3):
+                writer.create_rule('class %d' % i, sld.PolygonSymbolizer, MaxScaleDenominator='1000',
+                                   filter=('class', '==', str(i)))
+            writer.write(self._sld0.NamedLayer.UserStyle.FeatureTypeStyle.Rules[0])
+            self.assertEqual(len(writer._scratch._node), 0)
+
+        sld_doc = sld.StyledLayerDescriptor(BytesIO(output.getvalue()))
+        self.assertTrue(sld_doc.validate())
+        self.assertEqual(sld_doc.NamedLayer.Name, 'parcels')
+        self.assertEqual(sld_doc.NamedLayer.UserStyle.Title, 'Parcels')
+
+        rules = sld_doc.NamedLayer.UserStyle.FeatureTypeStyle.Rules
+        self.assertEqual([rule.Title for rule in rules], ['class 0', 'class 1', 'class 2', '> 880'])
+        self.assertEqual(rules[1].Filter.PropertyIsEqualTo.Literal, '1')
+        self.assertEqual(rules[1].MaxScaleDenominator, '1000')
+        self.assertTrue(rules[1].PolygonSymbolizer is not None)
+
+    def test_write_cached(self):
+        """
+        Test that cached serialization matches lxml after edits.
+        """
+        from io import BytesIO
+
+        sld_doc = sld.StyledLayerDescriptor('test/style.sld')
+        self.assertEqual(sld_doc.as_sld(), etree.tostring(sld_doc._node))
+
+        rules = sld_doc.NamedLayer.UserStyle.FeatureTypeStyle.Rules
+        unchanged = rules[1]._node
+        cached = sld_doc._document.fragments[unchanged]
+
+        rules[0].Title = 'Changed'
+        rules[0].PolygonSymbolizer.Fill.CssParameters[0].Value = '#123456'
+        self.assertFalse(rules[0]._node in sld_doc._document.fragments)
+
+        output = BytesIO()
+        sld_doc.write(output)
+        self.assertEqual(output.getvalue(), etree.tostring(sld_doc._node))
+        self.assertTrue(b'Changed' in output.getvalue())
+        self.assertTrue(sld_doc._document.fragments[unchanged] is cached)
+
+        rule = sld_doc.NamedLayer.UserStyle.FeatureTypeStyle.create_rule('New', sld.LineSymbolizer)
+        rule.create_filter('name', '==', 'value')
+        self.assertEqual(sld_doc.as_sld(), etree.tostring(sld_doc._node))
+        sld_doc.normalize()
+        self.assertEqual(sld_doc.as_sld(), etree.tostring(sld_doc._node))
+
+        del rules[0]
+        self.assertEqual(sld_doc.as_sld(), etree.tostring(sld_doc._node))
+
+        # direct edits need invalidate()
+        rules[0]._node.set('id', 'direct')
+        sld_doc.invalidate()
+        self.assertEqual(sld_doc.as_sld(), etree.tostring(sld_doc._node))
+        self.assertEqual(sld_doc.as_sld(pretty_print=True), etree.tostring(sld_doc._node, pretty_print=True))
+
+    def test_load_buffers(self):
+        """
+        Test that documents are loaded from in-memory buffers, without expanding entities.
+        """
+        import mmap
+        import threading
+
+        with open('test/style.sld', 'rb') as f:
+            content = f.read()
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        expected = etree.tostring(self._sld0._node)
+        for data in (bytearray(content), memoryview(content), mapped):
+            sld_doc = sld.StyledLayerDescriptor(data)
+            self.assertEqual(sld_doc.as_sld(), expected)
+            self.assertTrue(sld_doc.validate())
+        mapped.close()
+
+        parsers = []
+        thread = threading.Thread(target=lambda: parsers.append(sld.get_parser()))
+        thread.start()
+        thread.join()
+        self.assertTrue(sld.get_parser() is sld.get_parser())
+        self.assertFalse(parsers[0] is sld.get_parser())
+
+        sld.set_parser_options(remove_blank_text=True)
+        try:
+            sld_doc = sld.StyledLayerDescriptor('test/style.sld')
+            self.assertFalse(b'\n  <NamedLayer>' in sld_doc.as_sld())
+            self.assertEqual(len(sld_doc.NamedLayer.UserStyle.FeatureTypeStyle.Rules), 6)
+        finally:
+            sld.set_parser_options()
+        self.assertTrue(b'\n  <NamedLayer>' in sld.StyledLayerDescriptor('test/style.sld').as_sld())
+
+        # entities are not expanded
+        doc = b'<!DOCTYPE StyledLayerDescriptor [<!ENTITY e "expanded">]>' + \
+            b'<StyledLayerDescriptor xmlns="http://www.opengis.net/sld" version="1.0.0">&e;</StyledLayerDescriptor>'
+        sld_doc = sld.StyledLayerDescriptor(doc, validate=False)
+        self.assertTrue(sld_doc._node.getroot().text is None)
+
+        # byte strings that are not markup are file names
+        self.assertTrue(sld.StyledLayerDescriptor(b'test/style.sld').NamedLayer is not None)
+        with open('test/style.sld', 'rb') as f:
+            content = f.read()
+        self.assertTrue(sld.StyledLayerDescriptor(content).NamedLayer is not None)
+
+    def test_filter_compile(self):
+        """
+        Test that compiled filters match features as the filter specifies.
+        """
+        from sld.filters import compile_filter
+
+        rules = self._sld0.NamedLayer.UserStyle.FeatureTypeStyle.Rules
+        match = rules[0].Filter.compile()
+        self.assertTrue(match is rules[0].Filter.compile())
+        self.assertEqual([match({'number': value}) for value in (879, 880, '880.0', ' 1e4 ', None)],
+                         [False, True, True, True, False])
+        self.assertFalse(match({}))
+
+        sld_doc = sld.StyledLayerDescriptor()
+        fts = sld_doc.create_namedlayer('filters').create_userstyle().create_featuretypestyle()
+        rule = fts.create_rule('like')
+        like = rule.create_filter('name', '%', 'Ab*c?')
+        self.assertTrue(like.compile()({'name': 'Abxyzcd'}))
+        self.assertFalse(like.compile()({'name': 'abxyzcd'}))
+        like.PropertyIsLike._node.set('matchCase', 'false')
+        self.assertTrue(like.compile()({'name': 'abxyzcd'}))
+
+        rule = fts.create_rule('text')
+        text = rule.create_filter('kind', '==', 'road')
+        self.assertEqual([text.compile()({'kind': value}) for value in ('road', 'Road', 5, None)],
+                         [True, False, False, False])
+
+        rule = fts.create_rule('or')
+        rule.Filter = like | text
+        match = rule.Filter.compile()
+        self.assertTrue(match({'name': 'abxyzcd'}))
+        self.assertTrue(match({'kind': 'road'}))
+        self.assertFalse(match({'name': 'x', 'kind': 'rail'}))
+
+        # Not, Between and Null are built directly
+        ogc = '{%s}' % sld.SLDNode._nsmap['ogc']
+        rfilter = etree.Element(ogc + 'Filter')
+        negated = etree.SubElement(etree.SubElement(rfilter, ogc + 'Not'), ogc + 'PropertyIsBetween')
+        etree.SubElement(negated, ogc + 'PropertyName').text = 'number'
+        etree.SubElement(etree.SubElement(negated, ogc + 'LowerBoundary'), ogc + 'Literal').text = '10'
+        etree.SubElement(etree.SubElement(negated, ogc + 'UpperBoundary'), ogc + 'Literal').text = '20'
+        match = compile_filter(rfilter)
+        self.assertEqual([match({'number': value}) for value in (5, 10, '15', 20, 25)],
+                         [True, False, False, False, True])
+
+        rfilter[0][0].tag = ogc + 'FeatureId'
+        self.assertRaises(ValueError, compile_filter, rfilter)
+
+    def test_filter_mask(self):
+        """
+        Test that columnar filters give the same results as the compiled filters.
+        """
+        try:
+            import numpy
+        except ImportError:
+            self.skipTest('NumPy is not installed.')
+
+        rules = self._sld0.NamedLayer.UserStyle.FeatureTypeStyle.Rules
+        columns = {'number': numpy.array([0, 879, 880, 1000, 5000]),
+                   'name': numpy.array(['North End', 'Northwood', 'South End', 'north', '5'])}
+        self.assertEqual(rules[0].Filter.mask(columns).tolist(), [False, False, True, True, True])
+
+        sld_doc = sld.StyledLayerDescriptor()
+        fts = sld_doc.create_namedlayer('filters').create_userstyle().create_featuretypestyle()
+        like = fts.create_rule('like').create_filter('name', '%', 'North*')
+        small = fts.create_rule('small').create_filter('name', '<', '10')
+        rule = fts.create_rule('or')
+        rule.Filter = like | small
+        self.assertEqual(rule.Filter.mask(columns).tolist(), [True, True, False, False, True])
+
+        # the same results as the compiled functions
+        features = [dict((name, column[i].item()) for name, column in columns.items()) for i in range(5)]
+        for rfilter in (like, small, rule.Filter, rules[0].Filter):
+            match = rfilter.compile()
+            self.assertEqual(rfilter.mask(columns).tolist(), [match(feature) for feature in features])
+
+        # None and NaN are missing values
+        columns = {'name': numpy.array([None, 'North', 3], dtype=object),
+                   'number': numpy.array([numpy.nan, 880.0, 1.0])}
+        self.assertEqual(like.mask(columns).tolist(), [False, True, False])
+        self.assertEqual(rules[0].Filter.mask(columns).tolist(), [False, True, False])
+        self.assertEqual(like.mask({}, size=2).tolist(), [False, False])
+
+        # missing values are missing to the compiled functions too
+        other = fts.create_rule('other').create_filter('number', '!=', '5')
+        columns = {'number': numpy.array([numpy.nan, 5.0, 6.0]),
+                   'name': numpy.array([float('nan'), None, 'North'], dtype=object)}
+        features = [dict((name, column[i]) for name, column in columns.items()) for i in range(3)]
+        for rfilter in (other, like, small):
+            match = rfilter.compile()
+            self.assertEqual(rfilter.mask(columns).tolist(), [match(feature) for feature in features])
+        self.assertEqual(other.mask(columns).tolist(), [False, False, True])
+
+        # both paths parse numbers with the same grammar
+        thousand = fts.create_rule('thousand').create_filter('name', '==', '1000')
+        columns = {'name': numpy.array(['1_000', ' 1e3 ', '5'])}
+        features = [{'name': value} for value in ('1_000', ' 1e3 ', '5')]
+        match = thousand.compile()
+        self.assertEqual(thousand.mask(columns).tolist(), [match(feature) for feature in features])
+        self.assertEqual(thousand.mask(columns).tolist(), [False, True, False])
+
+    def test_style_matcher(self):
+        """
+        Test that batches of features are matched to the rules in scale.
+        """
+        try:
+            import numpy
+        except ImportError:
+            self.skipTest('NumPy is not installed.')
+        from sld.matcher import StyleMatcher
+
+        sld_doc = sld.StyledLayerDescriptor('test/style.sld')
+        fts = sld_doc.NamedLayer.UserStyle.FeatureTypeStyle
+        matcher = StyleMatcher(fts)
+        columns = {'number': numpy.array([0, 100, 300, 500, 880, 1000])}
+
+        # the first rule is out of scale, the last one has no filter
+        self.assertEqual(matcher.active(20000).tolist(), [1, 2, 3, 4, 5])
+        self.assertEqual(matcher.match(columns, 20000).tolist(), [4, 3, 2, 1, 5, 5])
+        self.assertEqual(matcher.match(columns, 10000).tolist(), [4, 3, 2, 5, 0, 0])
+        matches = matcher.match(columns, 10000, first=False)
+        self.assertEqual(matches.shape, (6, 6))
+        self.assertEqual(matches[:, 5].tolist(), [True] * 6)
+        self.assertEqual(numpy.flatnonzero(matches[4]).tolist(), [0, 5])
+
+        # an else rule takes the features no other rule matches
+        del fts.Rules[5]
+        rule = fts.create_rule('Else', sld.LineSymbolizer)
+        rule._node.insert(1, rule._node.makeelement('{%s}ElseFilter' % sld.SLDNode._nsmap['sld']))
+        sld_doc.invalidate()
+        self.assertEqual(matcher.match(columns, 10000).tolist(), [4, 3, 2, 5, 0, 0])
+        self.assertEqual(matcher.match(columns, 20000).tolist(), [4, 3, 2, 1, 5, 5])
+        self.assertEqual(matcher.match(columns, 20000, first=False)[:, 5].tolist(),
+                         [False, False, False, False, True, True])
+
+    def test_scale_index(self):
+        """
+        Test that the scale index finds the rules in scale, and follows edits.
+        """
+        index = sld.ScaleIndex([('a', float('-inf'), 100), ('b', 50, 200), ('c', 100, float('inf'))])
+        self.assertEqual(index.active(10), ['a'])
+        self.assertEqual(index.active(50), ['a', 'b'])
+        self.assertEqual(index.active(100), ['b', 'c'])
+        index.remove('b')
+        index.add('d', 0, 1000)
+        self.assertEqual(index.active(100), ['c', 'd'])
+        self.assertEqual(index.active(5000), ['c'])
+        self.assertRaises(ValueError, index.add, 'c', 0, 1)
+
+        # nested and empty ranges, added in bulk and one at a time
+        index = sld.ScaleIndex((i, i, 100 - i) for i in range(30))
+        for i in range(30, 60):
+            index.add(i, 60 - i, 40 + i)
+        index.add('empty', 10, 10)
+        self.assertEqual(index.active(75), list(range(25)) + list(range(36, 60)))
+        for i in range(0, 60, 2):
+            index.remove(i)
+        index.remove('empty')
+        self.assertEqual(index.active(75), list(range(1, 25, 2)) + list(range(37, 60, 2)))
+        self.assertEqual(len(index), 30)
+
+        sld_doc = sld.StyledLayerDescriptor('test/style.sld')
+        fts = sld_doc.NamedLayer.UserStyle.FeatureTypeStyle
+        self.assertEqual([rule.Title for rule in fts.rules_at(20000)], ['> 345', '> 130', '> 35', '< 35', 'Boundary'])
+        self.assertEqual([rule.Title for rule in fts.rules_at(10000)], ['> 880', '> 130', '> 35', '< 35', 'Boundary'])
+        index = sld_doc._document.scales[fts._node]
+
+        # created and deleted rules update the index in place
+        fts.create_rule('New', sld.LineSymbolizer, MinScaleDenominator='15000', MaxScaleDenominator='30000')
+        del fts.Rules[1]
+        self.assertEqual([rule.Title for rule in fts.rules_at(20000)], ['> 130', '> 35', '< 35', 'Boundary', 'New'])
+        self.assertTrue(sld_doc._document.scales[fts._node] is index)
+
+        # other changes rebuild it
+        fts.Rules[0].MaxScaleDenominator = '50000'
+        self.assertEqual([rule.Title for rule in fts.rules_at(20000)],
+                         ['> 880', '> 130', '> 35', '< 35', 'Boundary', 'New'])
+        self.assertFalse(sld_doc._document.scales[fts._node] is index)
+
+    def test_style_matcher_categories(self):
+        """
+        Test that equality rules dispatched by value match as the rules tested in order.
+        """
+        try:
+            import numpy
+        except ImportError:
+            self.skipTest('NumPy is not installed.')
+        from sld.matcher import StyleMatcher
+
+        sld_doc = sld.StyledLayerDescriptor()
+        fts = sld_doc.create_namedlayer('landuse').create_userstyle().create_featuretypestyle()
+        for code in ('10', '20', '30', '40'):
+            fts.create_rule(code, sld.PolygonSymbolizer).create_filter('code', '==', code)
+        rfilter = fts.create_rule('50 or 60', sld.PolygonSymbolizer).create_filter('code', '==', '50')._node
+        equal = rfilter[0]
+        either = etree.SubElement(rfilter, '{%s}Or' % sld.SLDNode._nsmap['ogc'])
+        either.append(equal)
+        either.append(copy.deepcopy(equal))
+        either[1][1].text = '60'
+        fts.create_rule('small', sld.PolygonSymbolizer).create_filter('area', '<', '5')
+        fts.create_rule('forest', sld.PolygonSymbolizer).create_filter('code', '==', 'forest')
+
+        matcher = StyleMatcher(fts)
+        self.assertEqual(set(matcher._tables['code']), set([10, 20, 30, 40, 50, 60, 'forest']))
+        self.assertEqual(matcher._sequential, [5])
+
+        columns = {'code': numpy.array(['10', '60', '70', '30.0', 'forest', '70']),
+                   'area': numpy.array([1, 1, 1, 10, 10, 10])}
+        self.assertEqual(matcher.match(columns, 1000).tolist(), [0, 4, 5, 2, 6, -1])
+        self.assertEqual(numpy.flatnonzero(matcher.match(columns, 1000, first=False)[0]).tolist(), [0, 5])
+        features = [{'code': code, 'area': area} for code, area in ((10, 1), (60.0, 1), (70, 1), ('30', 10))]
+        self.assertEqual([matcher.match_feature(feature, 1000) for feature in features], [0, 4, 5, 2])
+
 
 if __name__ == '__main__':
     unittest.main()
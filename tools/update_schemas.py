@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+"""
+Replace the schemas bundled under sld/schemas with the canonical files on
+schemas.opengis.net, byte for byte, with every schema they import or
+include. The files are not edited: their relative imports resolve to the
+bundled copies through L{sld.SchemaResolver}.
+
+Run this from the root of the source tree, with network access, whenever
+the bundled schemas change.
+
+License
+=======
+Copyright 2011-2014 David Zwarg <U{david.a@zwarg.com}>
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+U{http://www.apache.org/licenses/LICENSE-2.0}
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from optparse import OptionParser
+from lxml.etree import fromstring
+try:
+    from urllib2 import urlopen
+    from urlparse import urljoin
+except ImportError:
+    from urllib.request import urlopen
+    from urllib.parse import urljoin
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import sld
+
+_roots = ['sld/1.0.0/StyledLayerDescriptor.xsd']
+"""The schemas to bundle, relative to schemas.opengis.net."""
+
+_xsd = 'http://www.w3.org/2001/XMLSchema'
+
+
+def fetch(url):
+    """
+    Fetch a document.
+
+    @type  url: string
+    @param url: The location of the document.
+    @rtype: bytes
+    @return: The content of the document.
+    """
+    resp = urlopen(url)
+    try:
+        return resp.read()
+    finally:
+        resp.close()
+
+
+def update(roots, dry_run=False):
+    """
+    Fetch the schemas, and the schemas they import or include, into the
+    bundled schema directory.
+
+    @type    roots: list
+    @param   roots: The schemas, relative to schemas.opengis.net.
+    @type  dry_run: boolean
+    @param dry_run: Optional. Report the files that differ, without writing
+        them.
+    @rtype: list
+    @return: The paths of the bundled files that differ from the canonical
+        files.
+    """
+    pending = [sld._schema_host + root for root in roots]
+    seen = set()
+    changed = []
+    while pending:
+        url = pending.pop()
+        if url in seen:
+            continue
+        seen.add(url)
+
+        path = sld.bundled_schema_path(url)
+        if path is None:
+            raise ValueError('The schema %s is not on %s.' % (url, sld._schema_host))
+
+        content = fetch(url)
+        for elem in fromstring(content).iter('{%s}import' % _xsd, '{%s}include' % _xsd):
+            location = elem.get('schemaLocation')
+            if location:
+                pending.append(urljoin(url, location))
+
+        current = None
+        if os.path.isfile(path):
+            with open(path, 'rb') as f:
+                current = f.read()
+        if current == content:
+            continue
+
+        changed.append(path)
+        sys.stdout.write('%s: %s\n' % ('differs' if dry_run else 'updated', os.path.relpath(path)))
+        if dry_run:
+            continue
+
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as f:
+            f.write(content)
+
+    return changed
+
+
+if __name__ == "__main__":
+    parser = OptionParser()
+    parser.add_option('-n', '--dry-run', dest='dry_run', action='store_true', default=False,
+                      help='Only report the bundled files that differ from the canonical files.')
+
+    (options, args) = parser.parse_args()
+
+    changed = update(args or _roots, dry_run=options.dry_run)
+    if not options.dry_run:
+        # the bundled set must compile offline
+        sld._load_schema('1.0.0')
+    sys.exit(1 if options.dry_run and changed else 0)